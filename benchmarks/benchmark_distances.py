@@ -0,0 +1,40 @@
+# © 2020 Nokia
+# Licensed under the BSD 3-Clause License.
+# SPDX-License-Identifier: BSD-3-Clause
+# !/usr/bin/env python3
+# coding: utf-8
+# Author: Élie de Panafieu  <elie.de_panafieu@nokia-bell-labs.com>
+
+
+import numpy as np
+from distance_on_bag_collections.cosine_distance import CosineDistance
+from distance_on_bag_collections.jensen_shannon_distance import JensenShannonDistance
+from benchmarks.measurement import *
+
+
+def separate_value_and_gradients(distance, vector0, vector1):
+    return distance(vector0, vector1), (distance.first_partial_gradient(vector0, vector1),
+                                        distance.second_partial_gradient(vector0, vector1))
+
+
+def benchmark_value_and_gradients(length=10**6, number_of_repetitions=5, seed=0):
+    generator = np.random.default_rng(seed)
+    vector0 = generator.random(length)
+    vector1 = generator.random(length)
+    print('vectors of length ' + str(length))
+    for distance in (CosineDistance(), JensenShannonDistance()):
+        name = type(distance).__name__
+        for label, function in (('separate calls', separate_value_and_gradients),
+                                ('value_and_gradients', type(distance).value_and_gradients)):
+            _, elapsed_time, peak_memory = time_and_peak_memory_from_function(
+                repeat_function, number_of_repetitions, function, distance, vector0, vector1)
+            print_measure(name + ', ' + label, elapsed_time / number_of_repetitions, peak_memory)
+
+
+def repeat_function(number_of_repetitions, function, *args):
+    for _ in range(number_of_repetitions):
+        function(*args)
+
+
+if __name__ == '__main__':
+    benchmark_value_and_gradients()
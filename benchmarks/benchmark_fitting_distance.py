@@ -0,0 +1,175 @@
+# © 2020 Nokia
+# Licensed under the BSD 3-Clause License.
+# SPDX-License-Identifier: BSD-3-Clause
+# !/usr/bin/env python3
+# coding: utf-8
+# Author: Élie de Panafieu  <elie.de_panafieu@nokia-bell-labs.com>
+
+
+import random
+import tracemalloc
+from fitting_distance import FittingDistance, DEFAULT_NUMBER_OF_GRADIENT_STEPS
+from fitting_distance_on_text_collections import bag_of_factors_from_text
+from oracle_claim import OracleClaim
+from benchmarks.measurement import *
+
+
+def random_oracle_claims(bags, number_of_claims):
+    oracle_claims = []
+    for _ in range(number_of_claims):
+        bag0, bag1 = random.sample(bags, 2)
+        lower_bound = random.random()
+        oracle_claims.append(OracleClaim(({bag0}, {bag1}), (lower_bound, min(1., lower_bound + 0.1))))
+    return oracle_claims
+
+
+def benchmark_fit(number_of_bags=300, bag_length=100, number_of_claims=1000, batch_sizes=(None, 50), seed=0):
+    random.seed(seed)
+    bags = [random_bag_of_factors(bag_length, 3) for _ in range(number_of_bags)]
+    oracle_claims = random_oracle_claims(bags, number_of_claims)
+    print(str(number_of_bags) + ' bags, ' + str(number_of_claims) + ' oracle claims')
+    for batch_size in batch_sizes:
+        distance = FittingDistance(bags)
+        _, elapsed_time, peak_memory = time_and_peak_memory_from_function(distance.fit, oracle_claims,
+                                                                          batch_size=batch_size)
+        print_measure('fit with batch size ' + str(batch_size), elapsed_time, peak_memory)
+
+
+def benchmark_fitting_throughput(number_of_bags=20000, bag_length=20, vocabulary_size=300, number_of_claims=600,
+                                 seed=0):
+    """ Fit on claims between few bags of a large collection, where the cost of a claim should not depend
+    on the number of bags. """
+    random.seed(seed)
+    vocabulary = [random_text(8) for _ in range(vocabulary_size)]
+    bags = [tuple(random.choices(vocabulary, k=bag_length)) for _ in range(number_of_bags)]
+    oracle_claims = [OracleClaim(({bags[2 * index]}, {bags[2 * index + 1], bags[2 * index + 2]}), (0.8, 1.))
+                     for index in range(number_of_claims)]
+    distance = FittingDistance(bags)
+    _, elapsed_time, peak_memory = time_and_peak_memory_from_function(distance.fit, oracle_claims)
+    print(str(number_of_bags) + ' bags, ' + str(number_of_claims) + ' oracle claims')
+    print_measure('fit', elapsed_time, peak_memory)
+    print(str(round(number_of_claims * DEFAULT_NUMBER_OF_GRADIENT_STEPS / elapsed_time)) + ' claims per second')
+
+
+def brute_force_nearest(distance, bags, number_of_neighbours):
+    index_to_bag = distance.vectorize.bags_from_indices()
+    distances = distance.pairwise([bags], [{bag} for bag in index_to_bag])[0]
+    return sorted(zip(distances, range(len(distances))))[:number_of_neighbours]
+
+
+def benchmark_nearest(number_of_bags=20000, bag_length=20, vocabulary_size=50000, number_of_queries=20,
+                      number_of_neighbours=10, seed=0):
+    random.seed(seed)
+    vocabulary = [random_text(8) for _ in range(vocabulary_size)]
+    bags = [tuple(random.choices(vocabulary, k=bag_length)) for _ in range(number_of_bags)]
+    queries = [{bag} for bag in random.sample(bags, number_of_queries)]
+    distance = FittingDistance(bags)
+    distance.nearest(queries[0], number_of_neighbours)
+    print(str(number_of_bags) + ' bags, ' + str(number_of_queries) + ' queries')
+    for label, function in (('brute force', brute_force_nearest), ('nearest', FittingDistance.nearest)):
+        _, elapsed_time, peak_memory = time_and_peak_memory_from_function(
+            lambda: [function(distance, bags, number_of_neighbours) for bags in queries])
+        print_measure(label, elapsed_time / number_of_queries, peak_memory)
+
+
+def clustered_bags_of_factors(number_of_bags, text_length, max_factor_length, number_of_clusters, noise=0.1):
+    """ Return the bags of factors of texts drawn around 'number_of_clusters' random centers,
+    replacing a fraction 'noise' of the letters of the center by random letters.
+    Almost all the bags share their factors of length one. """
+    centers = [random_text(text_length) for _ in range(number_of_clusters)]
+    bags = []
+    for _ in range(number_of_bags):
+        text = ''.join(letter if random.random() > noise else random.choice(ALPHABET)
+                       for letter in random.choice(centers))
+        bags.append(bag_of_factors_from_text(text, max_factor_length))
+    return bags
+
+
+def benchmark_approximate_nearest(number_of_bags=100000, text_length=40, max_factor_length=3,
+                                  number_of_clusters=5000, number_of_queries=50, number_of_neighbours=10,
+                                  recalls=(0.5, 0.9, 0.99), similarity=0.7, number_of_bits=12, seed=0):
+    random.seed(seed)
+    bags = clustered_bags_of_factors(number_of_bags, text_length, max_factor_length, number_of_clusters)
+    queries = [{bag} for bag in random.sample(bags, number_of_queries)]
+    distance = FittingDistance(bags)
+    print(str(number_of_bags) + ' bags, ' + str(number_of_queries) + ' queries')
+    exact_neighbours, elapsed_time, peak_memory = time_and_peak_memory_from_function(
+        lambda: [distance.nearest(bags, number_of_neighbours) for bags in queries])
+    print_measure('exact', elapsed_time / number_of_queries, peak_memory)
+    for recall in recalls:
+        _, elapsed_time, peak_memory = time_and_peak_memory_from_function(
+            distance.build_approximate_index, recall=recall, similarity=similarity, number_of_bits=number_of_bits)
+        print_measure('build with recall target ' + str(recall) + ' ('
+                      + str(distance.approximate_index.number_of_tables) + ' tables)', elapsed_time, peak_memory)
+        approximate_neighbours, elapsed_time, peak_memory = time_and_peak_memory_from_function(
+            lambda: [distance.nearest(bags, number_of_neighbours, approximate=True) for bags in queries])
+        print_measure('approximate', elapsed_time / number_of_queries, peak_memory)
+        found = sum(len({bag for bag, _ in exact} & {bag for bag, _ in approximate})
+                    for exact, approximate in zip(exact_neighbours, approximate_neighbours))
+        print('measured recall: ' + '{:.3f}'.format(found / (number_of_queries * number_of_neighbours)))
+
+
+def retained_memory_from_function(function, *args, **kwargs):
+    """ Return '(result, memory)' where 'memory' is the memory in bytes allocated by 'function(*args, **kwargs)'
+    and still allocated after the call. """
+    tracemalloc.start()
+    result = function(*args, **kwargs)
+    memory, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, memory
+
+
+def benchmark_compact_bags(number_of_bags=200, text_length=10000, max_factor_length=5, seed=0):
+    random.seed(seed)
+    texts = [random_text(text_length, ALPHABET[:10]) for _ in range(number_of_bags)]
+    print(str(number_of_bags) + ' bags of ' + str(text_length * max_factor_length) + ' factors')
+    for compact_bags in (False, True):
+        distance, memory = retained_memory_from_function(
+            lambda: FittingDistance([bag_of_factors_from_text(text, max_factor_length) for text in texts],
+                                    compact_bags=compact_bags))
+        bags = list(distance.vectorize.bag_to_index)
+        _, elapsed_time, peak_memory = time_and_peak_memory_from_function(
+            lambda: [distance.weight_from_bag(bag) for bag in bags])
+        print('compact bags ' + str(compact_bags) + ': retained memory ' + '{:.1f}'.format(memory / 2**20) + ' MiB')
+        print_measure('weight_from_bag on the stored bags', elapsed_time, peak_memory)
+
+
+def benchmark_bag_indices(number_of_bags=200, text_length=10000, max_factor_length=5, number_of_queries=200, seed=0):
+    random.seed(seed)
+    bags = [bag_of_factors_from_text(random_text(text_length, ALPHABET[:10]), max_factor_length)
+            for _ in range(number_of_bags)]
+    distance = FittingDistance(bags, cache_size=0)
+    queries = [random.sample(bags, 2) for _ in range(number_of_queries)]
+    index_queries = [distance.indices_from_bags(query) for query in queries]
+    print(str(number_of_bags) + ' bags of ' + str(text_length * max_factor_length) + ' factors, '
+          + str(number_of_queries) + ' queries')
+    for label, collections in (('bags', queries), ('bag indices', index_queries)):
+        _, elapsed_time, peak_memory = time_and_peak_memory_from_function(
+            lambda: [distance(collection[:1], collection[1:]) for collection in collections])
+        print_measure('distance from ' + label, elapsed_time, peak_memory)
+
+
+def benchmark_add_and_remove_bags(number_of_bags=20000, bag_length=20, vocabulary_size=50000, number_of_updates=1000,
+                                  seed=0):
+    random.seed(seed)
+    vocabulary = [random_text(8) for _ in range(vocabulary_size)]
+    bags = [tuple(random.choices(vocabulary, k=bag_length)) for _ in range(number_of_bags + number_of_updates)]
+    new_bags = bags[number_of_bags:]
+    removed_bags = bags[:number_of_updates]
+    print(str(number_of_bags) + ' bags, ' + str(number_of_updates) + ' added and removed')
+    _, elapsed_time, peak_memory = time_and_peak_memory_from_function(FittingDistance, bags[number_of_updates:])
+    print_measure('rebuild', elapsed_time, peak_memory)
+    distance = FittingDistance(bags[:number_of_bags])
+    _, elapsed_time, peak_memory = time_and_peak_memory_from_function(
+        lambda: (distance.add_bags(new_bags), distance.remove_bags(removed_bags)))
+    print_measure('add_bags and remove_bags', elapsed_time, peak_memory)
+
+
+if __name__ == '__main__':
+    benchmark_fit()
+    benchmark_fitting_throughput()
+    benchmark_nearest()
+    benchmark_approximate_nearest()
+    benchmark_compact_bags()
+    benchmark_bag_indices()
+    benchmark_add_and_remove_bags()
@@ -0,0 +1,193 @@
+# © 2020 Nokia
+# Licensed under the BSD 3-Clause License.
+# SPDX-License-Identifier: BSD-3-Clause
+# !/usr/bin/env python3
+# coding: utf-8
+# Author: Élie de Panafieu  <elie.de_panafieu@nokia-bell-labs.com>
+
+
+import json
+import random
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from fitting_distance_on_text_collections import *
+from matrix_operations import matrix_from_bags_and_index_maps
+from vectorization_of_bag_collections.vector_space import map_to_index_from_iterable, union_from_iterables, \
+    item_and_bag_indices_and_matrix_from_bags, local_bags_and_matrix_from_bags
+from sharding import shards_from_iterable
+from benchmarks.measurement import *
+from benchmarks.synthetic_corpus import zipfian_corpus
+
+
+def letter_by_letter_factor_index_and_matrix_from_texts(texts, max_factor_length):
+    """ Reference extraction, cleaning the texts letter by letter and materializing every factor. """
+    bags = [bag_of_factors_from_text(''.join(clean_letter(letter) for letter in text), max_factor_length)
+            for text in texts]
+    factor_to_index = map_to_index_from_iterable(union_from_iterables(bags))
+    bag_to_index = map_to_index_from_iterable(bags)
+    return factor_to_index, matrix_from_bags_and_index_maps(bags, factor_to_index, bag_to_index)
+
+
+def fused_factor_index_and_matrix_from_texts(texts, max_factor_length):
+    return factor_index_and_matrix_from_texts([clean_text(text) for text in texts], max_factor_length)
+
+
+def random_sentences(number_of_texts, number_of_words, vocabulary_size):
+    vocabulary = [random_text(random.randint(2, 9)) for _ in range(vocabulary_size)]
+    return [' '.join(random.choices(vocabulary, k=number_of_words)).capitalize() + '.' for _ in range(number_of_texts)]
+
+
+def benchmark_factor_extraction(number_of_texts=2000, number_of_words=300, vocabulary_size=5000,
+                                max_factor_length=DEFAULT_MAX_FACTOR_LENGTH, seed=0):
+    random.seed(seed)
+    texts = random_sentences(number_of_texts, number_of_words, vocabulary_size)
+    megabytes = sum(len(text.encode('utf-8')) for text in texts) / 2**20
+    print(str(number_of_texts) + ' texts, ' + '{:.1f}'.format(megabytes) + ' MiB')
+    for label, function in (('letter by letter', letter_by_letter_factor_index_and_matrix_from_texts),
+                            ('fused', fused_factor_index_and_matrix_from_texts)):
+        _, elapsed_time, peak_memory = time_and_peak_memory_from_function(function, texts, max_factor_length)
+        print_measure(label + ' extraction (' + '{:.2f}'.format(megabytes / elapsed_time) + ' MiB/s)',
+                      elapsed_time, peak_memory)
+
+
+def benchmark_hashing_of_factors(number_of_texts=500, text_length=500, max_factor_length=5,
+                                 numbers_of_hashing_bits=(None, 20, 22), seed=0):
+    random.seed(seed)
+    texts = [random_text(text_length) for _ in range(number_of_texts)]
+    print(str(number_of_texts) + ' texts of length ' + str(text_length))
+    for number_of_hashing_bits in numbers_of_hashing_bits:
+        distance, elapsed_time, peak_memory = time_and_peak_memory_from_function(
+            FittingDistanceOnTextCollections, texts, max_factor_length=max_factor_length,
+            number_of_hashing_bits=number_of_hashing_bits)
+        print_measure('construction with hashing bits ' + str(number_of_hashing_bits), elapsed_time, peak_memory)
+        if number_of_hashing_bits is not None:
+            print(distance.collision_report())
+
+
+def benchmark_pruning_of_factors(number_of_texts=2000, number_of_words=30, vocabulary_size=5000, max_factor_length=5,
+                                 min_df=2, max_df=0.5, seed=0):
+    random.seed(seed)
+    texts = random_sentences(number_of_texts, number_of_words, vocabulary_size)
+    print(str(number_of_texts) + ' texts of ' + str(number_of_words) + ' words')
+    for label, options in (('no pruning', {}), ('min_df ' + str(min_df) + ', max_df ' + str(max_df),
+                                                {'min_df': min_df, 'max_df': max_df})):
+        distance, elapsed_time, peak_memory = time_and_peak_memory_from_function(
+            FittingDistanceOnTextCollections, texts, max_factor_length=max_factor_length, **options)
+        print_measure('construction with ' + label, elapsed_time, peak_memory)
+        matrix = distance.fitting_distance.vectorize.item_bag_matrix
+        print(str(matrix.shape[0]) + ' factors, ' + str(matrix.nnz) + ' stored entries')
+
+
+def texts_from_file(path):
+    with open(path, 'r', encoding='utf-8') as file:
+        return [json.loads(line) for line in file]
+
+
+def benchmark_streaming_construction(number_of_texts=20000, seed=0):
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'texts.jsonl')
+        with open(path, 'w', encoding='utf-8') as file:
+            for text in zipfian_corpus(number_of_texts, seed):
+                file.write(json.dumps(text) + '\n')
+        print(str(number_of_texts) + ' texts, ' + '{:.1f}'.format(os.path.getsize(path) / 2**20) + ' MiB')
+        for label, function in (('from a list', lambda: FittingDistanceOnTextCollections(texts_from_file(path))),
+                                ('from_file', lambda: FittingDistanceOnTextCollections.from_file(path))):
+            distance, elapsed_time, peak_memory = time_and_peak_memory_from_function(function)
+            print_measure('construction ' + label, elapsed_time, peak_memory)
+            report = distance.memory_report()
+            print('retained ' + '{:.1f}'.format(report['total'] / 2**20) + ' MiB, of which texts '
+                  + '{:.1f}'.format((report['structures']['text_to_bag'] + report['structures']['bag_to_index'])
+                                    / 2**20) + ' MiB')
+
+
+def benchmark_parallel_construction(number_of_texts=20000, numbers_of_jobs=(1, 2, 4, 8), seed=0):
+    """ Print the wall times of the factor extraction and of the construction of the item-bag matrix of generic bags
+    with several numbers of processes, and their speedups. The times are not traced by 'tracemalloc',
+    which does not follow the processes of the pool. The time of the work done in the shards is also printed,
+    as a proportion of the serial time: the rest is done by the main process, which bounds the speedups. """
+    texts = [clean_text(text) for text in zipfian_corpus(number_of_texts, seed)]
+    bags = [tuple(text.split()) for text in texts]
+    print(str(number_of_texts) + ' texts, ' + str(os.cpu_count()) + ' processors')
+    constructions = (('factor extraction', lambda n_jobs: factor_index_and_matrix_from_texts(
+                          texts, DEFAULT_MAX_FACTOR_LENGTH, n_jobs=n_jobs),
+                      lambda: [factor_codes_from_texts(shard, DEFAULT_MAX_FACTOR_LENGTH)
+                               for shard in shards_from_iterable(texts)]),
+                     ('word bags', lambda n_jobs: item_and_bag_indices_and_matrix_from_bags(bags, n_jobs),
+                      lambda: [local_bags_and_matrix_from_bags(shard) for shard in shards_from_iterable(bags)]))
+    for label, function, shard_function in constructions:
+        starting_time = time.perf_counter()
+        shard_function()
+        shard_time = time.perf_counter() - starting_time
+        serial_matrix = None
+        serial_time = None
+        for n_jobs in numbers_of_jobs:
+            starting_time = time.perf_counter()
+            matrix = function(n_jobs)[-1]
+            elapsed_time = time.perf_counter() - starting_time
+            if serial_matrix is None:
+                serial_matrix, serial_time = matrix, elapsed_time
+                print(label + ': time in the shards ' + '{:.3f}'.format(shard_time) + ' s, '
+                      + '{:.0%}'.format(shard_time / serial_time) + ' of the serial time')
+            is_equal = (are_equal_vectors(matrix.indptr, serial_matrix.indptr)
+                        and are_equal_vectors(matrix.indices, serial_matrix.indices)
+                        and are_equal_vectors(matrix.data, serial_matrix.data))
+            print(label + ' with ' + str(n_jobs) + ' jobs: time ' + '{:.3f}'.format(elapsed_time) + ' s, speedup '
+                  + '{:.2f}'.format(serial_time / elapsed_time) + (', equal' if is_equal else ', DIFFERENT'))
+
+
+def private_memory():
+    """ Return the bytes of memory of this process that are not shared with other processes, on Linux. """
+    with open('/proc/self/smaps_rollup', 'r') as file:
+        return 1024 * sum(int(line.split()[1]) for line in file if line.startswith(('Private_Clean', 'Private_Dirty')))
+
+
+def private_memory_of_query_worker(path, attach, texts):
+    """ Load or attach the model of 'path' in this process, query it and return the private memory it added. """
+    starting_memory = private_memory()
+    if attach:
+        distance = FittingDistanceOnTextCollections.attach(path)
+    else:
+        distance = FittingDistanceOnTextCollections.load(path, mmap=False)
+    for text in texts:
+        distance.nearest({text}, 10)
+    return private_memory() - starting_memory
+
+
+def benchmark_shared_workers(number_of_texts=5000, number_of_workers=4, number_of_queries=5,
+                             numbers_of_hashing_bits=(None, 20), seed=0):
+    """ Print the private memory of query workers holding their own copies of the arrays of the model,
+    and of query workers attached to the model shared by 'FittingDistanceOnTextCollections.share'.
+    The index maps are Python objects, that each worker holds, unless the factors are hashed,
+    and each worker also holds the memoized vectorizations of its queries. """
+    texts = zipfian_corpus(number_of_texts, seed)
+    for number_of_hashing_bits in numbers_of_hashing_bits:
+        distance = FittingDistanceOnTextCollections(texts, number_of_hashing_bits=number_of_hashing_bits)
+        benchmark_shared_model(distance, texts[:number_of_queries], number_of_workers,
+                               'hashing bits ' + str(number_of_hashing_bits))
+
+
+def benchmark_shared_model(distance, query_texts, number_of_workers, label):
+    path = distance.share()
+    try:
+        print(label + ', ' + str(number_of_workers) + ' workers, shared arrays '
+              + '{:.1f}'.format(sum(os.path.getsize(os.path.join(path, file)) for file in os.listdir(path)
+                                    if file.endswith('.npy')) / 2**20) + ' MiB')
+        for model_label, attach in (('copied', False), ('attached', True)):
+            with ProcessPoolExecutor(number_of_workers) as executor:
+                memories = list(executor.map(private_memory_of_query_worker, [path] * number_of_workers,
+                                             [attach] * number_of_workers, [query_texts] * number_of_workers))
+            print(model_label + ' models: private memory per worker ' + '{:.1f}'.format(np.mean(memories) / 2**20)
+                  + ' MiB')
+    finally:
+        shutil.rmtree(path)
+
+
+if __name__ == '__main__':
+    benchmark_factor_extraction()
+    benchmark_hashing_of_factors()
+    benchmark_pruning_of_factors()
+    benchmark_streaming_construction()
+    benchmark_parallel_construction()
+    benchmark_shared_workers()
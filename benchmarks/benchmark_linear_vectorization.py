@@ -0,0 +1,45 @@
+# © 2020 Nokia
+# Licensed under the BSD 3-Clause License.
+# SPDX-License-Identifier: BSD-3-Clause
+# !/usr/bin/env python3
+# coding: utf-8
+# Author: Élie de Panafieu  <elie.de_panafieu@nokia-bell-labs.com>
+
+
+import random
+from vectorization_of_bag_collections.linear_vectorization import *
+from benchmarks.measurement import *
+
+
+def dict_tfidf_item_weights(vectorize):
+    """ Former implementation of 'LinearVectorization.tfidf_item_weights', kept as reference. """
+    number_of_bags = len(vectorize.bag_to_index)
+    item_to_weight = {item: log_of_ratio_zero_if_null_denominator(
+        number_of_bags, count_nonzero_entries_in_matrix_row_with_getrow(vectorize.item_bag_matrix, index))
+        for item, index in vectorize.item_to_index.items()}
+    return vectorize.item_vector_from_dict(item_to_weight)
+
+
+def count_nonzero_entries_in_matrix_row_with_getrow(matrix, row_index):
+    return matrix.getrow(row_index).getnnz()
+
+
+def benchmark_tfidf_item_weights(number_of_bags=10000, bag_length=40, max_factor_length=5, seed=0):
+    random.seed(seed)
+    bags = [random_bag_of_factors(bag_length, max_factor_length) for _ in range(number_of_bags)]
+    vectorize, construction_time, construction_memory = time_and_peak_memory_from_function(
+        LinearVectorization, bags)
+    print(str(number_of_bags) + ' bags, ' + str(len(vectorize.item_to_index)) + ' distinct items')
+    print_measure('construction with vectorized tf-idf', construction_time, construction_memory)
+    vector_weights, vector_time, vector_memory = time_and_peak_memory_from_function(
+        vectorize.tfidf_item_weights_vector)
+    print_measure('vectorized tf-idf', vector_time, vector_memory)
+    dict_weights, dict_time, dict_memory = time_and_peak_memory_from_function(dict_tfidf_item_weights, vectorize)
+    print_measure('tf-idf through getrow and dictionary', dict_time, dict_memory)
+    if not are_almost_equal_vectors(vector_weights, dict_weights):
+        raise ValueError('The two tf-idf computations disagree.')
+    print('construction time saved ' + '{:.3f}'.format(dict_time - vector_time) + ' s')
+
+
+if __name__ == '__main__':
+    benchmark_tfidf_item_weights()
@@ -0,0 +1,44 @@
+# © 2020 Nokia
+# Licensed under the BSD 3-Clause License.
+# SPDX-License-Identifier: BSD-3-Clause
+# !/usr/bin/env python3
+# coding: utf-8
+# Author: Élie de Panafieu  <elie.de_panafieu@nokia-bell-labs.com>
+
+
+import random
+from scipy.sparse import lil_matrix
+from matrix_operations import *
+from vectorization_of_bag_collections.vector_space import map_to_index_from_iterable, union_from_iterables
+from benchmarks.measurement import *
+
+
+def lil_matrix_from_bags_and_index_maps(bags, item_to_index, bag_to_index):
+    """ Former implementation of 'matrix_from_bags_and_index_maps', kept as reference. """
+    matrix = lil_matrix((len(item_to_index), len(bag_to_index)), dtype='int')
+    for bag in bags:
+        for item in bag:
+            matrix[item_to_index[item], bag_to_index[bag]] += 1
+    return matrix.tocsr()
+
+
+def benchmark_matrix_from_bags_and_index_maps(number_of_bags=1000, bag_length=200, max_factor_length=5, seed=0):
+    random.seed(seed)
+    bags = [random_bag_of_factors(bag_length, max_factor_length) for _ in range(number_of_bags)]
+    item_to_index = map_to_index_from_iterable(union_from_iterables(bags))
+    bag_to_index = map_to_index_from_iterable(bags)
+    print(str(number_of_bags) + ' bags, ' + str(sum(len(bag) for bag in bags)) + ' item occurrences, '
+          + str(len(item_to_index)) + ' distinct items')
+    bulk_matrix, bulk_time, bulk_memory = time_and_peak_memory_from_function(
+        matrix_from_bags_and_index_maps, bags, item_to_index, bag_to_index)
+    print_measure('bulk builder', bulk_time, bulk_memory)
+    lil_matrix, lil_time, lil_memory = time_and_peak_memory_from_function(
+        lil_matrix_from_bags_and_index_maps, bags, item_to_index, bag_to_index)
+    print_measure('lil builder', lil_time, lil_memory)
+    if (bulk_matrix != lil_matrix).getnnz() != 0:
+        raise ValueError('The two builders disagree.')
+    print('speedup ' + '{:.1f}'.format(lil_time / bulk_time))
+
+
+if __name__ == '__main__':
+    benchmark_matrix_from_bags_and_index_maps()
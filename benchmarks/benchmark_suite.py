@@ -0,0 +1,167 @@
+# © 2020 Nokia
+# Licensed under the BSD 3-Clause License.
+# SPDX-License-Identifier: BSD-3-Clause
+# !/usr/bin/env python3
+# coding: utf-8
+# Author: Élie de Panafieu  <elie.de_panafieu@nokia-bell-labs.com>
+
+
+""" Offline benchmark suite of 'FittingDistanceOnTextCollections' on seeded synthetic corpora.
+Run from the root of the repository, for example
+
+    python -m benchmarks.benchmark_suite --sizes 500 2000 --output results.json --compare baseline.json
+
+which measures the main operations at each corpus size, writes the results as JSON,
+and prints the ratios of the times to those of a former run. """
+
+
+import argparse
+import json
+import platform
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+import numpy as np
+import scipy
+from fitting_distance_on_text_collections import FittingDistanceOnTextCollections
+from oracle_claim import OracleClaim
+from benchmarks.synthetic_corpus import zipfian_corpus
+
+
+DEFAULT_SIZES = (500, 2000, 8000)
+DEFAULT_REPEATS = 3
+NUMBER_OF_QUERIES = 50
+NUMBER_OF_NEIGHBOURS = 10
+# The all-pairs distance matrix is computed on at most this number of texts, since its size is quadratic.
+MAX_PAIRWISE_SIZE = 1000
+
+
+def measure(function, repeats=DEFAULT_REPEATS, setup=None):
+    """ Return '(result, time, peak_memory)' where 'time' is the smallest wall time in seconds of 'function()'
+    over 'repeats' calls, and 'peak_memory' the peak of memory in bytes allocated during an additional call
+    traced by 'tracemalloc', which is not timed since tracing slows down the allocations.
+    If 'setup' is given, each call is 'function(setup())' and the call to 'setup' is neither timed nor traced. """
+    elapsed_times = []
+    result = None
+    for _ in range(repeats + 1):
+        arguments = () if setup is None else (setup(),)
+        if len(elapsed_times) == repeats:
+            tracemalloc.start()
+            function(*arguments)
+            _, peak_memory = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+        else:
+            starting_time = time.perf_counter()
+            result = function(*arguments)
+            elapsed_times.append(time.perf_counter() - starting_time)
+    return result, min(elapsed_times), peak_memory
+
+
+def benchmark_size(number_of_texts, seed=0, repeats=DEFAULT_REPEATS):
+    """ Return the list of the measures, as dictionaries, of the operations on a corpus of 'number_of_texts' texts.
+    The times of the queries are per query. """
+    texts = zipfian_corpus(number_of_texts, seed)
+    rng = random.Random(seed)
+    query_pairs = [rng.sample(texts, 2) for _ in range(NUMBER_OF_QUERIES)]
+    pairwise_texts = [{text} for text in texts[:MAX_PAIRWISE_SIZE]]
+    measures = []
+
+    def add_measure(operation, function, number_of_calls=1, setup=None, **details):
+        _, elapsed_time, peak_memory = measure(function, repeats, setup)
+        measures.append({'size': number_of_texts, 'operation': operation, 'time': elapsed_time / number_of_calls,
+                         'peak_memory': peak_memory, **details})
+
+    add_measure('construction', lambda: FittingDistanceOnTextCollections(texts))
+    distance = FittingDistanceOnTextCollections(texts, cache_size=0)
+    add_measure('single_query', lambda: [distance({text0}, {text1}) for text0, text1 in query_pairs],
+                NUMBER_OF_QUERIES)
+    add_measure('all_pairs', lambda: distance.pairwise(pairwise_texts), number_of_pairs=len(pairwise_texts) ** 2)
+    # The first query builds the inverted index, which is measured apart.
+    add_measure('top_k_index', lambda built_distance: built_distance.nearest({texts[0]}, 1),
+                setup=lambda: FittingDistanceOnTextCollections(texts))
+    distance.nearest({texts[0]}, 1)
+    add_measure('top_k', lambda: [distance.nearest({text}, NUMBER_OF_NEIGHBOURS) for text, _ in query_pairs],
+                NUMBER_OF_QUERIES, number_of_neighbours=NUMBER_OF_NEIGHBOURS)
+    claims = [OracleClaim(({text0}, {text1}), (0., 0.8 * distance({text0}, {text1})))
+              for text0, text1 in query_pairs]
+
+    def fitting_distance():
+        random.seed(seed)
+        return FittingDistanceOnTextCollections(texts, cache_size=0)
+
+    summary, elapsed_time, peak_memory = measure(lambda fitting: fitting.fit(claims), repeats, fitting_distance)
+    measures.append({'size': number_of_texts, 'operation': 'fit', 'time': elapsed_time, 'peak_memory': peak_memory,
+                     'number_of_claims': len(claims), 'epochs': summary['epochs'],
+                     'violated_claims': summary['violated_claims']})
+    return measures
+
+
+def environment():
+    return {'python': platform.python_version(), 'numpy': np.__version__, 'scipy': scipy.__version__,
+            'platform': platform.platform(), 'commit': git_commit(), 'date': time.strftime('%Y-%m-%dT%H:%M:%S')}
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_suite(sizes=DEFAULT_SIZES, seed=0, repeats=DEFAULT_REPEATS, verbose=True):
+    """ Return the dictionary of the environment, the parameters and the measures of the suite. """
+    measures = []
+    for size in sizes:
+        for size_measure in benchmark_size(size, seed, repeats):
+            if verbose:
+                print(line_from_measure(size_measure))
+            measures.append(size_measure)
+    return {'environment': environment(), 'sizes': list(sizes), 'seed': seed, 'repeats': repeats,
+            'measures': measures}
+
+
+def line_from_measure(size_measure, reference=None):
+    line = (str(size_measure['size']) + ' texts, ' + size_measure['operation'] + ': time '
+            + '{:.4f}'.format(size_measure['time']) + ' s, peak memory '
+            + '{:.1f}'.format(size_measure['peak_memory'] / 2**20) + ' MiB')
+    if reference is not None:
+        line += (', time ratio ' + '{:.2f}'.format(size_measure['time'] / reference['time'])
+                 + ', memory ratio ' + '{:.2f}'.format(size_measure['peak_memory'] / max(1, reference['peak_memory'])))
+    return line
+
+
+def comparison_lines(results, reference_results):
+    """ Return the lines comparing the measures of 'results' to those of 'reference_results'
+    for the same size and operation, a ratio above one meaning a regression. """
+    key_to_reference = {(reference['size'], reference['operation']): reference
+                        for reference in reference_results['measures']}
+    return [line_from_measure(size_measure, key_to_reference[(size_measure['size'], size_measure['operation'])])
+            for size_measure in results['measures']
+            if (size_measure['size'], size_measure['operation']) in key_to_reference]
+
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(description='Benchmark the distance on synthetic corpora.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(DEFAULT_SIZES), help='numbers of texts')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeats', type=int, default=DEFAULT_REPEATS, help='timed calls per operation')
+    parser.add_argument('--output', help='JSON file of the results')
+    parser.add_argument('--compare', help='JSON file of former results to compare with')
+    arguments = parser.parse_args(arguments)
+    results = run_suite(arguments.sizes, arguments.seed, arguments.repeats)
+    if arguments.output is not None:
+        with open(arguments.output, 'w') as file:
+            json.dump(results, file, indent=2)
+    if arguments.compare is not None:
+        with open(arguments.compare, 'r') as file:
+            reference_results = json.load(file)
+        print('Comparison with ' + arguments.compare + ' (' + str(reference_results['environment']['commit']) + ')')
+        for line in comparison_lines(results, reference_results):
+            print(line)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,41 @@
+# © 2020 Nokia
+# Licensed under the BSD 3-Clause License.
+# SPDX-License-Identifier: BSD-3-Clause
+# !/usr/bin/env python3
+# coding: utf-8
+# Author: Élie de Panafieu  <elie.de_panafieu@nokia-bell-labs.com>
+
+
+import random
+import time
+import tracemalloc
+
+
+ALPHABET = 'abcdefghijklmnopqrstuvwxyz'
+
+
+def time_and_peak_memory_from_function(function, *args, **kwargs):
+    """ Return '(result, time, peak_memory)' where 'time' is the wall time in seconds of 'function(*args, **kwargs)'
+    and 'peak_memory' the peak of memory in bytes allocated during the call, as traced by 'tracemalloc'. """
+    tracemalloc.start()
+    starting_time = time.perf_counter()
+    result = function(*args, **kwargs)
+    elapsed_time = time.perf_counter() - starting_time
+    _, peak_memory = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed_time, peak_memory
+
+
+def random_text(length, alphabet=ALPHABET):
+    return ''.join(random.choice(alphabet) for _ in range(length))
+
+
+def random_bag_of_factors(length, max_factor_length, alphabet=ALPHABET):
+    text = random_text(length, alphabet)
+    return tuple(text[start:end] for start in range(len(text))
+                 for end in range(start + 1, 1 + min(len(text), start + max_factor_length)))
+
+
+def print_measure(name, elapsed_time, peak_memory):
+    print(name + ': time ' + '{:.3f}'.format(elapsed_time) + ' s, peak memory '
+          + '{:.1f}'.format(peak_memory / 2**20) + ' MiB')
@@ -0,0 +1,58 @@
+# © 2020 Nokia
+# Licensed under the BSD 3-Clause License.
+# SPDX-License-Identifier: BSD-3-Clause
+# !/usr/bin/env python3
+# coding: utf-8
+# Author: Élie de Panafieu  <elie.de_panafieu@nokia-bell-labs.com>
+
+
+import numpy as np
+from benchmarks.measurement import ALPHABET
+
+
+DEFAULT_VOCABULARY_SIZE = 20000
+# Exponent of the Zipf law of the word frequencies, close to the one measured on English corpora.
+DEFAULT_ZIPF_EXPONENT = 1.07
+# The word lengths and the text lengths, in words, follow log-normal laws of these medians and shapes.
+DEFAULT_MEDIAN_WORD_LENGTH = 6.
+DEFAULT_WORD_LENGTH_SIGMA = 0.35
+DEFAULT_MEDIAN_TEXT_LENGTH = 80.
+DEFAULT_TEXT_LENGTH_SIGMA = 0.7
+
+
+def zipfian_vocabulary(rng, vocabulary_size=DEFAULT_VOCABULARY_SIZE, median_word_length=DEFAULT_MEDIAN_WORD_LENGTH,
+                       word_length_sigma=DEFAULT_WORD_LENGTH_SIGMA, alphabet=ALPHABET):
+    """ Return the list of 'vocabulary_size' distinct random words, sorted by decreasing frequency,
+    the shortest words being the most frequent ones as in natural languages. """
+    letters = np.array(list(alphabet))
+    lengths = np.sort(np.maximum(1, np.round(rng.lognormal(np.log(median_word_length), word_length_sigma,
+                                                           vocabulary_size))).astype(int))
+    vocabulary = dict()
+    for length in lengths:
+        word = ''.join(rng.choice(letters, length))
+        while word in vocabulary:
+            word = ''.join(rng.choice(letters, length + 1))
+        vocabulary[word] = None
+    return list(vocabulary)
+
+
+def zipfian_probabilities(vocabulary_size, exponent=DEFAULT_ZIPF_EXPONENT) -> np.ndarray:
+    """ Return the probabilities of the words of ranks '1, ..., vocabulary_size' under the Zipf law. """
+    weights = np.arange(1, vocabulary_size + 1, dtype=float) ** -exponent
+    return weights / weights.sum()
+
+
+def zipfian_corpus(number_of_texts, seed=0, vocabulary_size=DEFAULT_VOCABULARY_SIZE,
+                   exponent=DEFAULT_ZIPF_EXPONENT, median_text_length=DEFAULT_MEDIAN_TEXT_LENGTH,
+                   text_length_sigma=DEFAULT_TEXT_LENGTH_SIGMA):
+    """ Return a list of 'number_of_texts' random texts, that only depends on the parameters.
+    The words of the texts are drawn independently from a Zipfian vocabulary,
+    and the texts are capitalized sentences ending with a period. """
+    rng = np.random.default_rng(seed)
+    vocabulary = np.array(zipfian_vocabulary(rng, vocabulary_size), dtype=object)
+    probabilities = zipfian_probabilities(vocabulary_size, exponent)
+    text_lengths = np.maximum(1, np.round(rng.lognormal(np.log(median_text_length), text_length_sigma,
+                                                        number_of_texts))).astype(int)
+    words = vocabulary[rng.choice(vocabulary_size, int(text_lengths.sum()), p=probabilities)]
+    ends = np.cumsum(text_lengths)
+    return [' '.join(words[end - length:end]).capitalize() + '.' for end, length in zip(ends, text_lengths)]
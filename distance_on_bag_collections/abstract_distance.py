@@ -6,6 +6,9 @@
 # Author: Élie de Panafieu  <elie.de_panafieu@nokia-bell-labs.com>
 
 
+from matrix_operations import *
+
+
 class AbstractDistance:
 
     def __init__(self):
@@ -19,3 +22,15 @@ class AbstractDistance:
 
     def second_partial_gradient(self, vector0, vector1):
         return self.first_partial_gradient(vector1, vector0)
+
+    def value_and_gradients(self, vector0, vector1):
+        """ Return '(distance, (first_partial_gradient, second_partial_gradient))' at '(vector0, vector1)'.
+        Subclasses are expected to override it to share the computations common to the three results. """
+        return self(vector0, vector1), tuple(gradient(vector0, vector1) for gradient in self.partial_gradients)
+
+    def pairwise(self, matrix0, matrix1):
+        """ Return the array of distances between the columns of 'matrix0' and the columns of 'matrix1'.
+        Subclasses are expected to override this column by column evaluation with matrix operations. """
+        columns1 = [column_from_matrix(matrix1, index1) for index1 in range(number_of_columns_from_matrix(matrix1))]
+        return make_vector([[self(column_from_matrix(matrix0, index0), column1) for column1 in columns1]
+                            for index0 in range(number_of_columns_from_matrix(matrix0))])
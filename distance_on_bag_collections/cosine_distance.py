@@ -21,16 +21,38 @@ class CosineDistance(AbstractDistance):
         return 1. - scalar_product(vector0, vector1)
 
     def first_partial_gradient(self, vector0, vector1):
-        distance = self(vector0, vector1)
         normalized_vector0 = normalize(vector0)
         normalized_vector1 = normalize(vector1)
+        distance = 1. - scalar_product(normalized_vector0, normalized_vector1)
         return ((1 - distance) * normalized_vector0 - normalized_vector1) / norm_from_vector(vector0)
 
+    def value_and_gradients(self, vector0, vector1):
+        norm0 = norm_from_vector(vector0)
+        norm1 = norm_from_vector(vector1)
+        normalized_vector0 = normalize_from_norm(vector0, norm0)
+        normalized_vector1 = normalize_from_norm(vector1, norm1)
+        distance = 1. - scalar_product(normalized_vector0, normalized_vector1)
+        return distance, (((1 - distance) * normalized_vector0 - normalized_vector1) / norm0,
+                          ((1 - distance) * normalized_vector1 - normalized_vector0) / norm1)
+
+    def batch_values_and_partial_gradients(self, matrix0, matrix1):
+        """ Return '(values, (gradients0, gradients1))' where 'values[j]' is the distance between
+        the columns 'j' of 'matrix0' and 'matrix1', and the columns 'j' of 'gradients0' and 'gradients1'
+        are the corresponding partial gradients. """
+        normalized_matrix0 = normalize_matrix_columns(matrix0)
+        normalized_matrix1 = normalize_matrix_columns(matrix1)
+        scalar_products = column_wise_scalar_products(normalized_matrix0, normalized_matrix1)
+        values = 1. - scalar_products
+        gradients0 = rescale_matrix_columns(rescale_matrix_columns(normalized_matrix0, scalar_products)
+                                            - normalized_matrix1,
+                                            inverse_zero_if_null(column_norms_from_matrix(matrix0)))
+        gradients1 = rescale_matrix_columns(rescale_matrix_columns(normalized_matrix1, scalar_products)
+                                            - normalized_matrix0,
+                                            inverse_zero_if_null(column_norms_from_matrix(matrix1)))
+        return values, (gradients0, gradients1)
+
+    def pairwise(self, matrix0, matrix1):
+        normalized_matrix0 = normalize_matrix_columns(matrix0)
+        normalized_matrix1 = normalize_matrix_columns(matrix1)
+        return 1. - transpose_matrix_product(normalized_matrix0, normalized_matrix1)
 
-""" def test_cosine_distance(self):
-        u = make_vector([1., 3., 2.])
-        v = make_vector([2., -1., 0.5])
-        zero_vector = make_vector([0., 0., 0.])
-        self.assertAlmostEqual(cosine_distance(zero_vector, u), 1.)
-        expected = 1. - scalar_product(u, v) / norm_from_vector(u) / norm_from_vector(v)
-        self.assertAlmostEqual(cosine_distance(u, v), expected)"""
\ No newline at end of file
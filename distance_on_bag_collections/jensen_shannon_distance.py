@@ -23,11 +23,18 @@ class JensenShannonDistance(AbstractDistance):
         return np.sqrt(distribution.get_mean())
 
     def first_partial_gradient(self, vector0, vector1):
+        _, (first_partial_gradient, _) = self.value_and_gradients(vector0, vector1)
+        return first_partial_gradient
+
+    def value_and_gradients(self, vector0, vector1):
+        """ Return the distance and its partial gradients, which are the values of the Jensen-Shannon distribution
+        divided by four times the distance, so that the distance is evaluated once. """
         probabilities0 = probabilities_from_vector(vector0)
-        probabilities1 = probabilities_from_vector(vector1)
-        mixture = mixture_from_probabilities(probabilities0, probabilities1)
-        return ((information_log_from_vector(probabilities0) - information_log_from_vector(mixture))
-                / 4. / self(vector0, vector1))
+        distribution = jensen_shannon_distribution_from_probabilities(probabilities0,
+                                                                      probabilities_from_vector(vector1))
+        distance = np.sqrt(distribution.get_mean())
+        gradients = distribution.values / 4. / distance
+        return distance, (gradients[:len(probabilities0)], gradients[len(probabilities0):])
 
     @staticmethod
     def get_variance(vector0, vector1):
@@ -38,14 +45,19 @@ class JensenShannonDistance(AbstractDistance):
 
 
 def jensen_shannon_distribution_from_probabilities(probabilities0, probabilities1):
-    mixture = mixture_from_probabilities(probabilities0, probabilities1)
-    values0 = information_log_from_vector(probabilities0) - information_log_from_vector(mixture)
-    values1 = information_log_from_vector(probabilities1) - information_log_from_vector(mixture)
+    values0, values1 = jensen_shannon_values_from_probabilities(probabilities0, probabilities1)
     values = concatenate_vectors(values0, values1)
     probabilities = concatenate_vectors(0.5 * probabilities0, 0.5 * probabilities1)
     return Distribution(values, probabilities)
 
 
+def jensen_shannon_values_from_probabilities(probabilities0, probabilities1):
+    """ Return the pair of vectors 'log2(probabilities_i) - log2(mixture)' for 'i' in '(0, 1)'. """
+    information_log_mixture = information_log_from_vector(mixture_from_probabilities(probabilities0, probabilities1))
+    return (information_log_from_vector(probabilities0) - information_log_mixture,
+            information_log_from_vector(probabilities1) - information_log_mixture)
+
+
 def mixture_from_probabilities(probabilities0, probabilities1):
     return 0.5 * probabilities0 + 0.5 * probabilities1
 
@@ -6,34 +6,210 @@
 # Author: Élie de Panafieu  <elie.de_panafieu@nokia-bell-labs.com>
 
 
+import heapq
+import os
+import pickle
+from matrix_operations import csc_matrix, save_matrix, load_matrix, save_vector, load_vector
+from memory_size import deep_size_from_object, projected_memory_report
+from shared_weights import SharedWeights, shared_directory
 from vectorization_of_bag_collections.fitting_linear_vectorization import FittingLinearVectorization
+from vectorization_of_bag_collections.linear_vectorization import DEFAULT_CACHE_SIZE
+from vectorization_of_bag_collections.matrix_store import MatrixStore
+from vectorization_of_bag_collections.random_projection_index import RandomProjectionIndex
+from vectorization_of_bag_collections.hashing_index_map import HashingIndexMap
 from distance_on_bag_collections.cosine_distance import CosineDistance
 # from distance_on_bag_collections.jensen_shannon_distance import JensenShannonDistance
 
 
 DEFAULT_SPEED = 0.3
 DEFAULT_NUMBER_OF_GRADIENT_STEPS = 6
+MODEL_FILE = 'fitting_distance.pickle'
+ITEM_BAG_MATRIX_PREFIX = 'item_bag_matrix'
+ITEM_BAG_MATRIX_BY_COLUMNS_PREFIX = 'item_bag_matrix_by_columns'
+ITEM_WEIGHTS_FILE = 'item_weights.npy'
+BAG_WEIGHTS_FILE = 'bag_weights.npy'
+# Files of the two slots of the weights shared by 'FittingDistance.share', the first one being written by 'save'.
+WEIGHTS_SLOT_FILES = ((ITEM_WEIGHTS_FILE, BAG_WEIGHTS_FILE), ('item_weights_1.npy', 'bag_weights_1.npy'))
+WEIGHTS_HEADER_FILE = 'weights_header.npy'
 
 
 class FittingDistance:
 
-    def __init__(self, bag_collection, distance=CosineDistance(), item_to_weight=None):
-        self.vectorize = FittingLinearVectorization(bag_collection, item_to_weight=item_to_weight)
+    def __init__(self, bag_collection, distance=CosineDistance(), item_to_weight=None, cache_size=DEFAULT_CACHE_SIZE,
+                 bag_to_weight=None, item_to_index=None, item_bag_matrix=None, compact_bags=False,
+                 min_df=None, max_df=None, max_features=None, instrumentation=None, n_jobs=None):
+        """ If 'compact_bags' is True, the bags are stored as instances of 'Bag' instead of the given iterables
+        of items, which the methods still accept. The bags returned by 'nearest' are then instances of 'Bag'.
+        'min_df', 'max_df' and 'max_features' prune the items, see 'VectorSpace.prune_items'.
+        The phases of the computations are timed by 'instrumentation', an 'Instrumentation' that is created
+        disabled if not provided, see 'self.instrumentation_statistics'.
+        The item-bag matrix is built in 'n_jobs' processes, see 'VectorSpace'. """
+        self.vectorize = FittingLinearVectorization(bag_collection, item_to_weight=item_to_weight,
+                                                    cache_size=cache_size, bag_to_weight=bag_to_weight,
+                                                    item_to_index=item_to_index, item_bag_matrix=item_bag_matrix,
+                                                    compact_bags=compact_bags, min_df=min_df, max_df=max_df,
+                                                    max_features=max_features, instrumentation=instrumentation,
+                                                    n_jobs=n_jobs)
+        self.instrumentation = self.vectorize.instrumentation
         self.distance = distance
+        self.approximate_index = None
+        # Weights shared with other processes, see 'self.share' and 'FittingDistance.attach'.
+        self.shared_weights = None
+        self.shared_weights_version = None
 
     def __call__(self, bags0, bags1):
+        self.synchronize()
         vectorization0 = self.vectorize(bags0)
         vectorization1 = self.vectorize(bags1)
-        return self.distance(vectorization0, vectorization1)
+        with self.instrumentation.phase('distance'):
+            return self.distance(vectorization0, vectorization1)
+
+    def pairwise(self, bag_collections0, bag_collections1=None):
+        """ Return the array of distances between each collection of 'bag_collections0'
+        and each collection of 'bag_collections1' (by default, 'bag_collections0' itself),
+        computed from all the vectorizations at once. """
+        self.synchronize()
+        vectorizations0 = self.vectorize.vectorization_matrix_from_collections(bag_collections0)
+        if bag_collections1 is None:
+            vectorizations1 = vectorizations0
+        else:
+            vectorizations1 = self.vectorize.vectorization_matrix_from_collections(bag_collections1)
+        with self.instrumentation.phase('distance'):
+            return self.distance.pairwise(vectorizations0, vectorizations1)
+
+    def nearest(self, bags, number_of_neighbours, approximate=False):
+        """ Return the list of the 'number_of_neighbours' pairs '(bag, distance)' such that
+        'distance == self(bags, {bag})' is minimal, sorted by increasing distance, then by bag index.
+        For the cosine distance, only the bags sharing an item with 'bags' are scored, using
+        'LinearVectorization.cosine_similarities_to_bags', and the other bags are at distance 1.
+        If 'approximate', only the candidates of 'self.approximate_index' are scored,
+        and fewer than 'number_of_neighbours' pairs may be returned. """
+        self.synchronize()
+        with self.instrumentation.phase('nearest'):
+            if approximate:
+                neighbours = self.approximate_nearest_indices(bags, number_of_neighbours)
+            elif isinstance(self.distance, CosineDistance):
+                neighbours = self.nearest_indices(bags, number_of_neighbours)
+            else:
+                bag_indices = self.vectorize.alive_bag_indices()
+                distances = self.pairwise([bags], [bag_indices[i:i + 1] for i in range(len(bag_indices))])[0]
+                neighbours = heapq.nsmallest(number_of_neighbours, zip(distances, bag_indices.tolist()))
+        return [(self.vectorize.bag_from_index(index), distance) for distance, index in neighbours]
+
+    def nearest_indices(self, bags, number_of_neighbours):
+        """ Return the pairs '(distance, bag_index)' of the nearest neighbours of 'bags' for the cosine distance. """
+        bag_indices, similarities = self.vectorize.cosine_similarities_to_bags(self.vectorize(bags))
+        positive = similarities > 0.
+        neighbours = heapq.nsmallest(number_of_neighbours, zip(1. - similarities[positive], bag_indices[positive]))
+        if len(neighbours) < number_of_neighbours:
+            scored_indices = set(bag_indices[positive])
+            unscored_indices = (index for index in self.vectorize.alive_bag_indices().tolist()
+                                if index not in scored_indices)
+            neighbours += [(1., index) for _, index in zip(range(number_of_neighbours - len(neighbours)),
+                                                           unscored_indices)]
+        return neighbours
+
+    def build_approximate_index(self, **kwargs):
+        """ Build the index used by 'self.nearest(..., approximate=True)',
+        see 'RandomProjectionIndex' for the keyword arguments. """
+        if not isinstance(self.distance, CosineDistance):
+            raise ValueError('Error in build_approximate_index: the approximate index requires the cosine distance.')
+        self.approximate_index = RandomProjectionIndex(self.vectorize, **kwargs)
+
+    def approximate_nearest_indices(self, bags, number_of_neighbours):
+        """ Return the list of pairs '(distance, bag_index)' of the approximate nearest neighbours of 'bags'.
+        The index is first rebuilt if the weights changed since it was built. """
+        if self.approximate_index is None:
+            raise ValueError('Error in approximate_nearest_indices: call build_approximate_index first.')
+        self.approximate_index.refresh()
+        bag_indices, similarities = self.approximate_index.cosine_similarities_to_bags(self.vectorize(bags))
+        alive = ~self.vectorize.bag_is_removed[bag_indices]
+        return heapq.nsmallest(number_of_neighbours, zip(1. - similarities[alive], bag_indices[alive]))
+
+    def add_bags(self, bags, bag_to_weight=None, item_bag_matrix=None):
+        """ Add the new bags of 'bags' to the collection without changing the weights of the former items and bags,
+        and return the array of their indices, see 'LinearVectorization.add_bags'.
+        The bags of a shared model are fixed, see 'self.share'. """
+        self.check_bags_can_change('add_bags')
+        return self.vectorize.add_bags(bags, bag_to_weight=bag_to_weight, item_bag_matrix=item_bag_matrix)
+
+    def remove_bags(self, bags):
+        """ Remove the bags of 'bags' from the collection. Their indices stay unused until the collection is compacted
+        by 'self.compact', or automatically if 'self.vectorize.compaction_ratio' is set, in which case
+        the array mapping the former indices to the new ones is returned, see 'VectorSpace.remove_bags'.
+        The bags of a shared model are fixed, see 'self.share'. """
+        self.check_bags_can_change('remove_bags')
+        return self.vectorize.remove_bags(bags)
+
+    def compact(self):
+        """ Renumber the bags to drop the indices of the removed bags, see 'VectorSpace.compact'. """
+        self.check_bags_can_change('compact')
+        return self.vectorize.compact()
+
+    def is_shared(self):
+        """ Return whether the model was shared by 'self.share' or attached by 'FittingDistance.attach'. """
+        return self.shared_weights is not None
+
+    def check_bags_can_change(self, method_name):
+        """ Raise a ValueError before any change if the model is shared, since its weights are published
+        to the attached models in vectors of fixed lengths. """
+        if self.is_shared():
+            raise ValueError('Error in ' + method_name + ': the bags of a shared model cannot change, '
+                             'change them before sharing the model.')
 
     def fit(self, oracle_claims, speed=DEFAULT_SPEED, ratio_item_bag_fitting=0.5,
-            number_of_gradient_steps=DEFAULT_NUMBER_OF_GRADIENT_STEPS):
+            number_of_gradient_steps=DEFAULT_NUMBER_OF_GRADIENT_STEPS, batch_size=None, tolerance=0.,
+            adaptive_speed=False):
+        """ If 'batch_size' is provided, the oracle claims are processed by mini-batches:
+        the weights are updated once per batch, from perturbations computed with matrix operations.
+        The fit stops before 'number_of_gradient_steps' epochs once the distances of all the claims are within
+        'tolerance' of their intervals. Return the summary of
+        'FittingLinearVectorization.fit_from_tuples_of_forms_arguments_intervals'.
+        A shared model publishes its new weights, whose lengths are checked before fitting. """
+        if self.shared_weights is not None and self.shared_weights.writable:
+            self.shared_weights.check_lengths([self.vectorize.item_weights_vector, self.vectorize.bag_weights_vector])
         tuples_forms_arguments_intervals = [(self.distance, oracle_claim.pair_of_bags, oracle_claim.distance_interval)
                                             for oracle_claim in oracle_claims]
-        self.vectorize.fit_from_tuples_of_forms_arguments_intervals(tuples_forms_arguments_intervals,
-                                                                    speed=speed,
-                                                                    ratio_item_bag_fitting=ratio_item_bag_fitting,
-                                                                    number_of_gradient_steps=number_of_gradient_steps)
+        summary = self.vectorize.fit_from_tuples_of_forms_arguments_intervals(
+            tuples_forms_arguments_intervals, speed=speed, ratio_item_bag_fitting=ratio_item_bag_fitting,
+            number_of_gradient_steps=number_of_gradient_steps, batch_size=batch_size, tolerance=tolerance,
+            adaptive_speed=adaptive_speed)
+        if self.shared_weights is not None and self.shared_weights.writable:
+            self.publish_weights()
+        return summary
+
+    def cache_statistics(self):
+        return self.vectorize.memoization.get_statistics()
+
+    def instrumentation_statistics(self):
+        """ Return the call counts and cumulative times of the phases, see 'Instrumentation.get_statistics'.
+        They are only recorded while 'self.instrumentation.enabled' is True. """
+        return self.instrumentation.get_statistics()
+
+    def memory_report(self, number_of_new_bags=0):
+        """ Return the bytes held by each structure of the model, with their total projected after adding
+        'number_of_new_bags' bags, see 'VectorSpace.memory_report'. An object shared by several structures
+        is counted in the first one. """
+        return projected_memory_report(self.memory_by_structure(set()), len(self.vectorize.bag_to_index),
+                                       len(self.vectorize.item_to_index), self.vectorize.new_items_per_bag(),
+                                       number_of_new_bags)
+
+    def memory_by_structure(self, seen):
+        structures = self.vectorize.memory_by_structure(seen)
+        structures['approximate_index'] = deep_size_from_object(self.approximate_index, seen)
+        structures['distance'] = deep_size_from_object(self.distance, seen)
+        return structures
+
+    def collision_report(self):
+        """ Return the statistics of 'HashingIndexMap.collision_report' when the items are hashed. """
+        if not isinstance(self.vectorize.item_to_index, HashingIndexMap):
+            raise ValueError('Error in collision_report: the items are not hashed.')
+        return self.vectorize.item_to_index.collision_report(self.vectorize.item_bag_matrix)
+
+    def indices_from_bags(self, bags):
+        """ Return the array of the indices of 'bags', that all the methods accept instead of a collection of bags,
+        see 'VectorSpace.indices_from_bags'. """
+        return self.vectorize.indices_from_bags(bags)
 
     def weight_from_item(self, item):
         if item not in self.vectorize.item_to_index:
@@ -41,4 +217,99 @@ class FittingDistance:
         return self.vectorize.item_weights_vector[self.vectorize.item_to_index[item]]
 
     def weight_from_bag(self, bag):
-        return self.vectorize.bag_weights_vector[self.vectorize.bag_to_index[bag]]
+        return self.vectorize.bag_weights_vector[self.vectorize.bag_to_index[self.vectorize.bag_key(bag)]]
+
+    def save(self, path):
+        """ Save the model in the directory 'path': the arrays of the item-bag matrix and the weight vectors
+        are stored as '.npy' files, that 'FittingDistance.load' can memory-map,
+        and the index maps and the distance are pickled. The saved model has no removed bags: its bags
+        are numbered as after 'self.compact', see 'VectorSpace.compaction_map', while this model is unchanged. """
+        os.makedirs(path, exist_ok=True)
+        item_bag_matrix = self.vectorize.item_bag_matrix
+        bag_weights_vector = self.vectorize.bag_weights_vector
+        bags = self.vectorize.bags_from_indices()
+        if self.vectorize.bag_is_removed.any():
+            kept_indices = self.vectorize.alive_bag_indices()
+            item_bag_matrix = item_bag_matrix[:, kept_indices]
+            bag_weights_vector = bag_weights_vector[kept_indices]
+            bags = [bags[index] for index in kept_indices]
+        save_matrix(item_bag_matrix, os.path.join(path, ITEM_BAG_MATRIX_PREFIX))
+        save_vector(self.vectorize.item_weights_vector, os.path.join(path, ITEM_WEIGHTS_FILE))
+        save_vector(bag_weights_vector, os.path.join(path, BAG_WEIGHTS_FILE))
+        model = {'item_to_index': self.vectorize.item_to_index,
+                 'bags': bags,
+                 'distance': self.distance,
+                 'cache_size': self.vectorize.memoization.max_bytes,
+                 'compact_bags': self.vectorize.compact_bags,
+                 'is_pruned': self.vectorize.is_pruned}
+        with open(os.path.join(path, MODEL_FILE), 'wb') as file:
+            pickle.dump(model, file, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """ Load a model saved by 'FittingDistance.save'. If 'mmap' is True, the arrays are memory-mapped
+        in copy-on-write mode, so that processes loading the same model share their pages. """
+        with open(os.path.join(path, MODEL_FILE), 'rb') as file:
+            model = pickle.load(file)
+        distance = cls(model['bags'], model['distance'],
+                       item_to_weight=load_vector(os.path.join(path, ITEM_WEIGHTS_FILE), mmap),
+                       cache_size=model['cache_size'],
+                       bag_to_weight=load_vector(os.path.join(path, BAG_WEIGHTS_FILE), mmap),
+                       item_to_index=model['item_to_index'],
+                       item_bag_matrix=load_matrix(os.path.join(path, ITEM_BAG_MATRIX_PREFIX), mmap),
+                       compact_bags=model.get('compact_bags', False))
+        distance.vectorize.is_pruned = model.get('is_pruned', False)
+        return distance
+
+    def share(self, path=None):
+        """ Save the model by 'self.save' in the directory 'path', by default a new directory in shared memory,
+        and return 'path', from which other processes attach the model by 'FittingDistance.attach'.
+        The arrays are memory-mapped by all the processes, this one included, so that they are stored once.
+        The weights are double-buffered, see 'SharedWeights', and 'self.fit' publishes the new weights
+        to the attached models. The directory is to be removed by the caller once the processes are done.
+        The bags of a shared or attached model cannot be added, removed or compacted any more:
+        'self.add_bags', 'self.remove_bags' and 'self.compact' raise a ValueError without changing the model.
+        As this model then uses the saved arrays, the removed bags are first dropped by 'self.compact',
+        which renumbers the bags: call 'self.compact' before to get the mapping of the indices. """
+        if path is None:
+            path = shared_directory()
+        if self.vectorize.bag_is_removed.any():
+            self.compact()
+        self.save(path)
+        save_matrix(self.vectorize.item_bag_matrix_by_columns, os.path.join(path, ITEM_BAG_MATRIX_BY_COLUMNS_PREFIX))
+        self.use_shared_matrix(path)
+        self.shared_weights = SharedWeights.create(path, WEIGHTS_SLOT_FILES, WEIGHTS_HEADER_FILE)
+        self.use_shared_weights()
+        return path
+
+    @classmethod
+    def attach(cls, path):
+        """ Load the model shared in the directory 'path' by 'FittingDistance.share', whose arrays are memory-mapped
+        without being copied. Before each query, the model takes the weights last published by the sharing process. """
+        distance = cls.load(path)
+        distance.use_shared_matrix(path)
+        distance.shared_weights = SharedWeights(path, WEIGHTS_SLOT_FILES, WEIGHTS_HEADER_FILE)
+        distance.use_shared_weights()
+        return distance
+
+    def use_shared_matrix(self, path):
+        """ Memory-map the item-bag matrix shared in 'path' in both formats of 'MatrixStore', so that the column
+        format is not computed again by each process. """
+        self.vectorize.item_bag_matrix_store = MatrixStore(
+            load_matrix(os.path.join(path, ITEM_BAG_MATRIX_PREFIX)),
+            load_matrix(os.path.join(path, ITEM_BAG_MATRIX_BY_COLUMNS_PREFIX), matrix_type=csc_matrix))
+
+    def publish_weights(self):
+        """ Publish the weights of this model to the models attached to it, see 'self.share'. """
+        self.shared_weights.publish([self.vectorize.item_weights_vector, self.vectorize.bag_weights_vector])
+        self.use_shared_weights()
+
+    def synchronize(self):
+        """ Take the weights published since the last query, if the model is shared. """
+        if self.shared_weights is not None and self.shared_weights.version() != self.shared_weights_version:
+            self.use_shared_weights()
+
+    def use_shared_weights(self):
+        self.shared_weights_version, (item_weights_vector, bag_weights_vector) = self.shared_weights.current()
+        self.vectorize.item_weights_vector = item_weights_vector
+        self.vectorize.bag_weights_vector = bag_weights_vector
@@ -6,38 +6,298 @@
 # Author: Élie de Panafieu  <elie.de_panafieu@nokia-bell-labs.com>
 
 
+import hashlib
+import json
+import os
+import pickle
+import numpy as np
 from fitting_distance import FittingDistance
+from instrumentation import Instrumentation
+from memory_size import deep_size_from_object, projected_memory_report
+from matrix_operations import *
+from vectorization_of_bag_collections.vector_space import map_to_index_from_iterable, union_from_iterables, \
+    extend_map_to_index, kept_item_indices_from_document_frequencies
+from vectorization_of_bag_collections.linear_vectorization import DEFAULT_CACHE_SIZE
+from vectorization_of_bag_collections.hashing_index_map import HashingIndexMap
 from distance_on_bag_collections.cosine_distance import CosineDistance
 from oracle_claim import OracleClaim
+from sharding import DEFAULT_SHARD_SIZE, map_shards_of_iterable
 
 
 DEFAULT_MAX_FACTOR_LENGTH = 5
+TEXT_MODEL_FILE = 'fitting_distance_on_text_collections.pickle'
+ALPHABET = 'abcdefghijklmnopqrstuvwxyz0123456789'
+SPACE = ' '
+# Keys of the texts in 'text_to_bag': the texts themselves, digests of the texts, or identifiers given with the texts.
+TEXT_KEYS = ('text', 'digest', 'id')
+DIGEST_SIZE = 16
+JSON_LINES_EXTENSIONS = ('.jsonl', '.ndjson', '.json')
+# The factors of length at most 'MAX_CODED_FACTOR_LENGTH' are coded by integers of type 'INDEX_TYPE'
+# in base 'CODE_BASE', the digit of each letter being given by 'LETTER_TO_DIGIT'.
+MAX_CODED_FACTOR_LENGTH = 12
+CODE_BASE = len(ALPHABET) + 2
+DIGIT_TO_LETTER = np.frombuffer((SPACE + ALPHABET + SPACE).encode('ascii'), dtype=np.uint8)
+LETTER_TO_DIGIT = np.zeros(128, dtype=INDEX_TYPE)
+LETTER_TO_DIGIT[DIGIT_TO_LETTER[1:]] = np.arange(1, CODE_BASE)
+
+
+class CleaningTable(dict):
+    """ Table of 'str.translate' mapping the code of each letter to the code of 'clean_letter(letter)',
+    filled on the first occurrence of each letter. """
+
+    def __missing__(self, code):
+        self[code] = ord(clean_letter(chr(code)))
+        return self[code]
+
+
+CLEANING_TABLE = CleaningTable()
 
 
 class FittingDistanceOnTextCollections:
 
     def __init__(self, text_collection, distance=CosineDistance(),
                  max_factor_length=DEFAULT_MAX_FACTOR_LENGTH,
-                 factor_to_weight=None):
-        self.text_to_bag = {text: bag_of_factors_from_text(clean_text(text), max_factor_length)
-                            for text in text_collection}
-        if isinstance(text_collection, dict):
-            bags = {self.text_to_bag[text]: weight for text, weight in text_collection.items()}
+                 factor_to_weight=None,
+                 cache_size=DEFAULT_CACHE_SIZE,
+                 number_of_hashing_bits=None,
+                 min_df=None, max_df=None, max_features=None, instrumentation=None, text_keys='text', n_jobs=None):
+        """ If 'number_of_hashing_bits' is provided, the factors are hashed into '2 ** number_of_hashing_bits'
+        indices by a 'HashingIndexMap' instead of being stored in a dictionary,
+        which bounds the memory regardless of the number of distinct factors.
+        'min_df', 'max_df' and 'max_features' prune the factors by the number of texts containing them,
+        see 'VectorSpace.prune_items': the pruned factors have weight zero. They are dropped before the factor-bag
+        matrix and the dictionary of the factors are built, see 'factor_index_and_matrix_from_texts',
+        and the texts added later only count the kept factors. The hashed factors cannot be pruned.
+        See 'FittingDistance' for 'instrumentation', which also times the extraction of the factors.
+        'text_collection' is read once, so that it may be a generator, and 'text_keys' is one of 'TEXT_KEYS',
+        see 'FittingDistanceOnTextCollections.from_stream'.
+        The factor codes of the texts are extracted and counted in 'n_jobs' processes, while this process cleans
+        the texts, computes their keys and merges the shards, see 'factor_index_and_matrix_from_texts'. """
+        if text_keys not in TEXT_KEYS:
+            raise ValueError('Error in FittingDistanceOnTextCollections: text_keys must be one of '
+                             + ', '.join(TEXT_KEYS) + '.')
+        if instrumentation is None:
+            instrumentation = Instrumentation()
+        self.max_factor_length = max_factor_length
+        self.text_keys = text_keys
+        self.text_to_bag = dict()
+        factor_to_index = None
+        is_pruned = min_df is not None or max_df is not None or max_features is not None
+        if number_of_hashing_bits is not None:
+            if is_pruned:
+                raise ValueError('Error in FittingDistanceOnTextCollections: the hashed factors cannot be pruned.')
+            factor_to_index = HashingIndexMap(number_of_hashing_bits)
+        with instrumentation.phase('factor_extraction'):
+            self.text_to_bag, bags, factor_to_index, factor_bag_matrix = self.new_texts_and_factor_bag_matrix(
+                text_collection, dict(), factor_to_index, n_jobs, min_df, max_df, max_features)
+        if isinstance(text_collection, dict) and text_keys == 'text':
+            bag_to_weight = {self.text_to_bag[text]: weight for text, weight in text_collection.items()}
         else:
-            bags = self.text_to_bag.values()
-        self.fitting_distance = FittingDistance(bags, distance, item_to_weight=factor_to_weight)
+            bag_to_weight = inverse_zero_if_null(column_sums_from_matrix(factor_bag_matrix))
+        self.fitting_distance = FittingDistance(bags, distance, item_to_weight=factor_to_weight,
+                                                cache_size=cache_size, bag_to_weight=bag_to_weight,
+                                                item_to_index=factor_to_index, item_bag_matrix=factor_bag_matrix,
+                                                instrumentation=instrumentation)
+        self.fitting_distance.vectorize.is_pruned = is_pruned
+        self.bag_to_texts = None
+
+    @classmethod
+    def from_stream(cls, documents, with_ids=False, **kwargs):
+        """ Build the model from the iterable 'documents', for example a generator, read once document by document.
+        Only the factors of the distinct cleaned texts are kept, in arrays from which the factor-bag matrix is built
+        at the end, and neither the texts nor the cleaned texts are stored: the bags are identified by digests
+        of the cleaned texts, see 'digest_from_text'.
+        If 'with_ids', the documents are pairs '(text_id, text)', and the texts are then designated by their ids,
+        as in 'self.nearest({text_id}, 10)', which also returns ids. Otherwise, the documents are texts,
+        that the methods accept as usual, but that are stored as digests, and returned as digests by 'nearest'.
+        The keyword arguments are those of the constructor. """
+        return cls(documents, text_keys='id' if with_ids else 'digest', **kwargs)
+
+    @classmethod
+    def from_file(cls, path, text_field='text', id_field=None, **kwargs):
+        """ Build the model by 'from_stream' from the documents of the file 'path', see 'documents_from_file'. """
+        return cls.from_stream(documents_from_file(path, text_field, id_field), with_ids=id_field is not None,
+                               **kwargs)
+
+    def new_texts_and_factor_bag_matrix(self, text_collection, bag_to_index, factor_to_index=None, n_jobs=None,
+                                        min_df=None, max_df=None, max_features=None, extend_factor_index=True):
+        """ Return '(new_text_to_bag, bags, factor_to_index, factor_bag_matrix)' for the texts of 'text_collection'
+        absent from 'self.text_to_bag', where 'bags' are the bags absent from 'bag_to_index',
+        whose factors are counted by the columns of 'factor_bag_matrix', see 'factor_index_and_matrix_from_texts'.
+        The texts are read one at a time. """
+        new_text_to_bag = dict()
+        new_bags = dict()
+
+        def new_cleaned_texts():
+            for key, text in self.keys_and_texts(text_collection):
+                if key in self.text_to_bag or key in new_text_to_bag:
+                    continue
+                cleaned_text = clean_text(text)
+                bag = self.bag_from_cleaned_text(cleaned_text)
+                new_text_to_bag[key] = bag
+                if bag not in bag_to_index and bag not in new_bags:
+                    new_bags[bag] = None
+                    yield cleaned_text
+
+        factor_to_index, factor_bag_matrix = factor_index_and_matrix_from_texts(
+            new_cleaned_texts(), self.max_factor_length, factor_to_index, n_jobs, min_df=min_df, max_df=max_df,
+            max_features=max_features, extend_factor_index=extend_factor_index)
+        return new_text_to_bag, list(new_bags), factor_to_index, factor_bag_matrix
+
+    def keys_and_texts(self, text_collection):
+        """ Return the iterator of the pairs '(key, text)' of 'text_collection', where 'key' is the key of 'text'
+        in 'self.text_to_bag'. With identifiers, 'text_collection' is a dictionary or an iterable of pairs. """
+        if self.text_keys == 'id':
+            return iter(text_collection.items() if isinstance(text_collection, dict) else text_collection)
+        return ((self.text_key(text), text) for text in text_collection)
+
+    def text_key(self, text):
+        """ Return the key of 'text' in 'self.text_to_bag', that is its digest if the texts are stored as digests,
+        and 'text' itself otherwise, which is then a text or an identifier. """
+        if self.text_keys == 'digest':
+            return digest_from_text(text)
+        return text
+
+    def bag_from_cleaned_text(self, cleaned_text):
+        """ A bag of factors is identified by the cleaned text it comes from, or by its digest unless the texts
+        are stored. Its factors are only counted in the factor-bag matrix. """
+        if self.text_keys == 'text':
+            return cleaned_text
+        return digest_from_text(cleaned_text)
 
     def __call__(self, text_collection0, text_collection1):
         bags0 = self.bag_collection_from_text_collection(text_collection0)
         bags1 = self.bag_collection_from_text_collection(text_collection1)
         return self.fitting_distance(bags0, bags1)
 
-    def fit(self, text_oracle_claims):
+    def pairwise(self, text_collections0, text_collections1=None):
+        bag_collections0 = [self.bag_collection_from_text_collection(texts) for texts in text_collections0]
+        if text_collections1 is None:
+            return self.fitting_distance.pairwise(bag_collections0)
+        bag_collections1 = [self.bag_collection_from_text_collection(texts) for texts in text_collections1]
+        return self.fitting_distance.pairwise(bag_collections0, bag_collections1)
+
+    def nearest(self, text_collection, number_of_neighbours, approximate=False):
+        """ Return the list of the 'number_of_neighbours' pairs '(text, distance)' such that
+        'distance == self(text_collection, {text})' is minimal, sorted by increasing distance.
+        Texts sharing the same bag of factors are at the same distance and are listed together.
+        See 'FittingDistance.nearest' for 'approximate'. """
+        bags = self.bag_collection_from_text_collection(text_collection)
+        neighbours = []
+        for bag, distance in self.fitting_distance.nearest(bags, number_of_neighbours, approximate):
+            neighbours += [(text, distance) for text in self.texts_from_bag(bag)]
+            if len(neighbours) >= number_of_neighbours:
+                break
+        return neighbours[:number_of_neighbours]
+
+    def add_texts(self, text_collection):
+        """ Add the texts of 'text_collection' absent from the model, keeping the weights of the former factors
+        and texts, see 'FittingDistance.add_bags'. The weights of the new texts are given by 'text_collection'
+        if it is a dictionary, as in the constructor. With identifiers, see 'from_stream',
+        'text_collection' is an iterable of pairs '(text_id, text)' or a dictionary mapping the ids to the texts.
+        The texts of a shared model are fixed, see 'FittingDistance.share'. """
+        self.fitting_distance.check_bags_can_change('add_texts')
+        vectorize = self.fitting_distance.vectorize
+        with self.fitting_distance.instrumentation.phase('factor_extraction'):
+            new_text_to_bag, bags, _, factor_bag_matrix = self.new_texts_and_factor_bag_matrix(
+                text_collection, vectorize.bag_to_index, vectorize.item_to_index,
+                extend_factor_index=not vectorize.is_pruned)
+        if isinstance(text_collection, dict) and self.text_keys == 'text':
+            bag_to_weight = {bag: text_collection[text] for text, bag in new_text_to_bag.items()}
+        else:
+            bag_to_weight = inverse_zero_if_null(column_sums_from_matrix(factor_bag_matrix))
+        self.fitting_distance.add_bags(bags, bag_to_weight=bag_to_weight, item_bag_matrix=factor_bag_matrix)
+        self.text_to_bag.update(new_text_to_bag)
+        self.bag_to_texts = None
+
+    def remove_texts(self, texts):
+        """ Remove the texts of 'texts' from the model. The bag of a removed text is removed
+        once no other text has the same cleaned text. Return the mapping of the bag indices
+        if the bags were compacted, see 'FittingDistance.remove_bags'. """
+        self.fitting_distance.check_bags_can_change('remove_texts')
+        removed_bags = []
+        for text in dict.fromkeys(map(self.text_key, texts)):
+            bag = self.text_to_bag[text]
+            bag_texts = self.texts_from_bag(bag)
+            bag_texts.remove(text)
+            del self.text_to_bag[text]
+            if len(bag_texts) == 0:
+                del self.bag_to_texts[bag]
+                removed_bags.append(bag)
+        return self.fitting_distance.remove_bags(removed_bags)
+
+    def texts_from_bag(self, bag):
+        if self.bag_to_texts is None:
+            self.bag_to_texts = dict()
+            for text, text_bag in self.text_to_bag.items():
+                self.bag_to_texts.setdefault(text_bag, []).append(text)
+        return self.bag_to_texts[bag]
+
+    def build_approximate_index(self, **kwargs):
+        self.fitting_distance.build_approximate_index(**kwargs)
+
+    def fit(self, text_oracle_claims, batch_size=None, tolerance=0., adaptive_speed=False):
+        """ See 'FittingDistance.fit'. """
         bag_oracle_claims = {self.bag_oracle_claim_from_text_oracle_claim(claim) for claim in text_oracle_claims}
-        self.fitting_distance.fit(bag_oracle_claims)
+        return self.fitting_distance.fit(bag_oracle_claims, batch_size=batch_size, tolerance=tolerance,
+                                         adaptive_speed=adaptive_speed)
+
+    def save(self, path):
+        """ Save the model in the directory 'path', see 'FittingDistance.save', which does not renumber the bags
+        of this model. """
+        self.fitting_distance.save(path)
+        self.save_texts(path)
+
+    def save_texts(self, path):
+        """ Save the texts with the indices of their bags in the model saved by 'FittingDistance.save',
+        that is after compaction. """
+        bag_to_index = self.fitting_distance.vectorize.bag_to_index
+        old_to_new_index = self.fitting_distance.vectorize.compaction_map().tolist()
+        text_to_bag_index = {text: old_to_new_index[bag_to_index[bag]] for text, bag in self.text_to_bag.items()}
+        with open(os.path.join(path, TEXT_MODEL_FILE), 'wb') as file:
+            pickle.dump({'text_to_bag_index': text_to_bag_index, 'max_factor_length': self.max_factor_length,
+                         'text_keys': self.text_keys}, file, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """ Load a model saved by 'FittingDistanceOnTextCollections.save' without processing the texts again. """
+        return cls.load_texts(path, FittingDistance.load(path, mmap))
+
+    def share(self, path=None):
+        """ Share the model with other processes, that attach it by 'FittingDistanceOnTextCollections.attach',
+        and return the directory of the shared model, see 'FittingDistance.share', which compacts the bags. """
+        path = self.fitting_distance.share(path)
+        self.save_texts(path)
+        return path
+
+    @classmethod
+    def attach(cls, path):
+        """ Attach the model shared in the directory 'path', see 'FittingDistance.attach'. """
+        return cls.load_texts(path, FittingDistance.attach(path))
+
+    @classmethod
+    def load_texts(cls, path, fitting_distance):
+        """ Return the model of the texts saved in 'path' by 'self.save_texts' over 'fitting_distance'. """
+        with open(os.path.join(path, TEXT_MODEL_FILE), 'rb') as file:
+            model = pickle.load(file)
+        distance = cls.__new__(cls)
+        distance.max_factor_length = model['max_factor_length']
+        distance.text_keys = model.get('text_keys', 'text')
+        distance.fitting_distance = fitting_distance
+        bags = distance.fitting_distance.vectorize.bags_from_indices()
+        distance.text_to_bag = {text: bags[index] for text, index in model['text_to_bag_index'].items()}
+        distance.bag_to_texts = None
+        return distance
+
+    def indices_from_texts(self, texts):
+        """ Return the array of the indices of the bags of 'texts', that all the methods accept
+        instead of a collection of texts. Texts with the same cleaned text have the same index. """
+        return self.fitting_distance.indices_from_bags([self.text_to_bag[self.text_key(text)] for text in texts])
 
     def bag_collection_from_text_collection(self, text_collection):
-        return {self.text_to_bag[text] for text in text_collection}
+        if is_index_vector(text_collection):
+            return text_collection
+        return {self.text_to_bag[self.text_key(text)] for text in text_collection}
 
     def bag_oracle_claim_from_text_oracle_claim(self, text_oracle_claim):
         text_collection0, text_collection1 = text_oracle_claim.pair_of_bags
@@ -45,6 +305,28 @@ class FittingDistanceOnTextCollections:
         bags1 = self.bag_collection_from_text_collection(text_collection1)
         return OracleClaim((bags0, bags1), text_oracle_claim.distance_interval)
 
+    def cache_statistics(self):
+        return self.fitting_distance.cache_statistics()
+
+    def instrumentation_statistics(self):
+        return self.fitting_distance.instrumentation_statistics()
+
+    def collision_report(self):
+        return self.fitting_distance.collision_report()
+
+    def memory_report(self, number_of_new_texts=0):
+        """ Return the bytes held by each structure of the model, with their total projected after adding
+        'number_of_new_texts' texts, see 'FittingDistance.memory_report'. The cleaned texts are counted
+        in 'bag_to_index' rather than in 'text_to_bag'. """
+        vectorize = self.fitting_distance.vectorize
+        seen = set()
+        structures = self.fitting_distance.memory_by_structure(seen)
+        structures['text_to_bag'] = deep_size_from_object(self.text_to_bag, seen)
+        structures['bag_to_texts'] = deep_size_from_object(self.bag_to_texts, seen)
+        new_items_per_text = vectorize.new_items_per_bag() * len(vectorize.bag_to_index) / max(1, len(self.text_to_bag))
+        return projected_memory_report(structures, len(self.text_to_bag), len(vectorize.item_to_index),
+                                       new_items_per_text, number_of_new_texts)
+
     def weight_from_factor(self, factor):
         try:
             return self.fitting_distance.weight_from_item(factor)
@@ -52,7 +334,124 @@ class FittingDistanceOnTextCollections:
             return 0.
 
     def weight_from_text(self, text):
-        return self.fitting_distance.weight_from_bag(self.text_to_bag[text])
+        return self.fitting_distance.weight_from_bag(self.text_to_bag[self.text_key(text)])
+
+
+def factor_index_and_matrix_from_texts(texts, max_factor_length=None, factor_to_index=None, n_jobs=None,
+                                      shard_size=DEFAULT_SHARD_SIZE, min_df=None, max_df=None, max_features=None,
+                                      extend_factor_index=True):
+    """ Return '(factor_to_index, matrix)' where the coefficient of 'matrix' at '(factor_to_index[factor], k)'
+    is the number of occurrences of 'factor' in 'texts[k]', for the factors of length at most 'max_factor_length'.
+    The texts must be cleaned. Unless 'factor_to_index' is provided, it maps the factors to consecutive indices.
+    A provided dictionary is extended with the new factors, see 'extend_map_to_index', unless 'extend_factor_index'
+    is False: the factors it lacks are then ignored.
+    If any of 'min_df', 'max_df' and 'max_features' is provided, the factors are pruned as by 'VectorSpace.prune_items',
+    before the strings of the coded factors and 'factor_to_index' are built.
+    The factors are extracted as integer codes, so that a string is created only once per distinct factor.
+    The texts are read by shards of 'shard_size' texts, whose codes are extracted by 'factor_codes_from_texts'
+    in a pool of 'n_jobs' processes, which inherit 'texts' when it is a sequence and they are forked,
+    see 'map_shards_of_iterable', then merged in this process: the result does not depend on 'n_jobs'.
+    The merge, which builds the strings of the factors and the matrix, is not parallel, and bounds the speedup,
+    see 'benchmark_parallel_construction'. Factors too long to be coded are extracted in this process. """
+    codes = None
+    if max_factor_length is None or max_factor_length > MAX_CODED_FACTOR_LENGTH:
+        bags = [bag_of_factors_from_text(text, max_factor_length) for text in texts]
+        local_factor_to_index = map_to_index_from_iterable(union_from_iterables(bags))
+        factors = list(local_factor_to_index)
+        matrix = matrix_from_bags_and_index_maps(bags, local_factor_to_index, dict(zip(bags, range(len(bags)))))
+    else:
+        shards = list(map_shards_of_iterable(factor_codes_from_texts, texts, shard_size, n_jobs, max_factor_length))
+        codes = np.unique(concatenate_index_arrays([shard_codes for shard_codes, _, _, _ in shards]))
+        row_indices = concatenate_index_arrays([np.searchsorted(codes, shard_codes)[shard_row_indices]
+                                                for shard_codes, shard_row_indices, _, _ in shards])
+        counts = concatenate_vectors_from_list([shard_counts for _, _, shard_counts, _ in shards])
+        column_lengths = concatenate_index_arrays([shard_column_lengths for _, _, _, shard_column_lengths in shards])
+        matrix = matrix_from_column_lengths(row_indices, counts, column_lengths, len(codes))
+    if min_df is not None or max_df is not None or max_features is not None:
+        kept_indices = kept_item_indices_from_document_frequencies(count_nonzero_entries_in_matrix_rows(matrix),
+                                                                   matrix.shape[1], min_df, max_df, max_features)
+        matrix = matrix[kept_indices]
+        if codes is None:
+            factors = [factors[index] for index in kept_indices.tolist()]
+        else:
+            codes = codes[kept_indices]
+    if codes is not None:
+        factors = factors_from_codes(codes, max_factor_length)
+    if factor_to_index is None:
+        return dict(zip(factors, range(len(factors)))), matrix
+    if extend_factor_index:
+        extend_map_to_index(factor_to_index, factors)
+    row_map = np.fromiter((factor_to_index.get(factor, -1) for factor in factors), dtype=INDEX_TYPE, count=len(factors))
+    return factor_to_index, matrix_with_mapped_rows(matrix, row_map, len(factor_to_index))
+
+
+def factor_codes_from_texts(texts, max_factor_length):
+    """ Return '(codes, row_indices, counts, column_lengths)' for the factors of the cleaned 'texts', where 'codes'
+    is the sorted array of their distinct codes, see 'factor_codes_from_text', and the factors of each text
+    are given by consecutive slices of 'row_indices', indices in 'codes', and of 'counts', their numbers
+    of occurrences, the slice of 'texts[k]' having length 'column_lengths[k]'. """
+    codes_and_counts = [np.unique(factor_codes_from_text(text, max_factor_length), return_counts=True)
+                        for text in texts]
+    codes, row_indices = np.unique(concatenate_index_arrays([text_codes for text_codes, _ in codes_and_counts]),
+                                   return_inverse=True)
+    column_lengths = np.fromiter((len(text_codes) for text_codes, _ in codes_and_counts), dtype=INDEX_TYPE,
+                                 count=len(codes_and_counts))
+    return codes, make_index_vector(row_indices), concatenate_vectors_from_list(
+        [counts for _, counts in codes_and_counts]), column_lengths
+
+
+def digest_from_text(text) -> bytes:
+    """ Return the BLAKE2b digest of 'DIGEST_SIZE' bytes of 'text', that does not depend on the Python process. """
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=DIGEST_SIZE).digest()
+
+
+def documents_from_file(path, text_field='text', id_field=None):
+    """ Yield the documents of the file 'path', one per line, skipping the empty lines.
+    If the extension of 'path' is one of 'JSON_LINES_EXTENSIONS', each line is a JSON string,
+    or a JSON object whose text is the value of 'text_field'. Otherwise, each line is a text.
+    If 'id_field' is provided, the documents are the pairs '(text_id, text)' where 'text_id' is the value
+    of 'id_field' in the JSON object, or the number of the line for a plain text file. """
+    is_json = os.path.splitext(path)[1].lower() in JSON_LINES_EXTENSIONS
+    with open(path, 'r', encoding='utf-8') as file:
+        for line_number, line in enumerate(file):
+            text = line.rstrip('\r\n')
+            if len(text.strip()) == 0:
+                continue
+            text_id = line_number
+            if is_json:
+                text = json.loads(text)
+                if isinstance(text, dict):
+                    if id_field is not None:
+                        text_id = text[id_field]
+                    text = text[text_field]
+            yield text if id_field is None else (text_id, text)
+
+
+def factor_codes_from_text(text, max_factor_length) -> np.ndarray:
+    """ Return the array of the codes of the factors of the cleaned 'text' of length at most 'max_factor_length'.
+    The code of a factor is the integer written with the digits 'LETTER_TO_DIGIT' of its letters in base
+    'CODE_BASE'. As no letter has digit zero, distinct factors have distinct codes. """
+    digits = LETTER_TO_DIGIT[np.frombuffer(text.encode('ascii'), dtype=np.uint8)]
+    code_arrays = []
+    codes = np.zeros(len(digits), dtype=INDEX_TYPE)
+    for length in range(1, min(max_factor_length, len(digits)) + 1):
+        codes = codes[:len(digits) - length + 1] * CODE_BASE + digits[length - 1:]
+        code_arrays.append(codes)
+    return concatenate_index_arrays(code_arrays)
+
+
+def factors_from_codes(codes, max_factor_length):
+    """ Return the list of the factors whose codes are 'codes', see 'factor_codes_from_text'. """
+    digits = np.zeros((len(codes), max_factor_length), dtype=INDEX_TYPE)
+    remainders = make_index_vector(codes)
+    for position in range(max_factor_length - 1, -1, -1):
+        remainders, digits[:, position] = np.divmod(remainders, CODE_BASE)
+    # The digits of a factor shorter than 'max_factor_length' are preceded by zeros, that are moved to the end.
+    shifts = max_factor_length - np.count_nonzero(digits, axis=1)
+    rows, positions = np.nonzero(digits)
+    letters = np.zeros((len(codes), max_factor_length), dtype=np.uint8)
+    letters[rows, positions - shifts[rows]] = DIGIT_TO_LETTER[digits[rows, positions]]
+    return [factor.decode('ascii') for factor in letters.view('S' + str(max_factor_length)).ravel().tolist()]
 
 
 def bag_of_factors_from_text(text, max_factor_length=None):
@@ -63,13 +462,11 @@ def bag_of_factors_from_text(text, max_factor_length=None):
 
 
 def clean_text(text):
-    return ''.join(clean_letter(letter) for letter in text)
+    return text.translate(CLEANING_TABLE)
 
 
 def clean_letter(letter):
-    alphabet = 'abcdefghijklmnopqrstuvwxyz0123456789'
-    space = ' '
     lower_letter = letter.lower()
-    if lower_letter in alphabet:
+    if lower_letter in ALPHABET:
         return lower_letter
-    return space
+    return SPACE
@@ -0,0 +1,88 @@
+# © 2020 Nokia
+# Licensed under the BSD 3-Clause License.
+# SPDX-License-Identifier: BSD-3-Clause
+# !/usr/bin/env python3
+# coding: utf-8
+# Author: Élie de Panafieu  <elie.de_panafieu@nokia-bell-labs.com>
+
+
+import time
+from contextlib import nullcontext
+
+
+# Returned by 'Instrumentation.phase' when the instrumentation is disabled, so that a phase then costs one call.
+NULL_PHASE = nullcontext()
+
+
+class Instrumentation:
+    """ Call counts and cumulative wall times of the phases of the computations, such as
+    'factor_extraction', 'matrix_build', 'tfidf', 'vectorize', 'distance', 'gradient', 'weight_update' and 'fit'.
+    A phase is timed by 'with instrumentation.phase(name): ...', and the phases may be nested,
+    the time of a phase including those of the phases it contains.
+    Nothing is recorded unless 'enabled' is True. Each hook of 'self.hooks' is called
+    as 'hook(name, elapsed_time)' at the end of each phase, for example to export the timings. """
+
+    def __init__(self, enabled=False, hooks=()):
+        self.enabled = enabled
+        self.hooks = list(hooks)
+        self.calls = dict()
+        self.times = dict()
+        self.claims = 0
+
+    def phase(self, name):
+        if not self.enabled:
+            return NULL_PHASE
+        return Phase(self, name)
+
+    def record(self, name, elapsed_time):
+        """ Count a call of the phase 'name' that lasted 'elapsed_time' seconds, if the instrumentation is enabled. """
+        if not self.enabled:
+            return
+        self.calls[name] = self.calls.get(name, 0) + 1
+        self.times[name] = self.times.get(name, 0.) + elapsed_time
+        for hook in self.hooks:
+            hook(name, elapsed_time)
+
+    def count_claims(self, number_of_claims):
+        """ Count the oracle claims processed by the fit, from which 'claims_per_second' is computed. """
+        if self.enabled:
+            self.claims += number_of_claims
+
+    def add_hook(self, hook):
+        self.hooks.append(hook)
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def reset(self):
+        self.calls.clear()
+        self.times.clear()
+        self.claims = 0
+
+    def get_statistics(self):
+        fit_time = self.times.get('fit', 0.)
+        return {'phases': {name: {'calls': self.calls[name], 'time': self.times[name]} for name in self.calls},
+                'claims': self.claims,
+                'claims_per_second': self.claims / fit_time if fit_time > 0. else 0.}
+
+
+class Phase:
+    """ Context manager timing a phase for 'Instrumentation.record'. """
+
+    __slots__ = ('instrumentation', 'name', 'starting_time')
+
+    def __init__(self, instrumentation, name):
+        self.instrumentation = instrumentation
+        self.name = name
+        self.starting_time = None
+
+    def __enter__(self):
+        self.starting_time = time.perf_counter()
+        return self
+
+    def __exit__(self, exception_type, exception, traceback):
+        self.instrumentation.record(self.name, time.perf_counter() - self.starting_time)
+        return False
@@ -7,16 +7,126 @@
 
 
 import numpy as np
-from scipy.sparse.csr import csr_matrix
-from scipy.sparse import lil_matrix
+from scipy.sparse import csc_matrix, csr_matrix, diags, hstack
+
+
+INDEX_TYPE = np.int64
 
 
 def matrix_from_bags_and_index_maps(bags, item_to_index: dict, bag_to_index: dict) -> csr_matrix:
-    matrix = lil_matrix((len(item_to_index), len(bag_to_index)), dtype='int')
+    """ Return the sparse matrix whose coefficient at '(item_to_index[item], bag_to_index[bag])'
+    is the multiplicity of 'item' in 'bag'.
+    The row and column indices of all item occurrences are gathered in one pass,
+    then duplicates are merged at once by 'matrix_from_row_and_column_indices'. """
+    row_index_arrays = []
+    bag_column_indices = []
     for bag in bags:
-        for item in bag:
-            matrix[item_to_index[item], bag_to_index[bag]] += 1
-    return matrix.tocsr()
+        row_index_arrays.append(np.fromiter(map(item_to_index.__getitem__, bag), dtype=INDEX_TYPE))
+        bag_column_indices.append(bag_to_index[bag])
+    row_indices = concatenate_index_arrays(row_index_arrays)
+    column_indices = np.repeat(make_index_vector(bag_column_indices),
+                               [len(row_index_array) for row_index_array in row_index_arrays])
+    return matrix_from_row_and_column_indices(row_indices, column_indices, (len(item_to_index), len(bag_to_index)))
+
+
+def matrix_from_row_and_column_indices(row_indices, column_indices, shape) -> csr_matrix:
+    """ Return the sparse matrix of shape 'shape' whose coefficient at '(row, column)'
+    is the number of indices 'k' such that 'row_indices[k] == row' and 'column_indices[k] == column'. """
+    number_of_rows, number_of_columns = shape
+    keys = make_index_vector(row_indices) * max(number_of_columns, 1) + make_index_vector(column_indices)
+    keys, counts = np.unique(keys, return_counts=True)
+    rows, columns = np.divmod(keys, max(number_of_columns, 1))
+    index_pointer = np.zeros(number_of_rows + 1, dtype=INDEX_TYPE)
+    np.cumsum(np.bincount(rows, minlength=number_of_rows), out=index_pointer[1:])
+    return csr_matrix((counts, columns, index_pointer), shape=shape)
+
+
+def matrix_from_column_entries(row_index_arrays, value_arrays, number_of_rows) -> csr_matrix:
+    """ Return the sparse matrix whose column 'j' has the coefficients 'value_arrays[j]'
+    at the rows 'row_index_arrays[j]', the coefficients of repeated rows being summed.
+    The matrix is assembled column by column, then converted in linear time. """
+    return matrix_from_column_lengths(concatenate_index_arrays(row_index_arrays),
+                                      concatenate_vectors_from_list(value_arrays),
+                                      [len(row_index_array) for row_index_array in row_index_arrays], number_of_rows)
+
+
+def matrix_from_column_lengths(row_indices, values, column_lengths, number_of_rows) -> csr_matrix:
+    """ Return the matrix of 'matrix_from_column_entries' whose columns are given by consecutive slices
+    of 'row_indices' and 'values', the slice of column 'j' having length 'column_lengths[j]'. """
+    index_pointer = np.zeros(len(column_lengths) + 1, dtype=INDEX_TYPE)
+    np.cumsum(column_lengths, out=index_pointer[1:])
+    matrix = csc_matrix((values, row_indices, index_pointer), shape=(number_of_rows, len(column_lengths))).tocsr()
+    matrix.sum_duplicates()
+    return matrix
+
+
+def matrix_with_mapped_rows(matrix, row_map, number_of_rows) -> csr_matrix:
+    """ Return the matrix of 'number_of_rows' rows whose row 'row_map[i]' is the row 'i' of 'matrix',
+    the rows 'i' such that 'row_map[i]' is negative being dropped. """
+    columns = column_matrix_from_matrix(matrix)
+    row_indices = make_index_vector(row_map)[columns.indices]
+    is_kept = row_indices >= 0
+    column_indices = np.repeat(np.arange(columns.shape[1], dtype=INDEX_TYPE), np.diff(columns.indptr))
+    column_lengths = np.bincount(column_indices[is_kept], minlength=columns.shape[1])
+    return matrix_from_column_lengths(row_indices[is_kept], columns.data[is_kept], column_lengths, number_of_rows)
+
+
+def matrix_with_number_of_rows(matrix, number_of_rows):
+    """ Return 'matrix', in the compressed sparse row or column format, completed by zero rows
+    up to 'number_of_rows' rows. """
+    if number_of_rows == matrix.shape[0]:
+        return matrix
+    if matrix.format == 'csc':
+        return csc_matrix((matrix.data, matrix.indices, matrix.indptr), shape=(number_of_rows, matrix.shape[1]))
+    index_pointer = np.concatenate([matrix.indptr, np.full(number_of_rows - matrix.shape[0], matrix.indptr[-1])])
+    return csr_matrix((matrix.data, matrix.indices, index_pointer), shape=(number_of_rows, matrix.shape[1]))
+
+
+def concatenate_matrix_columns(matrix0, *matrices):
+    """ Return the concatenation of the columns of 'matrix0' and of 'matrices', in the format of 'matrix0'. """
+    return hstack([matrix0, *matrices], format=matrix0.format)
+
+
+def column_matrix_from_matrix(matrix) -> csc_matrix:
+    return csc_matrix(matrix)
+
+
+def matrix_from_index_collections(index_collections, number_of_rows) -> csr_matrix:
+    """ Return the matrix of shape '(number_of_rows, len(index_collections))'
+    whose column 'j' is the indicator vector of the set of indices 'index_collections[j]'. """
+    index_collections = [np.unique(indices) if is_index_vector(indices) else make_index_vector(sorted(set(indices)))
+                         for indices in index_collections]
+    row_indices = concatenate_index_arrays(index_collections)
+    column_indices = np.repeat(np.arange(len(index_collections), dtype=INDEX_TYPE),
+                               [len(indices) for indices in index_collections])
+    matrix = matrix_from_row_and_column_indices(row_indices, column_indices,
+                                                (number_of_rows, len(index_collections)))
+    return matrix.astype(float)
+
+
+def make_index_vector(indices):
+    return np.asarray(indices, dtype=INDEX_TYPE)
+
+
+def concatenate_index_arrays(index_arrays):
+    if len(index_arrays) == 0:
+        return make_index_vector([])
+    return np.concatenate(index_arrays)
+
+
+def unique_from_index_array(indices) -> np.ndarray:
+    """ Return the sorted array of the distinct elements of 'indices', like 'np.unique', with less overhead
+    on short arrays. """
+    indices = np.sort(indices)
+    if len(indices) == 0:
+        return indices
+    return indices[np.concatenate(([True], indices[1:] != indices[:-1]))]
+
+
+def concatenate_vectors_from_list(vectors):
+    if len(vectors) == 0:
+        return make_vector([])
+    return np.concatenate(vectors)
 
 
 def vector_from_index_and_value_maps(to_index: dict, to_value, length=None):
@@ -35,8 +145,29 @@ def dict_from_index_map_and_vector(to_index, vector):
 
 
 def count_nonzero_entries_in_matrix_row(matrix, row_index):
-    row = matrix.getrow(row_index)
-    return row.getnnz()
+    return matrix.indptr[row_index + 1] - matrix.indptr[row_index]
+
+
+def count_nonzero_entries_in_matrix_row_on_columns(matrix: csr_matrix, row_index, column_mask):
+    return np.count_nonzero(column_mask[matrix.indices[matrix.indptr[row_index]:matrix.indptr[row_index + 1]]])
+
+
+def count_nonzero_entries_in_matrix_rows_on_columns(matrix: csr_matrix, column_mask) -> np.ndarray:
+    """ Return the numbers of nonzero entries of the rows of 'matrix' in the columns where 'column_mask' is True. """
+    row_indices = np.repeat(np.arange(matrix.shape[0], dtype=INDEX_TYPE), np.diff(matrix.indptr))
+    return np.bincount(row_indices, weights=column_mask[matrix.indices], minlength=matrix.shape[0]).astype(INDEX_TYPE)
+
+
+def count_nonzero_entries_in_matrix_rows(matrix: csr_matrix) -> np.ndarray:
+    """ Return the vector of the numbers of stored entries in each row,
+    read directly from the index pointer of the compressed sparse row format. """
+    return np.diff(matrix.indptr)
+
+
+def log_of_ratios_zero_if_null_denominators(numerator, denominators) -> np.ndarray:
+    denominators = np.asarray(denominators, dtype=float)
+    ratios = np.divide(numerator, denominators, out=np.ones_like(denominators), where=(denominators != 0))
+    return np.log(ratios)
 
 
 def scalar_product(vector0, vector1):
@@ -44,7 +175,10 @@ def scalar_product(vector0, vector1):
 
 
 def normalize(vector):
-    norm = norm_from_vector(vector)
+    return normalize_from_norm(vector, norm_from_vector(vector))
+
+
+def normalize_from_norm(vector, norm):
     if norm == 0.:
         return vector
     return vector / norm
@@ -66,6 +200,116 @@ def matrix_vector_product(matrix: csr_matrix, vector: np.ndarray) -> np.ndarray:
     return matrix.dot(vector)
 
 
+def matrix_product(matrix0, matrix1):
+    return matrix0 @ matrix1
+
+
+def transpose_matrix_product(matrix0, matrix1) -> np.ndarray:
+    return dense_from_matrix(matrix0.transpose() @ matrix1)
+
+
+def transpose_matrix_product_sparse(matrix0, matrix1):
+    return csr_matrix(matrix0.transpose() @ matrix1)
+
+
+def rescale_matrix_rows(matrix, vector):
+    return csr_matrix(diags(vector) @ matrix)
+
+
+def rescale_matrix_columns(matrix, vector):
+    return csr_matrix(matrix @ diags(vector))
+
+
+def column_norms_from_matrix(matrix) -> np.ndarray:
+    return np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=0)).ravel())
+
+
+def column_sums_from_matrix(matrix) -> np.ndarray:
+    return np.asarray(matrix.sum(axis=0), dtype=float).ravel()
+
+
+def normalize_matrix_columns(matrix):
+    """ Sparse analogue of 'normalize' applied to each column: zero columns are left unchanged. """
+    norms = column_norms_from_matrix(matrix)
+    inverse_norms = np.divide(1., norms, out=np.ones_like(norms), where=(norms != 0.))
+    return rescale_matrix_columns(matrix, inverse_norms)
+
+
+def column_wise_scalar_products(matrix0, matrix1) -> np.ndarray:
+    return np.asarray(coefficient_wise_matrix_product(matrix0, matrix1).sum(axis=0)).ravel()
+
+
+def coefficient_wise_matrix_product(matrix0, matrix1):
+    return csr_matrix(matrix0.multiply(matrix1))
+
+
+def inverse_zero_if_null(vector) -> np.ndarray:
+    vector = np.asarray(vector, dtype=float)
+    return np.divide(1., vector, out=np.zeros_like(vector), where=(vector != 0.))
+
+
+def matrix_from_columns(columns, number_of_rows) -> csr_matrix:
+    """ Return the sparse matrix whose columns are the vectors 'columns', assembled from their supports
+    without stacking the dense vectors. """
+    supports = [support_from_vector(column) for column in columns]
+    return matrix_from_column_entries(supports, [column[support] for column, support in zip(columns, supports)],
+                                      number_of_rows)
+
+
+def vector_matrix_product_on_rows(vector, matrix: csr_matrix, row_indices):
+    """ Return '(column_indices, values)' describing the nonzero coefficients of the product
+    of the restrictions of 'vector' and of the rows of 'matrix' to 'row_indices'.
+    Only the rows 'row_indices' of 'matrix' are read. """
+    product = csr_matrix(vector[row_indices]) @ matrix[row_indices, :]
+    return product.indices, product.data
+
+
+def vector_matrix_product_on_columns(vector, matrix: csc_matrix, column_indices) -> np.ndarray:
+    """ Return the products of 'vector' with the columns 'column_indices' of 'matrix',
+    as a vector indexed like 'column_indices'. Only these columns are read. """
+    positions, column_positions = entry_positions_from_major_indices(matrix, column_indices)
+    values = coefficient_wise_vector_product(matrix.data[positions], vector[matrix.indices[positions]])
+    return np.bincount(column_positions, weights=values, minlength=len(column_indices))
+
+
+def matrix_vector_product_on_columns(matrix: csc_matrix, column_indices, vector) -> np.ndarray:
+    """ Return the product of 'matrix' with the vector whose coefficients at 'column_indices' are 'vector'
+    and the others are zero. Only the columns 'column_indices' of 'matrix' are read. """
+    positions, column_positions = entry_positions_from_major_indices(matrix, column_indices)
+    values = coefficient_wise_vector_product(matrix.data[positions], vector[column_positions])
+    return np.bincount(matrix.indices[positions], weights=values, minlength=matrix.shape[0])
+
+
+def entry_positions_from_major_indices(matrix, major_indices):
+    """ Return '(positions, major_positions)' where 'positions' are the positions in 'matrix.indices'
+    and 'matrix.data' of the entries of the rows 'major_indices' of a matrix in the compressed sparse row format,
+    or of its columns in the compressed sparse column format,
+    and 'major_positions' the positions in 'major_indices' of their rows or columns. """
+    starts = matrix.indptr[major_indices]
+    lengths = matrix.indptr[make_index_vector(major_indices) + 1] - starts
+    major_positions = np.repeat(np.arange(len(major_indices)), lengths)
+    positions = np.arange(lengths.sum()) + np.repeat(starts - (np.cumsum(lengths) - lengths), lengths)
+    return positions, major_positions
+
+
+def support_from_vector(vector) -> np.ndarray:
+    return np.flatnonzero(vector)
+
+
+def column_from_matrix(matrix, column_index) -> np.ndarray:
+    return dense_from_matrix(matrix[:, column_index]).ravel()
+
+
+def number_of_columns_from_matrix(matrix):
+    return matrix.get_shape()[1]
+
+
+def dense_from_matrix(matrix) -> np.ndarray:
+    if isinstance(matrix, np.ndarray):
+        return matrix
+    return matrix.toarray()
+
+
 def dot_matrix_dot_products(dot_vector0, matrix, dot_vector1, vector):
     vector = coefficient_wise_vector_product(dot_vector1, vector)
     vector = matrix_vector_product(matrix, vector)
@@ -73,6 +317,12 @@ def dot_matrix_dot_products(dot_vector0, matrix, dot_vector1, vector):
     return vector
 
 
+def indicator_vector_from_indices(indices, length: int) -> np.ndarray:
+    vector = zero_vector_from_length(length)
+    vector[indices] = 1.
+    return vector
+
+
 def zero_vector_from_length(length: int) -> np.ndarray:
     return np.zeros(length)
 
@@ -82,7 +332,9 @@ def one_vector_from_length(length: int) -> np.ndarray:
 
 
 def rescale_vector_to_satisfy_lower_negative_bound(vector, lower_bound):
-    min_element = min(vector)
+    if len(vector) == 0:
+        return vector
+    min_element = np.min(vector)
     if min_element < lower_bound:
         return lower_bound / min_element * vector
     return vector
@@ -92,10 +344,61 @@ def transpose_from_matrix(matrix):
     return matrix.transpose()
 
 
+def save_matrix(matrix: csr_matrix, path_prefix):
+    save_vector(matrix.data, path_prefix + '_data.npy')
+    save_vector(matrix.indices, path_prefix + '_indices.npy')
+    save_vector(matrix.indptr, path_prefix + '_indptr.npy')
+    save_vector(make_index_vector(matrix.get_shape()), path_prefix + '_shape.npy')
+
+
+def load_matrix(path_prefix, mmap=True, matrix_type=csr_matrix):
+    """ Inverse of 'save_matrix' for a matrix of type 'matrix_type', in the compressed sparse row or column format.
+    If 'mmap' is True, the arrays are memory-mapped in copy-on-write mode:
+    the pages are shared between processes loading the same files as long as they are not modified. """
+    data = load_vector(path_prefix + '_data.npy', mmap)
+    indices = load_vector(path_prefix + '_indices.npy', mmap)
+    index_pointer = load_vector(path_prefix + '_indptr.npy', mmap)
+    shape = tuple(int(length) for length in load_vector(path_prefix + '_shape.npy', mmap=False))
+    return matrix_type((data, indices, index_pointer), shape=shape, copy=False)
+
+
+def save_vector(vector, path):
+    np.save(path, np.asarray(vector), allow_pickle=False)
+
+
+def load_vector(path, mmap=True) -> np.ndarray:
+    return np.load(path, mmap_mode='c' if mmap else None, allow_pickle=False)
+
+
+def is_memory_mapped(vector):
+    while vector is not None:
+        if isinstance(vector, np.memmap):
+            return True
+        vector = vector.base
+    return False
+
+
+def is_vector(candidate):
+    return isinstance(candidate, np.ndarray)
+
+
+def is_index_vector(candidate):
+    return isinstance(candidate, np.ndarray) and np.issubdtype(candidate.dtype, np.integer)
+
+
+def make_read_only(vector):
+    vector.flags.writeable = False
+    return vector
+
+
 def make_vector(coefficients):
     return np.array(coefficients)
 
 
+def copy_vector(vector) -> np.ndarray:
+    return np.array(vector, dtype=float)
+
+
 def are_equal_vectors(vector0, vector1):
     return np.array_equal(vector0, vector1)
 
@@ -127,8 +430,12 @@ def contains_only_nonnegative_coefficients(vector):
     return (vector >= 0.).all()
 
 
+def sum_of_coefficients(vector):
+    return np.sum(vector)
+
+
 def probabilities_from_vector(vector):
-    sum_vector = sum(vector)
+    sum_vector = sum_of_coefficients(vector)
     if sum_vector == 0.:
         raise ValueError
     return vector / sum_vector
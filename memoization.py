@@ -6,54 +6,84 @@
 # Author: Élie de Panafieu  <elie.de_panafieu@nokia-bell-labs.com>
 
 
-import numpy as np
+from collections import OrderedDict
+from memory_size import deep_size_from_object
 
 
-class Memoization:
-
-    def __init__(self, type_hash_eq_triplets):
-        self.type_hash_eq_triplets = type_hash_eq_triplets
-        self.pseudo_hash_to_argument = dict()
-        self.pseudo_hash_to_evaluation = dict()
-
-    def pseudo_hash_and_eq_from_argument(self, argument):
-        for my_type, my_hash, my_eq in self.type_hash_eq_triplets:
-            if isinstance(argument, my_type):
-                return my_hash(argument), lambda other_argument: my_eq(argument, other_argument)
-        return argument.__hash__(), argument.__eq__
-
-    def __call__(self, function):
+DEFAULT_MAX_SIZE = 32
 
-        def memoized_function(*args):
-            pseudo_hashes, pseudo_eqs = zip(self.pseudo_hash_and_eq_from_argument(argument) for argument in args)
 
-
-            memorized_object = self.id_tuple_to_object.get(id_tuple)
-            if (memorized_object is not None) and tuple_equality(memorized_object, args):
-                return self.id_tuple_to_value[id_tuple]
-
-    def get_memorized_value(self, argument, default=None):
-        memorized_object = self.id_to_object.get(id(argument))
-        if memorized_object is not None:
-            if equality(argument, memorized_object):
-                return memorized_object
+class Memoization:
+    """ Bounded cache discarding the least recently used entries first.
+    Each access provides the version of the data the values depend on:
+    as soon as it differs from the version of the stored values, they are all dropped.
+    The cache holds at most 'max_size' entries, unless it is None, and values of at most 'max_bytes' bytes in total,
+    as measured by 'deep_size_from_object', unless it is None. A bound of zero disables the cache. """
+
+    def __init__(self, max_size=DEFAULT_MAX_SIZE, max_bytes=None):
+        if (max_size is not None and max_size < 0) or (max_bytes is not None and max_bytes < 0):
+            raise ValueError('Error in Memoization: max_size and max_bytes must be nonnegative.')
+        self.max_size = max_size
+        self.max_bytes = max_bytes
+        self.version = None
+        self.key_to_value = OrderedDict()
+        self.key_to_bytes = dict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def __len__(self):
+        return len(self.key_to_value)
+
+    def get(self, key, version, default=None):
+        self.synchronize(version)
+        if key in self.key_to_value:
+            self.key_to_value.move_to_end(key)
+            self.hits += 1
+            return self.key_to_value[key]
+        self.misses += 1
         return default
 
-
-            
-
-
-def equality(u0, u1):
-    if isinstance(u0, np.ndarray):
-        return (u0 == u1).all()
-    return u0 == u1
-
-
-def tuple_equality(tuple0, tuple1):
-    for item0, item1 in zip(tuple0, tuple1):
-        if not equality(item0, item1):
-            return False
-    return True
-
-
-def tuple_hash(tuple):
+    def set(self, key, version, value):
+        """ Store 'value', unless it alone exceeds 'self.max_bytes'. """
+        if self.max_size == 0 or self.max_bytes == 0:
+            return
+        value_bytes = deep_size_from_object(value) if self.max_bytes is not None else 0
+        if self.max_bytes is not None and value_bytes > self.max_bytes:
+            return
+        self.synchronize(version)
+        self.bytes += value_bytes - self.key_to_bytes.get(key, 0)
+        self.key_to_value[key] = value
+        self.key_to_bytes[key] = value_bytes
+        self.key_to_value.move_to_end(key)
+        while (self.max_size is not None and len(self.key_to_value) > self.max_size) \
+                or (self.max_bytes is not None and self.bytes > self.max_bytes):
+            evicted_key, _ = self.key_to_value.popitem(last=False)
+            self.bytes -= self.key_to_bytes.pop(evicted_key)
+            self.evictions += 1
+
+    def synchronize(self, version):
+        if version != self.version:
+            if len(self.key_to_value) > 0:
+                self.invalidations += 1
+            self.clear()
+            self.version = version
+
+    def clear(self):
+        self.key_to_value.clear()
+        self.key_to_bytes.clear()
+        self.bytes = 0
+
+    def get_statistics(self):
+        number_of_lookups = self.hits + self.misses
+        return {'size': len(self.key_to_value),
+                'max_size': self.max_size,
+                'bytes': self.bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+                'hit_rate': self.hits / number_of_lookups if number_of_lookups > 0 else 0.}
@@ -0,0 +1,77 @@
+# © 2020 Nokia
+# Licensed under the BSD 3-Clause License.
+# SPDX-License-Identifier: BSD-3-Clause
+# !/usr/bin/env python3
+# coding: utf-8
+# Author: Élie de Panafieu  <elie.de_panafieu@nokia-bell-labs.com>
+
+
+import sys
+from types import BuiltinFunctionType, FunctionType, MethodType, ModuleType
+import numpy as np
+
+
+# Structures whose size grows with the number of items, and structures of bounded size.
+ITEM_STRUCTURES = ('item_to_index', 'item_weights_vector')
+FIXED_STRUCTURES = ('memoization', 'distance', 'instrumentation')
+NOT_COUNTED_TYPES = (type, ModuleType, FunctionType, BuiltinFunctionType, MethodType)
+
+
+def deep_size_from_object(obj, seen=None) -> int:
+    """ Return the number of bytes, as measured by 'sys.getsizeof', of 'obj' and of the objects it references
+    through containers, attributes and slots. The objects whose identity is in the set 'seen' are skipped,
+    and 'seen' is completed, so that an object shared by several structures measured with the same 'seen'
+    is counted once. A numpy array counts its data only if it owns them: a memory-mapped array
+    only counts its header, its pages belonging to the file. """
+    if seen is None:
+        seen = set()
+    size = 0
+    stack = [obj]
+    while len(stack) > 0:
+        current = stack.pop()
+        if id(current) in seen or isinstance(current, NOT_COUNTED_TYPES):
+            continue
+        seen.add(id(current))
+        size += sys.getsizeof(current)
+        if isinstance(current, dict):
+            stack.extend(current.keys())
+            stack.extend(current.values())
+        elif isinstance(current, (list, tuple, set, frozenset)):
+            stack.extend(current)
+        elif isinstance(current, np.ndarray):
+            if current.base is not None:
+                stack.append(current.base)
+        elif isinstance(current, (str, bytes, int, float, complex, bool)):
+            continue
+        else:
+            if hasattr(current, '__dict__'):
+                stack.append(vars(current))
+            for cls in type(current).__mro__:
+                for slot in getattr(cls, '__slots__', ()):
+                    if hasattr(current, slot):
+                        stack.append(getattr(current, slot))
+    return size
+
+
+def projected_memory_report(structures, number_of_documents, number_of_items, new_items_per_document,
+                            number_of_new_documents=0):
+    """ Return the memory report of the bytes 'structures' held by each structure of a model of 'number_of_documents'
+    documents and 'number_of_items' items, with the projected total after adding 'number_of_new_documents'.
+    The structures of 'ITEM_STRUCTURES' grow with the items, each new document bringing 'new_items_per_document'
+    new items, those of 'FIXED_STRUCTURES' are bounded, and the others grow linearly with the documents. """
+    total = sum(structures.values())
+    item_bytes = sum(structures.get(name, 0) for name in ITEM_STRUCTURES)
+    fixed_bytes = sum(structures.get(name, 0) for name in FIXED_STRUCTURES)
+    bytes_per_document = (total - item_bytes - fixed_bytes) / number_of_documents if number_of_documents > 0 else 0.
+    bytes_per_item = item_bytes / number_of_items if number_of_items > 0 else 0.
+    projected_new_items = new_items_per_document * number_of_new_documents
+    return {'structures': structures,
+            'total': total,
+            'number_of_documents': number_of_documents,
+            'number_of_items': number_of_items,
+            'bytes_per_document': bytes_per_document,
+            'bytes_per_item': bytes_per_item,
+            'number_of_new_documents': number_of_new_documents,
+            'projected_new_items': projected_new_items,
+            'projected_total': int(round(total + number_of_new_documents * bytes_per_document
+                                         + projected_new_items * bytes_per_item))}
@@ -0,0 +1,86 @@
+# © 2020 Nokia
+# Licensed under the BSD 3-Clause License.
+# SPDX-License-Identifier: BSD-3-Clause
+# !/usr/bin/env python3
+# coding: utf-8
+# Author: Élie de Panafieu  <elie.de_panafieu@nokia-bell-labs.com>
+
+
+import os
+import multiprocessing
+from collections import deque
+from collections.abc import Sequence
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+
+DEFAULT_SHARD_SIZE = 1000
+# Number of shards submitted in advance to each process, which bounds the number of shards held in memory.
+SHARDS_PER_JOB = 2
+# Sequences inherited by the forked processes of the pools, by key, see 'map_shards_of_iterable'.
+INHERITED_SEQUENCES = dict()
+
+
+def number_of_jobs_from_n_jobs(n_jobs):
+    """ Return the number of processes for the option 'n_jobs': one if it is None,
+    and the number of processors if it is -1. """
+    if n_jobs is None:
+        return 1
+    if n_jobs == -1:
+        return os.cpu_count() or 1
+    if n_jobs < 1:
+        raise ValueError('Error in number_of_jobs_from_n_jobs: n_jobs must be None, -1 or positive.')
+    return n_jobs
+
+
+def shards_from_iterable(iterable, shard_size=DEFAULT_SHARD_SIZE):
+    """ Yield the consecutive lists of 'shard_size' elements of 'iterable', the last one being shorter. """
+    iterator = iter(iterable)
+    shard = list(islice(iterator, shard_size))
+    while len(shard) > 0:
+        yield shard
+        shard = list(islice(iterator, shard_size))
+
+
+def map_shards(function, shards, n_jobs=None, *args):
+    """ Yield 'function(shard, *args)' for the shards of the iterable 'shards', in order.
+    If 'n_jobs' is None or one, the calls are made in this process, and otherwise in a pool of processes,
+    see 'number_of_jobs_from_n_jobs': 'function' and its arguments must then be picklable.
+    The shards are read as the results are consumed, so that they may come from a stream. """
+    number_of_jobs = number_of_jobs_from_n_jobs(n_jobs)
+    if number_of_jobs == 1:
+        for shard in shards:
+            yield function(shard, *args)
+        return
+    with ProcessPoolExecutor(number_of_jobs) as executor:
+        pending_results = deque()
+        for shard in shards:
+            pending_results.append(executor.submit(function, shard, *args))
+            if len(pending_results) >= SHARDS_PER_JOB * number_of_jobs:
+                yield pending_results.popleft().result()
+        while len(pending_results) > 0:
+            yield pending_results.popleft().result()
+
+
+def map_shards_of_iterable(function, iterable, shard_size=DEFAULT_SHARD_SIZE, n_jobs=None, *args):
+    """ Yield 'function(shard, *args)' for the consecutive shards of 'shard_size' elements of 'iterable', in order,
+    see 'map_shards'. If 'iterable' is a sequence and the processes of the pool are forked, they inherit it
+    and receive only the bounds of the shards, so that the elements are not pickled. """
+    if number_of_jobs_from_n_jobs(n_jobs) == 1 or not isinstance(iterable, Sequence) \
+            or multiprocessing.get_start_method() != 'fork':
+        yield from map_shards(function, shards_from_iterable(iterable, shard_size), n_jobs, *args)
+        return
+    key = id(iterable)
+    INHERITED_SEQUENCES[key] = iterable
+    try:
+        bounds = ((key, start, start + shard_size) for start in range(0, len(iterable), shard_size))
+        yield from map_shards(function_on_inherited_shard, bounds, n_jobs, function, *args)
+    finally:
+        del INHERITED_SEQUENCES[key]
+
+
+def function_on_inherited_shard(bounds, function, *args):
+    """ Return 'function(shard, *args)' for the shard of the inherited sequence given by 'bounds',
+    the triple '(key, start, stop)'. """
+    key, start, stop = bounds
+    return function(INHERITED_SEQUENCES[key][start:stop], *args)
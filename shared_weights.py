@@ -0,0 +1,77 @@
+# © 2020 Nokia
+# Licensed under the BSD 3-Clause License.
+# SPDX-License-Identifier: BSD-3-Clause
+# !/usr/bin/env python3
+# coding: utf-8
+# Author: Élie de Panafieu  <elie.de_panafieu@nokia-bell-labs.com>
+
+
+import os
+import shutil
+import tempfile
+import numpy as np
+from matrix_operations import make_index_vector, save_vector
+
+
+# Directory of the files in shared memory, that never reach the disk, when the system has one.
+SHARED_MEMORY_DIRECTORY = '/dev/shm'
+# Positions in the header of the version of the vectors and of their current slot.
+VERSION = 0
+SLOT = 1
+
+
+class SharedWeights:
+    """ Double buffer of vectors memory-mapped from files of the directory 'path', that several processes share.
+    The vectors of slot 's' are stored in the files 'slot_files[s]', and the file 'header_file' holds the version
+    of the vectors and their current slot. 'self.publish' writes new vectors in the other slot, then switches
+    the current slot and increases the version, so that the processes reading the current vectors are not disturbed,
+    unless two versions are published during one of their reads. Only a writable 'SharedWeights' publishes. """
+
+    def __init__(self, path, slot_files, header_file, writable=False):
+        mode = 'r+' if writable else 'r'
+        self.writable = writable
+        self.header = np.load(os.path.join(path, header_file), mmap_mode=mode)
+        self.slots = [[np.load(os.path.join(path, file), mmap_mode=mode) for file in files] for files in slot_files]
+
+    @classmethod
+    def create(cls, path, slot_files, header_file):
+        """ Create the files of the slots from those of the first slot, which must exist and hold the current vectors,
+        and the header, then return the writable 'SharedWeights'. """
+        for files in slot_files[1:]:
+            for first_slot_file, file in zip(slot_files[0], files):
+                shutil.copyfile(os.path.join(path, first_slot_file), os.path.join(path, file))
+        save_vector(make_index_vector([0, 0]), os.path.join(path, header_file))
+        return cls(path, slot_files, header_file, writable=True)
+
+    def version(self):
+        return int(self.header[VERSION])
+
+    def current(self):
+        """ Return '(version, vectors)' where 'vectors' is the list of the current vectors. """
+        version = int(self.header[VERSION])
+        return version, self.slots[int(self.header[SLOT])]
+
+    def publish(self, vectors):
+        """ Make 'vectors' the current vectors, which must have the lengths of the shared ones. """
+        if not self.writable:
+            raise ValueError('Error in SharedWeights.publish: the weights are only published by their owner.')
+        self.check_lengths(vectors)
+        slot = (int(self.header[SLOT]) + 1) % len(self.slots)
+        for shared_vector, vector in zip(self.slots[slot], vectors):
+            shared_vector[:] = vector
+        # The slot is switched before the version, so that a process reading the new version reads the new vectors.
+        self.header[SLOT] = slot
+        self.header[VERSION] += 1
+
+    def check_lengths(self, vectors):
+        """ Raise a ValueError unless 'vectors' have the lengths of the shared vectors. """
+        for shared_vector, vector in zip(self.slots[0], vectors):
+            if len(shared_vector) != len(vector):
+                raise ValueError('Error in SharedWeights.check_lengths: the lengths of the vectors changed, '
+                                 'the model must be shared again.')
+
+
+def shared_directory():
+    """ Return a new temporary directory, in shared memory if the system has one. """
+    return tempfile.mkdtemp(prefix='shared_model_',
+                            dir=SHARED_MEMORY_DIRECTORY if os.path.isdir(SHARED_MEMORY_DIRECTORY) else None)
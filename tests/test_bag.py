@@ -0,0 +1,49 @@
+# © 2020 Nokia
+# Licensed under the BSD 3-Clause License.
+# SPDX-License-Identifier: BSD-3-Clause
+# !/usr/bin/env python3
+# coding: utf-8
+# Author: Élie de Panafieu  <elie.de_panafieu@nokia-bell-labs.com>
+
+
+import unittest
+import pickle
+from vectorization_of_bag_collections.bag import *
+
+
+item_to_index = {'a': 0, 'b': 1, 'n': 2}
+
+
+class TestBag(unittest.TestCase):
+
+    def test_from_items(self):
+        bag = Bag.from_items('banana', item_to_index)
+        self.assertEqual(bag.item_indices.tolist(), [0, 1, 2])
+        self.assertEqual(bag.counts.tolist(), [3, 1, 2])
+        self.assertEqual(len(bag), 6)
+        self.assertEqual(bag.items(['a', 'b', 'n']), ('a', 'a', 'a', 'b', 'n', 'n'))
+        self.assertFalse(bag.counts.flags.writeable)
+
+    def test_hash_and_equality(self):
+        bag = Bag.from_items('banana', item_to_index)
+        self.assertEqual(bag, Bag.from_items('nnaaab', item_to_index))
+        self.assertEqual(hash(bag), hash(Bag.from_items('nnaaab', item_to_index)))
+        self.assertNotEqual(bag, Bag.from_items('bana', item_to_index))
+        self.assertNotEqual(bag, 'banana')
+        self.assertEqual(len({bag: 1, Bag.from_items('abanan', item_to_index): 2}), 1)
+
+    def test_pickle(self):
+        bag = Bag.from_items('banana', item_to_index)
+        unpickled_bag = pickle.loads(pickle.dumps(bag))
+        self.assertEqual(unpickled_bag, bag)
+        self.assertEqual(hash(unpickled_bag), hash(bag))
+
+    def test_compact_bag_from_items(self):
+        bag = compact_bag_from_items('banana', item_to_index)
+        self.assertIsInstance(bag, Bag)
+        self.assertIs(compact_bag_from_items(bag, item_to_index), bag)
+        self.assertEqual(compact_bag_from_items('bandana', item_to_index), 'bandana')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+# © 2020 Nokia
+# Licensed under the BSD 3-Clause License.
+# SPDX-License-Identifier: BSD-3-Clause
+# !/usr/bin/env python3
+# coding: utf-8
+# Author: Élie de Panafieu  <elie.de_panafieu@nokia-bell-labs.com>
+
+
+import unittest
+from tests.random_vectors_and_probabilities import *
+from distance_on_bag_collections.cosine_distance import *
+
+
+cosine_distance = CosineDistance()
+
+
+class TestCosineDistance(unittest.TestCase):
+
+    def test_cosine_distance(self):
+        u = make_vector([1., 3., 2.])
+        v = make_vector([2., -1., 0.5])
+        zero_vector = make_vector([0., 0., 0.])
+        self.assertAlmostEqual(cosine_distance(zero_vector, u), 1.)
+        expected = 1. - scalar_product(u, v) / norm_from_vector(u) / norm_from_vector(v)
+        self.assertAlmostEqual(cosine_distance(u, v), expected)
+
+    def test_value_and_gradients(self):
+        vector0 = random_vector(5)
+        vector1 = random_vector(5)
+        value, (gradient0, gradient1) = cosine_distance.value_and_gradients(vector0, vector1)
+        self.assertEqual(value, cosine_distance(vector0, vector1))
+        self.assertTrue(are_equal_vectors(gradient0, cosine_distance.first_partial_gradient(vector0, vector1)))
+        self.assertTrue(are_equal_vectors(gradient1, cosine_distance.second_partial_gradient(vector0, vector1)))
+
+    def test_batch_values_and_partial_gradients(self):
+        length = 6
+        columns0 = [random_vector(length) for _ in range(4)]
+        columns1 = [random_vector(length) for _ in range(4)]
+        matrix0 = matrix_from_columns(columns0, length)
+        matrix1 = matrix_from_columns(columns1, length)
+        values, (gradients0, gradients1) = cosine_distance.batch_values_and_partial_gradients(matrix0, matrix1)
+        for index, (column0, column1) in enumerate(zip(columns0, columns1)):
+            self.assertAlmostEqual(values[index], cosine_distance(column0, column1))
+            self.assertTrue(are_almost_equal_vectors(column_from_matrix(gradients0, index),
+                                                     cosine_distance.first_partial_gradient(column0, column1)))
+            self.assertTrue(are_almost_equal_vectors(column_from_matrix(gradients1, index),
+                                                     cosine_distance.second_partial_gradient(column0, column1)))
+
+    def test_pairwise(self):
+        length = 5
+        columns0 = [random_vector(length) for _ in range(3)]
+        columns1 = [random_vector(length) for _ in range(2)] + [zero_vector_from_length(length)]
+        computed = cosine_distance.pairwise(matrix_from_columns(columns0, length), matrix_from_columns(columns1, length))
+        for index0, column0 in enumerate(columns0):
+            for index1, column1 in enumerate(columns1):
+                self.assertAlmostEqual(computed[index0, index1], cosine_distance(column0, column1))
+
+
+if __name__ == '__main__':
+    unittest.main()
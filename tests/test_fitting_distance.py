@@ -6,9 +6,16 @@
 # Author: Élie de Panafieu  <elie.de_panafieu@nokia-bell-labs.com>
 
 
+import shutil
 import unittest
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
 from fitting_distance import *
+from matrix_operations import is_memory_mapped, are_equal_vectors, dense_from_matrix
+from vectorization_of_bag_collections.bag import Bag
 from oracle_claim import OracleClaim
+from instrumentation import Instrumentation
+from distance_on_bag_collections.jensen_shannon_distance import JensenShannonDistance
 
 
 class TestFittingDistance(unittest.TestCase):
@@ -24,6 +31,123 @@ class TestFittingDistance(unittest.TestCase):
         self.assertAlmostEqual(distance({bag1}, {bag3}), 1.)
         self.assertTrue(distance({bag1}, {bag2}) < distance({bag0}, {bag1}))
 
+    def test_pairwise(self):
+        collection = {'abb', 'aa', 'baa', 'bbb'}
+        distance = FittingDistance(collection)
+        bag_collections0 = [{'abb'}, {'aa', 'baa'}, {'bbb'}]
+        bag_collections1 = [{'aa'}, {'abb', 'bbb', 'aa'}]
+        computed = distance.pairwise(bag_collections0, bag_collections1)
+        self.assertEqual(computed.shape, (3, 2))
+        for index0, bags0 in enumerate(bag_collections0):
+            for index1, bags1 in enumerate(bag_collections1):
+                self.assertAlmostEqual(computed[index0, index1], distance(bags0, bags1))
+        computed = distance.pairwise(bag_collections0)
+        self.assertEqual(computed.shape, (3, 3))
+        self.assertAlmostEqual(computed[1, 2], distance({'aa', 'baa'}, {'bbb'}))
+
+    def test_pairwise_with_unknown_bag(self):
+        distance = FittingDistance({'abb', 'aa', 'baa', 'bbb'})
+        computed = distance.pairwise([{'abb', 'zzz'}], [{'aa'}, {'zzz'}])
+        self.assertAlmostEqual(computed[0, 0], distance({'abb', 'zzz'}, {'aa'}))
+        self.assertAlmostEqual(computed[0, 1], distance({'abb', 'zzz'}, {'zzz'}))
+
+    def test_pairwise_with_jensen_shannon_distance(self):
+        collection = {'abb', 'aa', 'baa', 'bbb'}
+        distance = FittingDistance(collection, distance=JensenShannonDistance())
+        bag_collections = [{'abb'}, {'aa', 'baa'}, {'bbb'}]
+        computed = distance.pairwise(bag_collections)
+        for index0, bags0 in enumerate(bag_collections):
+            for index1, bags1 in enumerate(bag_collections):
+                self.assertAlmostEqual(computed[index0, index1], distance(bags0, bags1))
+
+    def test_nearest(self):
+        collection = ['abc', 'abd', 'cde', 'xyz', 'xxy', 'aab', 'fgh', 'efg']
+        distance = FittingDistance(collection)
+        distance.fit({OracleClaim(({'abc'}, {'cde'}), (0., 0.2))})
+        for bags in [{'abc'}, {'xyz', 'fgh'}, {'abd', 'aab'}]:
+            brute_force = sorted((distance(bags, {bag}), distance.vectorize.bag_to_index[bag], bag)
+                                 for bag in collection)
+            for number_of_neighbours in [1, 3, len(collection)]:
+                neighbours = distance.nearest(bags, number_of_neighbours)
+                self.assertEqual(len(neighbours), number_of_neighbours)
+                for (bag, computed), (expected, _, _) in zip(neighbours, brute_force):
+                    self.assertAlmostEqual(computed, expected)
+                    self.assertAlmostEqual(computed, distance(bags, {bag}))
+        self.assertEqual(distance.nearest({'xyz'}, 1)[0][0], 'xyz')
+
+    def test_nearest_with_jensen_shannon_distance(self):
+        collection = ['abc', 'abd', 'cde', 'xyz']
+        distance = FittingDistance(collection, distance=JensenShannonDistance())
+        neighbours = distance.nearest({'abd'}, 2)
+        self.assertEqual(neighbours[0][0], 'abd')
+        self.assertAlmostEqual(neighbours[1][1], min(distance({'abd'}, {bag}) for bag in ['abc', 'cde', 'xyz']))
+
+    def test_approximate_nearest(self):
+        collection = ['abc', 'abd', 'cde', 'xyz', 'xxy', 'aab', 'fgh', 'efg']
+        distance = FittingDistance(collection)
+        self.assertRaises(ValueError, distance.nearest, {'abc'}, 2, True)
+        distance.build_approximate_index(number_of_bits=1, number_of_tables=8)
+        neighbours = distance.nearest({'abc'}, 3, approximate=True)
+        self.assertEqual(neighbours[0][0], 'abc')
+        for bag, computed in neighbours:
+            self.assertAlmostEqual(computed, distance({'abc'}, {bag}))
+        distance.fit({OracleClaim(({'abc'}, {'cde'}), (0., 0.2))})
+        self.assertAlmostEqual(distance.nearest({'abc'}, 1, approximate=True)[0][1], 0.)
+        self.assertEqual(distance.approximate_index.weights_version, distance.vectorize.weights_version)
+
+    def test_compact_bags(self):
+        collection = {'abb': 2., 'aa': 1., 'baa': 1., 'bbb': 1.}
+        distance = FittingDistance(collection)
+        compact_distance = FittingDistance(collection, compact_bags=True)
+        self.assertTrue(all(isinstance(bag, Bag) for bag in compact_distance.vectorize.bag_to_index))
+        self.assertTrue(are_equal_vectors(dense_from_matrix(compact_distance.vectorize.item_bag_matrix),
+                                          dense_from_matrix(distance.vectorize.item_bag_matrix)))
+        self.assertAlmostEqual(compact_distance({'abb', 'aa'}, {'bbb'}), distance({'abb', 'aa'}, {'bbb'}))
+        self.assertAlmostEqual(compact_distance.weight_from_bag('abb'), 2.)
+        self.assertAlmostEqual(compact_distance({'abb'}, {'bab'}), 0.)
+        claims = {OracleClaim(({'abb'}, {'aa'}), (0., 0.1))}
+        compact_distance.fit(claims)
+        self.assertTrue(compact_distance({'abb'}, {'aa'}) < distance({'abb'}, {'aa'}))
+        bag, _ = compact_distance.nearest({'aa'}, 1)[0]
+        self.assertEqual(bag.items(compact_distance.vectorize.items_from_indices()), ('a', 'a'))
+        with tempfile.TemporaryDirectory() as path:
+            compact_distance.save(path)
+            loaded_distance = FittingDistance.load(path)
+            self.assertAlmostEqual(loaded_distance({'abb'}, {'baa'}), compact_distance({'abb'}, {'baa'}))
+
+    def test_bag_indices(self):
+        collection = ['abb', 'aa', 'baa', 'bbb']
+        distance = FittingDistance(collection)
+        indices = distance.indices_from_bags(['abb', 'aa', 'bbb'])
+        self.assertEqual(indices.tolist(), [0, 1, 3])
+        self.assertAlmostEqual(distance(indices[:2], indices[2:]), distance({'abb', 'aa'}, {'bbb'}))
+        self.assertAlmostEqual(distance(indices[:2], {'bbb'}), distance({'abb', 'aa'}, {'bbb'}))
+        computed = distance.pairwise([indices[:1], indices[1:]], [indices[2:]])
+        self.assertAlmostEqual(computed[1, 0], distance({'aa', 'bbb'}, {'bbb'}))
+        self.assertEqual(distance.nearest(indices[1:2], 1)[0][0], 'aa')
+        fitted_distance = FittingDistance(collection)
+        distance.fit({OracleClaim((indices[:1], indices[1:2]), (0., 0.1))})
+        fitted_distance.fit({OracleClaim(({'abb'}, {'aa'}), (0., 0.1))})
+        self.assertAlmostEqual(distance({'abb'}, {'aa'}), fitted_distance({'abb'}, {'aa'}))
+
+    def test_add_and_remove_bags(self):
+        distance = FittingDistance(['abb', 'aa', 'baa'])
+        weight = distance.weight_from_item('a')
+        distance.add_bags({'bbc': 2., 'aa': 5.})
+        self.assertEqual(distance.weight_from_item('a'), weight)
+        self.assertEqual(distance.weight_from_bag('aa'), 0.5)
+        self.assertEqual(distance.weight_from_bag('bbc'), 2.)
+        distance.remove_bags(['abb'])
+        neighbours = [bag for bag, _ in distance.nearest({'baa'}, 4)]
+        self.assertEqual(neighbours[0], 'baa')
+        self.assertEqual(sorted(neighbours), ['aa', 'baa', 'bbc'])
+        expected = FittingDistance(['aa', 'baa', 'bbc'], item_to_weight=distance.vectorize.get_item_weights(),
+                                   bag_to_weight=distance.vectorize.get_bag_weights())
+        self.assertAlmostEqual(distance({'aa', 'bbc'}, {'baa'}), expected({'aa', 'bbc'}, {'baa'}))
+        distance.compact()
+        self.assertEqual(distance.indices_from_bags(['aa', 'baa', 'bbc']).tolist(), [0, 1, 2])
+        self.assertAlmostEqual(distance({'aa', 'bbc'}, {'baa'}), expected({'aa', 'bbc'}, {'baa'}))
+
     def test_fit(self):
         bag0 = 'abb'
         bag1 = 'aa'
@@ -38,6 +162,119 @@ class TestFittingDistance(unittest.TestCase):
         new_weight_a = distance.weight_from_item('a')
         self.assertTrue(new_weight_a > old_weight_a)
 
+    def test_fit_by_batches(self):
+        collection = {'abb', 'aa', 'baa', 'bbb'}
+        distance = FittingDistance(collection)
+        distance01 = distance({'abb'}, {'aa'})
+        oracle_claims = [OracleClaim(({'abb'}, {'aa'}), (0., distance01 / 2.)),
+                         OracleClaim(({'baa'}, {'bbb'}), (0., 1.))]
+        summary = distance.fit(oracle_claims, batch_size=2)
+        self.assertTrue(distance({'abb'}, {'aa'}) < distance01)
+        self.assertEqual(summary['violated_claims'], int(distance({'abb'}, {'aa'}) > distance01 / 2. + 1e-8))
+
+    def test_fit_by_batches_with_unknown_bag(self):
+        collection = {'abb', 'aa', 'baa', 'bbb'}
+        distance01 = FittingDistance(collection)({'abb'}, {'aa'})
+        for batch_size in (None, 2):
+            fitted_distances = []
+            for bags0 in ({'abb', 'zzz'}, {'abb'}):
+                distance = FittingDistance(collection)
+                distance.fit([OracleClaim((bags0, {'aa'}), (0., distance01 / 2.)),
+                              OracleClaim(({'baa'}, {'bbb'}), (0., 1.))], batch_size=batch_size)
+                fitted_distances.append(distance({'abb'}, {'aa'}))
+            self.assertAlmostEqual(fitted_distances[0], fitted_distances[1])
+            self.assertTrue(fitted_distances[0] < distance01)
+
+    def test_instrumentation_statistics(self):
+        collection = {'abb', 'aa', 'baa', 'bbb'}
+        distance = FittingDistance(collection, instrumentation=Instrumentation(enabled=True))
+        distance({'abb'}, {'aa'})
+        distance.nearest({'abb'}, 2)
+        distance.fit([OracleClaim(({'abb'}, {'aa'}), (0., 0.1))], number_of_gradient_steps=2)
+        phases = distance.instrumentation_statistics()['phases']
+        for name in ('matrix_build', 'tfidf', 'vectorize', 'distance', 'nearest', 'gradient', 'weight_update', 'fit'):
+            self.assertTrue(phases[name]['calls'] > 0)
+        self.assertEqual(phases['matrix_build']['calls'], 1)
+        self.assertTrue(distance.instrumentation_statistics()['claims'] > 0)
+        self.assertEqual(FittingDistance(collection).instrumentation_statistics()['phases'], {})
+
+    def test_memory_report(self):
+        distance = FittingDistance({'abb', 'aa', 'baa', 'bbb'})
+        report = distance.memory_report(number_of_new_bags=4)
+        self.assertEqual(report['total'], sum(report['structures'].values()))
+        self.assertTrue(report['structures']['item_bag_matrix'] > 0)
+        self.assertTrue(report['projected_total'] > report['total'])
+        self.assertEqual(distance.memory_report()['projected_total'], report['total'])
+
+    def test_save_and_load(self):
+        collection = {'abb', 'aa', 'baa', 'bbb'}
+        distance = FittingDistance(collection)
+        distance.fit([OracleClaim(({'abb'}, {'aa'}), (0., 0.1))])
+        with tempfile.TemporaryDirectory() as path:
+            distance.save(path)
+            for mmap in (True, False):
+                loaded_distance = FittingDistance.load(path, mmap=mmap)
+                self.assertEqual(is_memory_mapped(loaded_distance.vectorize.item_bag_matrix.data), mmap)
+                self.assertEqual(is_memory_mapped(loaded_distance.vectorize.item_weights_vector), mmap)
+                self.assertAlmostEqual(loaded_distance({'abb'}, {'aa', 'bbb'}), distance({'abb'}, {'aa', 'bbb'}))
+                self.assertEqual(loaded_distance.weight_from_item('a'), distance.weight_from_item('a'))
+                self.assertEqual(loaded_distance.weight_from_bag('baa'), distance.weight_from_bag('baa'))
+                loaded_distance.fit([OracleClaim(({'abb'}, {'aa'}), (0.5, 0.6))])
+            self.assertAlmostEqual(FittingDistance.load(path).weight_from_item('a'), distance.weight_from_item('a'))
+
+    def test_save_keeps_bag_indices(self):
+        distance = FittingDistance(['ab', 'bc', 'cd', 'de'])
+        self.assertIsNone(distance.remove_bags(['ab', 'bc']))
+        self.assertEqual(distance.indices_from_bags(['de']).tolist(), [3])
+        with tempfile.TemporaryDirectory() as path:
+            distance.save(path)
+            self.assertEqual(distance.indices_from_bags(['de']).tolist(), [3])
+            loaded_distance = FittingDistance.load(path)
+            self.assertEqual(loaded_distance.vectorize.bag_to_index, {'cd': 0, 'de': 1})
+            self.assertAlmostEqual(loaded_distance({'cd'}, {'de'}), distance({'cd'}, {'de'}))
+            self.assertEqual(loaded_distance.weight_from_bag('de'), distance.weight_from_bag('de'))
+
+    def test_share_and_attach(self):
+        collection = {'abb', 'aa', 'baa', 'bbb'}
+        distance = FittingDistance(collection)
+        path = distance.share()
+        try:
+            attached_distance = FittingDistance.attach(path)
+            self.assertTrue(is_memory_mapped(attached_distance.vectorize.item_bag_matrix.data))
+            self.assertTrue(is_memory_mapped(attached_distance.vectorize.item_bag_matrix_by_columns.indices))
+            self.assertTrue(is_memory_mapped(attached_distance.vectorize.item_weights_vector))
+            self.assertTrue(is_memory_mapped(distance.vectorize.bag_weights_vector))
+            self.assertAlmostEqual(attached_distance({'abb'}, {'aa'}), distance({'abb'}, {'aa'}))
+            distance.fit([OracleClaim(({'abb'}, {'aa'}), (0., 0.1))])
+            self.assertAlmostEqual(attached_distance({'abb'}, {'aa'}), distance({'abb'}, {'aa'}))
+            self.assertEqual(attached_distance.weight_from_item('a'), distance.weight_from_item('a'))
+            with ProcessPoolExecutor(1) as executor:
+                self.assertAlmostEqual(executor.submit(distance_in_attached_process, path, {'abb'}, {'aa'}).result(),
+                                       distance({'abb'}, {'aa'}))
+            attached_distance.fit([OracleClaim(({'abb'}, {'aa'}), (0.5, 0.6))])
+            self.assertAlmostEqual(FittingDistance.attach(path)({'abb'}, {'aa'}), distance({'abb'}, {'aa'}))
+        finally:
+            shutil.rmtree(path)
+
+    def test_shared_bags_cannot_change(self):
+        distance = FittingDistance({'abb', 'aa', 'baa', 'bbb'})
+        path = distance.share()
+        try:
+            attached_distance = FittingDistance.attach(path)
+            for shared_distance in [distance, attached_distance]:
+                self.assertRaises(ValueError, shared_distance.add_bags, ['ccc'])
+                self.assertRaises(ValueError, shared_distance.remove_bags, ['aa'])
+                self.assertRaises(ValueError, shared_distance.compact)
+                self.assertEqual(len(shared_distance.vectorize.item_to_index), 2)
+                self.assertEqual(len(shared_distance.vectorize.bag_to_index), 4)
+                self.assertFalse(shared_distance.vectorize.bag_is_removed.any())
+            distance.vectorize.add_bags(['ccc'])
+            weights = distance.vectorize.item_weights_vector.copy()
+            self.assertRaises(ValueError, distance.fit, [OracleClaim(({'abb'}, {'aa'}), (0., 0.1))])
+            self.assertTrue(are_equal_vectors(distance.vectorize.item_weights_vector, weights))
+        finally:
+            shutil.rmtree(path)
+
     def test_exception_weight_from_item(self):
         bag0 = 'ab'
         bag1 = 'aa'
@@ -72,5 +309,9 @@ class TestFittingDistance(unittest.TestCase):
         self.assertEqual(distance.weight_from_bag('abc'), 3.)
 
 
+def distance_in_attached_process(path, bags0, bags1):
+    return FittingDistance.attach(path)(bags0, bags1)
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -1,4 +1,6 @@
+import shutil
 import unittest
+import tempfile
 
 
 from fitting_distance_on_text_collections import *
@@ -27,6 +29,74 @@ class TestFittingDistanceOnTextCollections(unittest.TestCase):
         distance = FittingDistanceOnTextCollections(text_collection)
         self.assertTrue(isinstance(distance({text0, text1}, {text1, text2}), float))
 
+    def test_pairwise_on_text_collections(self):
+        text_collection = ['banana', 'ananas', 'bans']
+        distance = FittingDistanceOnTextCollections(text_collection)
+        text_collections = [{'banana'}, {'ananas', 'bans'}]
+        computed = distance.pairwise(text_collections, [{'bans'}])
+        self.assertEqual(computed.shape, (2, 1))
+        self.assertAlmostEqual(computed[0, 0], distance({'banana'}, {'bans'}))
+        self.assertAlmostEqual(computed[1, 0], distance({'ananas', 'bans'}, {'bans'}))
+
+    def test_save_and_load(self):
+        text_collection = ['banana', 'ananas', 'bans']
+        distance = FittingDistanceOnTextCollections(text_collection)
+        with tempfile.TemporaryDirectory() as path:
+            distance.save(path)
+            loaded_distance = FittingDistanceOnTextCollections.load(path)
+            self.assertAlmostEqual(loaded_distance({'banana'}, {'bans'}), distance({'banana'}, {'bans'}))
+            self.assertEqual(loaded_distance.weight_from_factor('ba'), distance.weight_from_factor('ba'))
+            self.assertEqual(loaded_distance.weight_from_text('ananas'), distance.weight_from_text('ananas'))
+        distance.remove_texts(['banana'])
+        with tempfile.TemporaryDirectory() as path:
+            distance.save(path)
+            loaded_distance = FittingDistanceOnTextCollections.load(path)
+            self.assertEqual(loaded_distance.indices_from_texts(['ananas', 'bans']).tolist(), [0, 1])
+            self.assertAlmostEqual(loaded_distance({'ananas'}, {'bans'}), distance({'ananas'}, {'bans'}))
+        self.assertEqual(distance.indices_from_texts(['bans']).tolist(), [2])
+
+    def test_nearest(self):
+        texts = ['Hello world!', 'hello, world', 'Goodbye moon', 'Good morning world']
+        distance = FittingDistanceOnTextCollections(texts, max_factor_length=3)
+        neighbours = distance.nearest({'Hello world!'}, 3)
+        self.assertEqual({text for text, _ in neighbours[:2]}, {'Hello world!', 'hello, world'})
+        self.assertAlmostEqual(neighbours[0][1], 0.)
+        self.assertAlmostEqual(neighbours[2][1], distance({'Hello world!'}, {neighbours[2][0]}))
+        self.assertEqual(len(distance.nearest({'Goodbye moon'}, 10)), len(texts))
+
+    def test_text_indices(self):
+        texts = ['Hello world', 'hello world', 'Goodbye moon', 'Good morning world']
+        distance = FittingDistanceOnTextCollections(texts, max_factor_length=3)
+        indices = distance.indices_from_texts(texts)
+        self.assertEqual(indices.tolist(), [0, 0, 1, 2])
+        self.assertAlmostEqual(distance(indices[2:3], indices[3:]), distance({'Goodbye moon'}, {'Good morning world'}))
+        self.assertEqual(distance.nearest(indices[2:3], 1)[0][0], 'Goodbye moon')
+
+    def test_hashing_of_factors(self):
+        texts = ['Hello world!', 'Goodbye moon', 'Good morning world']
+        distance = FittingDistanceOnTextCollections(texts, max_factor_length=3)
+        hashed_distance = FittingDistanceOnTextCollections(texts, max_factor_length=3, number_of_hashing_bits=20)
+        self.assertEqual(len(hashed_distance.fitting_distance.vectorize.item_to_index), 2 ** 20)
+        self.assertAlmostEqual(hashed_distance({'Hello world!'}, {'Good morning world'}),
+                               distance({'Hello world!'}, {'Good morning world'}))
+        self.assertAlmostEqual(hashed_distance.weight_from_factor('wor'), distance.weight_from_factor('wor'))
+        report = hashed_distance.collision_report()
+        self.assertEqual(report['occupied_indices'], len(distance.fitting_distance.vectorize.item_to_index))
+        self.assertRaises(ValueError, distance.collision_report)
+
+    def test_add_texts_with_hashing_of_factors(self):
+        texts = ['Hello world!', 'Goodbye moon', 'Good morning world']
+        distance = FittingDistanceOnTextCollections(texts, max_factor_length=3)
+        hashed_distance = FittingDistanceOnTextCollections(texts, max_factor_length=3, number_of_hashing_bits=20)
+        self.assertEqual(hashed_distance.weight_from_factor('xyl'), 0.)
+        for text_distance in [distance, hashed_distance]:
+            text_distance.add_texts(['xylophone'])
+        self.assertGreater(hashed_distance.weight_from_factor('xyl'), 0.)
+        self.assertAlmostEqual(hashed_distance.weight_from_factor('xyl'), distance.weight_from_factor('xyl'))
+        self.assertAlmostEqual(hashed_distance.weight_from_factor('wor'), distance.weight_from_factor('wor'))
+        self.assertAlmostEqual(hashed_distance({'xylophone'}, {'Good morning world'}),
+                               distance({'xylophone'}, {'Good morning world'}))
+
     def test_type_bag_of_factors_from_text(self):
         bag = bag_of_factors_from_text('wefwef')
         self.assertTrue(isinstance(bag, tuple))
@@ -45,6 +115,62 @@ class TestFittingDistanceOnTextCollections(unittest.TestCase):
         text = 'A;b_C'
         clean = 'a b c'
         self.assertEqual(clean_text(text), clean)
+        text = 'Été \u212a9İ'
+        self.assertEqual(clean_text(text), ''.join(clean_letter(letter) for letter in text))
+
+    def test_factor_codes_from_text(self):
+        text = 'ab c  ab '
+        codes = factor_codes_from_text(text, 3)
+        self.assertEqual(len(codes), len(bag_of_factors_from_text(text, 3)))
+        self.assertEqual(sorted(factors_from_codes(codes, 3)), sorted(bag_of_factors_from_text(text, 3)))
+        self.assertEqual(len(factor_codes_from_text('', 3)), 0)
+
+    def test_factor_index_and_matrix_from_texts(self):
+        texts = ['ab c  ab ', 'banana', '']
+        for max_factor_length in [1, 3, None]:
+            factor_to_index, matrix = factor_index_and_matrix_from_texts(texts, max_factor_length)
+            self.assertEqual(matrix.shape, (len(factor_to_index), len(texts)))
+            for column, text in enumerate(texts):
+                bag = bag_of_factors_from_text(text, max_factor_length)
+                for factor in bag:
+                    self.assertEqual(matrix[factor_to_index[factor], column], bag.count(factor))
+                self.assertEqual(matrix[:, column].sum(), len(bag))
+
+    def test_parallel_factor_index_and_matrix_from_texts(self):
+        texts = ['ab c  ab ', 'banana', '', 'ananas', 'a bus', 'bananas']
+        for new_factor_to_index in [lambda: None, lambda: {'s': 0, 'zz': 1}]:
+            expected_factor_to_index, expected = factor_index_and_matrix_from_texts(texts, 3, new_factor_to_index())
+            computed_factor_to_index, computed = factor_index_and_matrix_from_texts(
+                iter(texts), 3, new_factor_to_index(), n_jobs=2, shard_size=2)
+            self.assertEqual(list(computed_factor_to_index.items()), list(expected_factor_to_index.items()))
+            self.assertTrue(are_equal_vectors(computed.indptr, expected.indptr))
+            self.assertTrue(are_equal_vectors(computed.indices, expected.indices))
+            self.assertTrue(are_equal_vectors(computed.data, expected.data))
+        distance = FittingDistanceOnTextCollections(texts, n_jobs=2)
+        self.assertAlmostEqual(distance({'banana'}, {'ananas'}),
+                               FittingDistanceOnTextCollections(texts)({'banana'}, {'ananas'}))
+
+    def test_share_and_attach(self):
+        texts = ['banana', 'Banana', 'ananas', 'bans']
+        distance = FittingDistanceOnTextCollections(texts, max_factor_length=3)
+        path = distance.share()
+        try:
+            attached_distance = FittingDistanceOnTextCollections.attach(path)
+            distance.fit([OracleClaim(({'banana'}, {'ananas'}), (0.5, 0.6))])
+            self.assertAlmostEqual(attached_distance({'Banana'}, {'ananas'}), distance({'banana'}, {'ananas'}))
+            self.assertEqual(attached_distance.nearest({'bans'}, 2), distance.nearest({'bans'}, 2))
+            self.assertRaises(ValueError, distance.add_texts, ['xylophone'])
+            self.assertRaises(ValueError, attached_distance.remove_texts, ['bans'])
+            self.assertNotIn('xyl', distance.fitting_distance.vectorize.item_to_index)
+            self.assertIn('bans', attached_distance.text_to_bag)
+        finally:
+            shutil.rmtree(path)
+
+    def test_duplicate_texts(self):
+        distance = FittingDistanceOnTextCollections(['banana', 'Banana', 'ananas'])
+        self.assertEqual(distance.text_to_bag['banana'], distance.text_to_bag['Banana'])
+        self.assertEqual(len(distance.fitting_distance.vectorize.bag_to_index), 2)
+        self.assertAlmostEqual(distance({'banana'}, {'Banana'}), 0.)
 
     def test_clean_letter(self):
         self.assertEqual(clean_letter('a'), 'a')
@@ -58,6 +184,107 @@ class TestFittingDistanceOnTextCollections(unittest.TestCase):
         distance = FittingDistanceOnTextCollections(text_collection)
         self.assertEqual(distance.weight_from_factor('wef'), 0.)
 
+    def test_memory_report(self):
+        distance = FittingDistanceOnTextCollections(['banana', 'Banana!', 'ananas', 'bans'])
+        report = distance.memory_report(number_of_new_texts=2)
+        self.assertEqual(report['number_of_documents'], 4)
+        self.assertTrue(report['structures']['text_to_bag'] > 0)
+        self.assertEqual(report['total'], sum(report['structures'].values()))
+
+    def test_add_and_remove_texts(self):
+        distance = FittingDistanceOnTextCollections(['banana', 'ananas'], max_factor_length=3)
+        weight = distance.weight_from_factor('ana')
+        distance.add_texts(['Banana', 'bans', 'nab'])
+        self.assertEqual(distance.weight_from_factor('ana'), weight)
+        self.assertGreater(distance.weight_from_factor('ns'), 0.)
+        self.assertAlmostEqual(distance.weight_from_text('bans'), 1 / 9)
+        self.assertEqual(distance.nearest(['Banana'], 2), [('banana', 0.), ('Banana', 0.)])
+        distance.remove_texts(['banana', 'nab'])
+        self.assertEqual(distance.nearest(['Banana'], 2)[0], ('Banana', 0.))
+        distance.remove_texts(['Banana'])
+        self.assertEqual([text for text, _ in distance.nearest(['ananas'], 3)], ['ananas', 'bans'])
+
+    def test_from_stream(self):
+        texts = ['Hello world!', 'hello, world', 'Goodbye moon', 'Good morning world']
+        distance = FittingDistanceOnTextCollections(texts, max_factor_length=3)
+        streamed_distance = FittingDistanceOnTextCollections.from_stream((text for text in texts), max_factor_length=3)
+        self.assertAlmostEqual(streamed_distance({'Hello world!'}, {'Goodbye moon'}),
+                               distance({'Hello world!'}, {'Goodbye moon'}))
+        self.assertNotIn('Hello world!', streamed_distance.text_to_bag)
+        neighbours = streamed_distance.nearest({'Good morning world'}, 1)
+        self.assertEqual(neighbours, [(digest_from_text('Good morning world'), 0.)])
+        streamed_distance.add_texts(['Good evening world'])
+        self.assertAlmostEqual(streamed_distance({'Good evening world'}, {'Good morning world'}),
+                               streamed_distance({'Good morning world'}, {'Good evening world'}))
+        with tempfile.TemporaryDirectory() as path:
+            streamed_distance.save(path)
+            loaded_distance = FittingDistanceOnTextCollections.load(path)
+            self.assertAlmostEqual(loaded_distance({'Hello world!'}, {'Goodbye moon'}),
+                                   streamed_distance({'Hello world!'}, {'Goodbye moon'}))
+
+    def test_from_stream_with_ids(self):
+        documents = [(0, 'banana'), (1, 'Banana'), (2, 'ananas')]
+        distance = FittingDistanceOnTextCollections.from_stream(iter(documents), with_ids=True, max_factor_length=3)
+        self.assertEqual({text_id for text_id, _ in distance.nearest({0}, 2)}, {0, 1})
+        expected = FittingDistanceOnTextCollections(['banana', 'ananas'], max_factor_length=3)
+        self.assertAlmostEqual(distance({0}, {2}), expected({'banana'}, {'ananas'}))
+        distance.add_texts({3: 'bans'})
+        distance.remove_texts([0, 1])
+        self.assertEqual([text_id for text_id, _ in distance.nearest({2}, 3)], [2, 3])
+
+    def test_from_file(self):
+        with tempfile.TemporaryDirectory() as path:
+            json_lines_file = os.path.join(path, 'texts.jsonl')
+            with open(json_lines_file, 'w') as file:
+                file.write(json.dumps({'id': 'a', 'body': 'banana'}) + '\n\n' + json.dumps({'id': 'b', 'body': 'bans'}))
+            self.assertEqual(list(documents_from_file(json_lines_file, 'body', 'id')), [('a', 'banana'), ('b', 'bans')])
+            distance = FittingDistanceOnTextCollections.from_file(json_lines_file, 'body', 'id')
+            expected = FittingDistanceOnTextCollections(['banana', 'bans'])
+            self.assertAlmostEqual(distance({'a'}, {'b'}), expected({'banana'}, {'bans'}))
+            text_file = os.path.join(path, 'texts.txt')
+            with open(text_file, 'w') as file:
+                file.write('banana\nbans\n')
+            self.assertEqual(list(documents_from_file(text_file)), ['banana', 'bans'])
+            self.assertEqual(list(documents_from_file(text_file, id_field='line')), [(0, 'banana'), (1, 'bans')])
+
+    def test_pruning_of_factors(self):
+        texts = ['banana', 'ananas', 'bans', 'nab']
+        distance = FittingDistanceOnTextCollections(texts, max_factor_length=3)
+        pruned_distance = FittingDistanceOnTextCollections(texts, max_factor_length=3, min_df=2, max_df=3)
+        self.assertEqual(pruned_distance.weight_from_factor('nas'), 0.)
+        self.assertEqual(pruned_distance.weight_from_factor('a'), 0.)
+        self.assertEqual(pruned_distance.weight_from_factor('ba'), distance.weight_from_factor('ba'))
+        self.assertLess(pruned_distance.fitting_distance.vectorize.item_bag_matrix.nnz,
+                        distance.fitting_distance.vectorize.item_bag_matrix.nnz)
+        self.assertRaises(ValueError, FittingDistanceOnTextCollections, texts, max_factor_length=3, min_df=2,
+                          number_of_hashing_bits=10)
+
+    def test_phases_of_construction(self):
+        distance = FittingDistanceOnTextCollections(['banana', 'ananas'], max_factor_length=3,
+                                                    instrumentation=Instrumentation(enabled=True))
+        phases = distance.instrumentation_statistics()['phases']
+        self.assertEqual(phases['factor_extraction']['calls'], 1)
+        self.assertEqual(phases['matrix_build']['calls'], 1)
+        distance.add_texts(['bans'])
+        phases = distance.instrumentation_statistics()['phases']
+        self.assertEqual(phases['factor_extraction']['calls'], 2)
+        self.assertEqual(phases['matrix_build']['calls'], 1)
+
+    def test_add_texts_after_pruning_of_factors(self):
+        texts = ['banana', 'ananas', 'bans', 'nab']
+        pruned_distance = FittingDistanceOnTextCollections(texts, max_factor_length=3, min_df=2, max_df=3)
+        factor_to_index = dict(pruned_distance.fitting_distance.vectorize.item_to_index)
+        pruned_distance.add_texts(['xylophone', 'ananas bans'])
+        self.assertEqual(pruned_distance.fitting_distance.vectorize.item_to_index, factor_to_index)
+        self.assertEqual(pruned_distance.weight_from_factor('nas'), 0.)
+        self.assertEqual(pruned_distance.weight_from_factor('xyl'), 0.)
+        self.assertEqual(pruned_distance.fitting_distance.vectorize.count_bags_containing_item('ba'), 3)
+        with tempfile.TemporaryDirectory() as path:
+            pruned_distance.save(path)
+            loaded_distance = FittingDistanceOnTextCollections.load(path)
+            loaded_distance.add_texts(['nasa'])
+            self.assertEqual(loaded_distance.fitting_distance.vectorize.item_to_index, factor_to_index)
+
     def test_input_bag_dictionary(self):
         bag_to_weight = {'aa': 1., 'ab': 2., 'abc': 3.}
         distance = FittingDistanceOnTextCollections(bag_to_weight)
@@ -45,11 +45,8 @@ def benchmark_fitting_distance(number_of_articles, new_articles=False):
     distance = FittingDistanceOnTextCollections(articles)
     construction_time = time.time()
     print('Distance built, time ' + str(construction_time - load_time))
-    all_distances = dict()
-    for i in range(len(articles)):
-        for j in range(i+1, len(articles)):
-            all_distances[i, j] = distance({articles[i]}, {articles[j]})
-            # print(str(i) + ', ' + str(j))
+    distance_array = distance.pairwise([{article} for article in articles])
+    all_distances = {(i, j): distance_array[i, j] for i in range(len(articles)) for j in range(i+1, len(articles))}
     computations_time = time.time()
     print('All distances computed, time ' + str(computations_time - construction_time))
     return all_distances
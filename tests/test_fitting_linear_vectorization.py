@@ -10,6 +10,7 @@ import unittest
 from tests.random_vectors_and_probabilities import *
 from vectorization_of_bag_collections.fitting_linear_vectorization import *
 from matrix_operations import *
+from distance_on_bag_collections.cosine_distance import CosineDistance
 
 
 bag_collection = ['aa', 'ab', 'bbb']
@@ -148,6 +149,27 @@ class TestFittingLinearVectorization(unittest.TestCase):
             # print('yop' + str(computed))
             self.assertTrue(computed <= 0.0001)
 
+    def test_partial_gradients_on_supports(self):
+        bag_arguments = ({'aa'}, {'ab', 'bbb'})
+        vectorizations = [vectorize(bags) for bags in bag_arguments]
+        _, function_partial_gradients = value_and_partial_gradients_from_form(function, vectorizations)
+        item_gradient, bag_gradient = vectorize.partial_gradients_from_form_on_vectorizations(function, bag_arguments)
+        item_indices, item_gradient_on_support, bag_indices, bag_gradient_on_support = \
+            vectorize.partial_gradients_on_supports(bag_arguments, vectorizations, function_partial_gradients)
+        expected_item_gradient = zero_vector_from_length(len(item_gradient))
+        expected_item_gradient[item_indices] = item_gradient_on_support
+        expected_bag_gradient = zero_vector_from_length(len(bag_gradient))
+        expected_bag_gradient[bag_indices] = bag_gradient_on_support
+        self.assertTrue(are_almost_equal_vectors(item_gradient, expected_item_gradient))
+        self.assertTrue(are_almost_equal_vectors(bag_gradient, expected_bag_gradient))
+
+    def test_fit_does_not_modify_given_weights(self):
+        item_weights = make_vector([1., 2.])
+        fitting_vectorize = FittingLinearVectorization(bag_collection, item_to_weight=item_weights)
+        fitting_vectorize.linear_fit_from_form_arguments_target(function, ({'aa'}, {'ab'}), 10.)
+        self.assertTrue(are_equal_vectors(item_weights, make_vector([1., 2.])))
+        self.assertFalse(are_equal_vectors(fitting_vectorize.item_weights_vector, item_weights))
+
     def test_partial_jacobian_duals_from_bags(self):
         number_of_try = 100
         bags = {'aa', 'ab'}
@@ -166,6 +188,100 @@ class TestFittingLinearVectorization(unittest.TestCase):
                         - scalar_product(bag_jacobian_dual(vector), bag_perturbation))
             self.assertTrue(computed <= 0.0001)
 
+    def test_linear_fit_from_batch_of_one_form_arguments_interval(self):
+        for form in (function, CosineDistance()):
+            bag_arguments = ({'aa', 'ab'}, {'ab', 'bbb'})
+            interval = (0., form(*(vectorize(argument) for argument in bag_arguments)) / 2.)
+            sequential_vectorize = FittingLinearVectorization(bag_collection)
+            sequential_vectorize.linear_fit_from_form_arguments_interval(form, bag_arguments, interval, speed=0.5)
+            batch_vectorize = FittingLinearVectorization(bag_collection)
+            batch_vectorize.linear_fit_from_batch_of_forms_arguments_intervals([(form, bag_arguments, interval)],
+                                                                               speed=0.5)
+            self.assertTrue(are_almost_equal_vectors(sequential_vectorize.item_weights_vector,
+                                                     batch_vectorize.item_weights_vector))
+            self.assertTrue(are_almost_equal_vectors(sequential_vectorize.bag_weights_vector,
+                                                     batch_vectorize.bag_weights_vector))
+
+    def test_single_vectorization_per_argument_in_linear_fit_from_form_arguments_interval(self):
+        uncached_vectorize = FittingLinearVectorization(bag_collection, cache_size=0)
+        computed_collections = []
+        vectorization_from_collection = uncached_vectorize.vectorization_from_collection
+
+        def counting_vectorization_from_collection(bags):
+            computed_collections.append(bags)
+            return vectorization_from_collection(bags)
+
+        uncached_vectorize.vectorization_from_collection = counting_vectorization_from_collection
+        bag_arguments = ({'aa', 'ab'}, {'ab', 'bbb'})
+        uncached_vectorize.linear_fit_from_form_arguments_interval(CosineDistance(), bag_arguments, (0., 0.))
+        self.assertEqual(computed_collections, list(bag_arguments))
+
+    def test_fit_from_tuples_of_forms_arguments_intervals_by_batches(self):
+        distance = CosineDistance()
+        batch_vectorize = FittingLinearVectorization(bag_collection)
+        forms_arguments_intervals = [(distance, ({'aa'}, {'ab'}), (0., 0.1)),
+                                     (distance, ({'aa', 'ab'}, {'ab'}), (0., 1.)),
+                                     (distance, ({'aa'}, {'bbb'}), (0.9, 1.))]
+        old_value = distance(batch_vectorize({'aa'}), batch_vectorize({'ab'}))
+        batch_vectorize.fit_from_tuples_of_forms_arguments_intervals(forms_arguments_intervals, batch_size=2)
+        self.assertTrue(distance(batch_vectorize({'aa'}), batch_vectorize({'ab'})) < old_value)
+        self.assertTrue(has_nonnegative_coefficients(batch_vectorize.item_weights_vector))
+        self.assertTrue(has_nonnegative_coefficients(batch_vectorize.bag_weights_vector))
+
+    def test_fit_summary(self):
+        distance = CosineDistance()
+        fitting_vectorize = FittingLinearVectorization(bag_collection)
+        forms_arguments_intervals = [(distance, ({'aa'}, {'ab'}), (0., 0.2)),
+                                     (distance, ({'aa'}, {'bbb'}), (0.9, 1.))]
+        summary = fitting_vectorize.fit_from_tuples_of_forms_arguments_intervals(forms_arguments_intervals,
+                                                                                number_of_gradient_steps=50,
+                                                                                adaptive_speed=True)
+        self.assertLess(summary['epochs'], 50)
+        self.assertEqual(summary['violated_claims'], 0)
+        self.assertEqual(summary['max_violation'], 0.)
+        self.assertTrue(distance(fitting_vectorize({'aa'}), fitting_vectorize({'ab'})) <= 0.2 + 1e-6)
+        version = fitting_vectorize.weights_version
+        summary = fitting_vectorize.fit_from_tuples_of_forms_arguments_intervals(forms_arguments_intervals)
+        self.assertEqual(summary['epochs'], 1)
+        self.assertEqual(fitting_vectorize.weights_version, version)
+
+    def test_fit_speed(self):
+        forms_arguments_intervals = [(CosineDistance(), ({'aa'}, {'ab'}), (0., 0.2))]
+        summary = FittingLinearVectorization(bag_collection).fit_from_tuples_of_forms_arguments_intervals(
+            forms_arguments_intervals, speed=0.3)
+        self.assertEqual(summary['speed'], 0.3)
+        summary = FittingLinearVectorization(bag_collection).fit_from_tuples_of_forms_arguments_intervals(
+            forms_arguments_intervals, speed=2., adaptive_speed=True)
+        self.assertTrue(summary['speed'] <= 2.)
+
+    def test_fit_with_tolerance(self):
+        distance = CosineDistance()
+        fitting_vectorize = FittingLinearVectorization(bag_collection)
+        value = distance(fitting_vectorize({'aa'}), fitting_vectorize({'ab'}))
+        summary = fitting_vectorize.fit_from_tuples_of_forms_arguments_intervals(
+            [(distance, ({'aa'}, {'ab'}), (0., value - 0.01))], tolerance=0.02)
+        self.assertEqual(summary['violated_claims'], 0)
+        self.assertEqual(distance(fitting_vectorize({'aa'}), fitting_vectorize({'ab'})), value)
+
+    def test_fit_without_gradient(self):
+        fitting_vectorize = FittingLinearVectorization(bag_collection)
+        summary = fitting_vectorize.fit_from_tuples_of_forms_arguments_intervals(
+            [(CosineDistance(), ({'aa'}, {'bbb'}), (0., 0.5))])
+        self.assertEqual(summary['violated_claims'], 1)
+        self.assertEqual(summary['epochs'], DEFAULT_NUMBER_OF_GRADIENT_STEPS)
+        self.assertFalse(np.isnan(fitting_vectorize.item_weights_vector).any())
+
+    def test_violation_from_value_and_interval(self):
+        self.assertEqual(violation_from_value_and_interval(0.5, (0., 1.)), 0.)
+        self.assertAlmostEqual(violation_from_value_and_interval(1.5, (0., 1.)), 0.5)
+        self.assertEqual(violation_from_value_and_interval(1.5, (0., 1.), tolerance=0.6), 0.)
+        computed = violations_from_values_and_targets(make_vector([0.5, 1.5, 2.]), make_vector([0.5, 1., 1.]), 0.6)
+        self.assertTrue(are_equal_vectors(computed, make_vector([0., 0., 1.])))
+
+    def test_batches_from_list(self):
+        self.assertEqual(batches_from_list([1, 2, 3, 4, 5], 2), [[1, 2], [3, 4], [5]])
+        self.assertRaises(ValueError, batches_from_list, [1], 0)
+
     def test_vectors_to_reach_target_from_partial_gradients__reaches_target(self):
         number_of_iterations = 10
         for _ in range(number_of_iterations):
@@ -224,6 +340,18 @@ class TestFittingLinearVectorization(unittest.TestCase):
         computed = dot_dot_matrix_dot_products(vector0, vector1, matrix, vector2, vector3)
         self.assertTrue(are_almost_equal_vectors(expected, computed))
 
+    def test_batch_values_and_partial_gradients_from_form(self):
+        columns0 = [make_vector([1., 0., 2., 0.]), make_vector([0., 0., 1., 0.])]
+        columns1 = [make_vector([3., 1., 0., 0.]), make_vector([1., 0., 0., 0.])]
+        values, gradient_matrices = batch_values_and_partial_gradients_from_form(
+            function, [matrix_from_columns(columns0, 4), matrix_from_columns(columns1, 4)], 4)
+        for index, (v0, v1) in enumerate(zip(columns0, columns1)):
+            self.assertAlmostEqual(values[index], function(v0, v1))
+            for gradient_matrix, partial_gradient in zip(gradient_matrices, function.partial_gradients):
+                self.assertTrue(are_almost_equal_vectors(column_from_matrix(gradient_matrix, index),
+                                                         partial_gradient(v0, v1)))
+        self.assertEqual(gradient_matrices[0].nnz, 1)
+
     def test_closest_point_from_interval(self):
         interval = (-2, 4)
         self.assertEqual(closest_point_from_interval(-3, interval), -2)
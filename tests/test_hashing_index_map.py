@@ -0,0 +1,52 @@
+# © 2020 Nokia
+# Licensed under the BSD 3-Clause License.
+# SPDX-License-Identifier: BSD-3-Clause
+# !/usr/bin/env python3
+# coding: utf-8
+# Author: Élie de Panafieu  <elie.de_panafieu@nokia-bell-labs.com>
+
+
+import unittest
+from vectorization_of_bag_collections.hashing_index_map import *
+from vectorization_of_bag_collections.vector_space import VectorSpace
+
+
+class TestHashingIndexMap(unittest.TestCase):
+
+    def test_getitem(self):
+        item_to_index = HashingIndexMap(4)
+        self.assertEqual(len(item_to_index), 16)
+        for item in ['a', 'banana', ('a', 1)]:
+            self.assertTrue(0 <= item_to_index[item] < 16)
+            self.assertEqual(item_to_index[item], HashingIndexMap(4)[item])
+            self.assertEqual(item_to_index.get(item), item_to_index[item])
+            self.assertIn(item, item_to_index)
+        self.assertEqual(item_to_index['abc'], zlib.crc32(b'abc') & 15)
+        self.assertRaises(ValueError, item_to_index.items)
+        self.assertRaises(ValueError, HashingIndexMap, 0)
+
+    def test_vector_space(self):
+        item_to_index = HashingIndexMap(10)
+        vector_space = VectorSpace(['banana', 'ananas', 'base'], item_to_index=item_to_index)
+        self.assertEqual(vector_space.item_bag_matrix.shape, (1024, 3))
+        self.assertEqual(vector_space.item_bag_matrix[item_to_index['a'], vector_space.bag_to_index['banana']], 3)
+
+    def test_collision_report(self):
+        item_to_index = HashingIndexMap(3)
+        vector_space = VectorSpace([tuple(range(100))], item_to_index=item_to_index)
+        report = item_to_index.collision_report(vector_space.item_bag_matrix)
+        self.assertEqual(report['occupied_indices'], 8)
+        self.assertEqual(report['estimated_collision_rate'], 1.)
+        vector_space = VectorSpace(['ab'], item_to_index=HashingIndexMap(20))
+        report = vector_space.item_to_index.collision_report(vector_space.item_bag_matrix)
+        self.assertEqual(report['occupied_indices'], 2)
+        self.assertAlmostEqual(report['estimated_items'], 2., places=5)
+
+    def test_estimated_number_of_items(self):
+        self.assertEqual(estimated_number_of_items(0, 8), 0.)
+        self.assertAlmostEqual(estimated_number_of_items(4, 8), 8 * np.log(2))
+        self.assertEqual(estimated_number_of_items(8, 8), float('inf'))
+
+
+if __name__ == '__main__':
+    unittest.main()
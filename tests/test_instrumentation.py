@@ -0,0 +1,49 @@
+# © 2020 Nokia
+# Licensed under the BSD 3-Clause License.
+# SPDX-License-Identifier: BSD-3-Clause
+# !/usr/bin/env python3
+# coding: utf-8
+# Author: Élie de Panafieu  <elie.de_panafieu@nokia-bell-labs.com>
+
+
+import unittest
+from instrumentation import *
+
+
+class TestInstrumentation(unittest.TestCase):
+
+    def test_disabled(self):
+        instrumentation = Instrumentation()
+        with instrumentation.phase('vectorize'):
+            pass
+        instrumentation.count_claims(3)
+        self.assertEqual(instrumentation.get_statistics(), {'phases': {}, 'claims': 0, 'claims_per_second': 0.})
+
+    def test_phases_and_hooks(self):
+        recorded = []
+        instrumentation = Instrumentation(enabled=True, hooks=[lambda name, _: recorded.append(name)])
+        with instrumentation.phase('fit'):
+            with instrumentation.phase('gradient'):
+                pass
+            with instrumentation.phase('gradient'):
+                pass
+        instrumentation.count_claims(2)
+        statistics = instrumentation.get_statistics()
+        self.assertEqual(recorded, ['gradient', 'gradient', 'fit'])
+        self.assertEqual(statistics['phases']['gradient']['calls'], 2)
+        self.assertEqual(statistics['phases']['fit']['calls'], 1)
+        self.assertTrue(statistics['phases']['fit']['time'] >= statistics['phases']['gradient']['time'])
+        self.assertEqual(statistics['claims'], 2)
+        instrumentation.reset()
+        self.assertEqual(instrumentation.get_statistics()['phases'], {})
+
+    def test_phase_records_on_exception(self):
+        instrumentation = Instrumentation(enabled=True)
+        with self.assertRaises(KeyError):
+            with instrumentation.phase('distance'):
+                raise KeyError
+        self.assertEqual(instrumentation.calls, {'distance': 1})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -57,6 +57,14 @@ class TestJensenShannonDistance(unittest.TestCase):
         vector = make_vector([1, 1, 1])
         self.assertAlmostEqual(js_distance(vector, vector), 0.)
 
+    def test_value_and_gradients(self):
+        vector0 = random_vector(5)
+        vector1 = random_vector(5)
+        value, (gradient0, gradient1) = js_distance.value_and_gradients(vector0, vector1)
+        self.assertAlmostEqual(value, js_distance(vector0, vector1))
+        self.assertTrue(are_almost_equal_vectors(gradient0, js_distance.first_partial_gradient(vector0, vector1)))
+        self.assertTrue(are_almost_equal_vectors(gradient1, js_distance.second_partial_gradient(vector0, vector1)))
+
     def test_entropy_from_probabilities(self):
         vector = make_vector([3, 4, 3])
         expected = make_vector([0.3, 0.4, 0.3])
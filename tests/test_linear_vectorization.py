@@ -37,6 +37,31 @@ class TestLinearVectorization(unittest.TestCase):
                         are_almost_colinear_vectors(vector1, make_vector([18, 0])))
         self.assertTrue(are_almost_colinear_vectors(vector0 + vector1, vectorization({'ab', 'bbb'})))
 
+    def test_memoized_call(self):
+        vectorize = LinearVectorization(bag_to_weight, item_to_weight)
+        vector = vectorize({'ab', 'bbb'})
+        self.assertIs(vectorize(['bbb', 'ab']), vector)
+        self.assertFalse(vector.flags.writeable)
+        vectorize.set_item_weights({'a': 2, 'b': 2})
+        self.assertFalse(are_almost_equal_vectors(vectorize({'ab', 'bbb'}), vector))
+        vectorize.item_weights_vector = 2 * vectorize.item_weights_vector
+        self.assertTrue(are_almost_colinear_vectors(vectorize({'ab'}), make_vector([2., 2.])))
+        self.assertEqual(vectorize.memoization.hits, 1)
+
+    def test_call_on_generator(self):
+        vectorize = LinearVectorization(bag_to_weight, item_to_weight)
+        vector = vectorize(bag for bag in ['ab', 'bbb'])
+        self.assertFalse(is_zero_vector(vector))
+        self.assertIs(vectorize(['ab', 'bbb']), vector)
+        self.assertTrue(are_almost_equal_vectors(vector, vectorize.vectorization_from_collection(['ab', 'bbb'])))
+
+    def test_call_on_bag_indices(self):
+        vectorize = LinearVectorization(bag_to_weight, item_to_weight)
+        indices = vectorize.indices_from_bags(['ab', 'bbb'])
+        self.assertTrue(are_equal_vectors(vectorize(indices), vectorize({'ab', 'bbb'})))
+        self.assertIs(vectorize(indices[::-1].copy()), vectorize(indices))
+        self.assertIsNot(vectorize(indices), vectorize({'ab', 'bbb'}))
+
     def test_tfidf_item_weights(self):
         tfidf_vectorization = LinearVectorization(bags)
         expected_item_weights_vector = make_vector([np.log(3 / 2), np.log(3 / 2)])
@@ -44,6 +69,34 @@ class TestLinearVectorization(unittest.TestCase):
         self.assertTrue(are_almost_colinear_vectors(tfidf_vectorization.item_weights_vector,
                                                     expected_item_weights_vector))
 
+    def test_tfidf_item_weights_vector(self):
+        vectorize = LinearVectorization(['ab', 'ac', 'a', 'bd'])
+        expected = {'a': np.log(4 / 3), 'b': np.log(2.), 'c': np.log(4.), 'd': np.log(4.)}
+        computed = vectorize.tfidf_item_weights()
+        self.assertEqual(set(computed), set(expected))
+        for item in expected:
+            self.assertAlmostEqual(computed[item], expected[item])
+
+    def test_input_weight_vectors(self):
+        vectorize = LinearVectorization(bags, make_vector([1., 2.]), bag_to_weight=make_vector([1., 2., 3.]))
+        self.assertTrue(are_equal_vectors(vectorize.item_weights_vector, make_vector([1., 2.])))
+        self.assertTrue(are_equal_vectors(vectorize.bag_weights_vector, make_vector([1., 2., 3.])))
+        self.assertRaises(ValueError, vectorize.set_bag_weights, make_vector([1., 2.]))
+
+    def test_cosine_similarities_to_bags(self):
+        vectorize = LinearVectorization(['ab', 'ac', 'a', 'bd', 'xy'])
+        vectorization = vectorize({'ab', 'ac'})
+        bag_indices, similarities = vectorize.cosine_similarities_to_bags(vectorization)
+        self.assertNotIn(vectorize.bag_to_index['xy'], bag_indices)
+        for bag_index, similarity in zip(bag_indices, similarities):
+            bag_vectorization = vectorize({vectorize.bags_from_indices()[bag_index]})
+            expected = scalar_product(vectorization, bag_vectorization) / norm_from_vector(vectorization) / \
+                norm_from_vector(bag_vectorization)
+            self.assertAlmostEqual(similarity, expected)
+        norms = vectorize.bag_norms_vector()
+        vectorize.set_item_weights(2 * vectorize.item_weights_vector)
+        self.assertTrue(are_almost_equal_vectors(vectorize.bag_norms_vector(), 2 * norms))
+
     def test_input_dictionary_bag(self):
         vectorize = LinearVectorization(bag_to_weight)
         self.assertEqual(sum(vectorize.bag_weights_vector), 6.)
@@ -27,6 +27,63 @@ class TestMatrixOperations(unittest.TestCase):
             for j in range(column_number):
                 self.assertEqual(computed[i, j], expected[i, j])
 
+    def test_matrix_from_bags_and_index_maps_with_empty_bags(self):
+        bags = ['', 'aab', '']
+        computed = matrix_from_bags_and_index_maps(bags, {'a': 0, 'b': 1}, {'': 1, 'aab': 0})
+        self.assertEqual(computed.get_shape(), (2, 2))
+        self.assertEqual(computed[0, 0], 2)
+        self.assertEqual(computed[1, 0], 1)
+        self.assertEqual(computed.getnnz(), 2)
+        empty = matrix_from_bags_and_index_maps([], {}, {})
+        self.assertEqual(empty.get_shape(), (0, 0))
+
+    def test_matrix_with_mapped_rows(self):
+        computed = matrix_with_mapped_rows(csr_matrix([[1, 0], [2, 3], [0, 4]]), [3, -1, 0], 4)
+        self.assertTrue(are_equal_vectors(dense_from_matrix(computed), make_vector([[0, 4], [0, 0], [0, 0], [1, 0]])))
+
+    def test_matrix_from_row_and_column_indices(self):
+        row_indices = [2, 0, 2, 1, 2]
+        column_indices = [1, 0, 1, 0, 0]
+        computed = matrix_from_row_and_column_indices(row_indices, column_indices, (4, 2))
+        expected = csr_matrix([[1, 0], [1, 0], [1, 2], [0, 0]])
+        self.assertTrue(are_equal_vectors(computed.toarray(), expected.toarray()))
+        self.assertEqual(computed.getnnz(), 4)
+
+    def test_matrix_from_column_entries(self):
+        computed = matrix_from_column_entries([make_index_vector([2, 0, 2]), make_index_vector([]),
+                                               make_index_vector([1])], [make_vector([1, 2, 3]), make_vector([]),
+                                                                         make_vector([4])], 3)
+        expected = make_vector([[2, 0, 0], [0, 0, 4], [4, 0, 0]])
+        self.assertTrue(isinstance(computed, csr_matrix))
+        self.assertTrue(are_equal_vectors(computed.toarray(), expected))
+        self.assertEqual(computed.getnnz(), 3)
+
+    def test_vector_matrix_product_on_columns(self):
+        vector = make_vector([1., 2., 3., 4., 5.])
+        computed = vector_matrix_product_on_columns(vector, column_matrix_from_matrix(matrix),
+                                                    make_index_vector([2, 1]))
+        self.assertTrue(are_equal_vectors(computed, make_vector([12., 16.])))
+
+    def test_matrix_vector_product_on_columns(self):
+        computed = matrix_vector_product_on_columns(column_matrix_from_matrix(matrix), make_index_vector([0, 2]),
+                                                    make_vector([1., 2.]))
+        self.assertTrue(are_equal_vectors(computed, make_vector([3., 5., 2., 2., 2.])))
+
+    def test_unique_from_index_array(self):
+        computed = unique_from_index_array(make_index_vector([3, 1, 3, 0, 1]))
+        self.assertEqual(computed.tolist(), [0, 1, 3])
+        self.assertEqual(len(unique_from_index_array(make_index_vector([]))), 0)
+
+    def test_matrix_from_index_collections(self):
+        computed = matrix_from_index_collections([[2, 0, 2], [], [1]], 3)
+        expected = make_vector([[1., 0., 0.], [0., 0., 1.], [1., 0., 0.]])
+        self.assertTrue(are_equal_vectors(dense_from_matrix(computed), expected))
+
+    def test_normalize_matrix_columns(self):
+        computed = dense_from_matrix(normalize_matrix_columns(csr_matrix([[3., 0.], [4., 0.]])))
+        self.assertTrue(are_almost_equal_vectors(computed[:, 0], normalize(make_vector([3., 4.]))))
+        self.assertTrue(are_equal_vectors(computed[:, 1], make_vector([0., 0.])))
+
     def test_vector_from_index_and_value_maps(self):
         to_index = {'a': 0, 'b': 1, 'c': 2}
         to_value = {'a': 0.1, 'c': 3}
@@ -50,6 +107,14 @@ class TestMatrixOperations(unittest.TestCase):
         for i in range(row_number):
             self.assertEqual(computed[i], expected[i])
 
+    def test_count_nonzero_entries_in_matrix_rows(self):
+        computed = count_nonzero_entries_in_matrix_rows(matrix)
+        self.assertTrue(are_equal_vectors(computed, make_vector([2, 3, 2, 2, 1])))
+
+    def test_log_of_ratios_zero_if_null_denominators(self):
+        computed = log_of_ratios_zero_if_null_denominators(6, [3, 0, 6])
+        self.assertTrue(are_almost_equal_vectors(computed, make_vector([np.log(2.), 0., 0.])))
+
     def test_rescale_vector_to_satisfy_lower_negative_bound(self):
         vector = make_vector([6, 2, 4, 8])
         self.assertTrue(are_equal_vectors(rescale_vector_to_satisfy_lower_negative_bound(vector, -1), vector))
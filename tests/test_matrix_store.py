@@ -0,0 +1,57 @@
+# © 2020 Nokia
+# Licensed under the BSD 3-Clause License.
+# SPDX-License-Identifier: BSD-3-Clause
+# !/usr/bin/env python3
+# coding: utf-8
+# Author: Élie de Panafieu  <elie.de_panafieu@nokia-bell-labs.com>
+
+
+import unittest
+from vectorization_of_bag_collections.matrix_store import *
+
+
+matrix = csr_matrix([[1, 0, 1], [3, 3, 1], [2, 2, 0], [0, 1, 1]])
+
+
+class TestMatrixStore(unittest.TestCase):
+
+    def assert_synchronized(self, store, expected):
+        self.assertEqual(store.rows.format, 'csr')
+        self.assertEqual(store.columns.format, 'csc')
+        self.assertTrue(are_equal_vectors(dense_from_matrix(store.rows), expected))
+        self.assertTrue(are_equal_vectors(dense_from_matrix(store.columns), expected))
+
+    def test_columns(self):
+        store = MatrixStore(matrix)
+        self.assertIsNone(store.column_format)
+        self.assert_synchronized(store, matrix.toarray())
+        self.assertEqual(store.shape, (4, 3))
+
+    def test_append_columns(self):
+        store = MatrixStore(matrix)
+        _ = store.columns
+        store.append_columns(csr_matrix([[0], [1], [0], [0], [5]]))
+        expected = make_vector([[1, 0, 1, 0], [3, 3, 1, 1], [2, 2, 0, 0], [0, 1, 1, 0], [0, 0, 0, 5]])
+        self.assert_synchronized(store, expected)
+
+    def test_append_columns_several_times(self):
+        store = MatrixStore(matrix)
+        _ = store.columns
+        store.append_columns(csr_matrix([[0], [1], [0], [0], [5]]))
+        store.append_columns(csr_matrix([[2], [0], [0], [0]]))
+        self.assertEqual(len(store.pending_matrices), 2)
+        self.assertEqual(store.shape, (5, 5))
+        expected = make_vector([[1, 0, 1, 0, 2], [3, 3, 1, 1, 0], [2, 2, 0, 0, 0], [0, 1, 1, 0, 0], [0, 0, 0, 5, 0]])
+        self.assert_synchronized(store, expected)
+        self.assertEqual(len(store.pending_matrices), 0)
+
+    def test_select_rows_and_columns(self):
+        store = MatrixStore(matrix)
+        _ = store.columns
+        store.select_rows(make_index_vector([0, 3]))
+        store.select_columns(make_index_vector([1, 2]))
+        self.assert_synchronized(store, make_vector([[0, 1], [1, 1]]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+# © 2020 Nokia
+# Licensed under the BSD 3-Clause License.
+# SPDX-License-Identifier: BSD-3-Clause
+# !/usr/bin/env python3
+# coding: utf-8
+# Author: Élie de Panafieu  <elie.de_panafieu@nokia-bell-labs.com>
+
+
+import unittest
+import numpy as np
+from memoization import *
+
+
+class TestMemoization(unittest.TestCase):
+
+    def test_get_and_set(self):
+        memoization = Memoization(max_size=2)
+        self.assertIsNone(memoization.get('a', 0))
+        memoization.set('a', 0, 1.)
+        self.assertEqual(memoization.get('a', 0), 1.)
+        self.assertEqual(memoization.hits, 1)
+        self.assertEqual(memoization.misses, 1)
+
+    def test_least_recently_used_eviction(self):
+        memoization = Memoization(max_size=2)
+        memoization.set('a', 0, 1.)
+        memoization.set('b', 0, 2.)
+        memoization.get('a', 0)
+        memoization.set('c', 0, 3.)
+        self.assertEqual(len(memoization), 2)
+        self.assertEqual(memoization.evictions, 1)
+        self.assertIsNone(memoization.get('b', 0))
+        self.assertEqual(memoization.get('a', 0), 1.)
+        self.assertEqual(memoization.get('c', 0), 3.)
+
+    def test_version_invalidation(self):
+        memoization = Memoization()
+        memoization.set('a', 0, 1.)
+        self.assertIsNone(memoization.get('a', 1))
+        self.assertEqual(memoization.invalidations, 1)
+        self.assertEqual(len(memoization), 0)
+
+    def test_zero_max_size(self):
+        memoization = Memoization(max_size=0)
+        memoization.set('a', 0, 1.)
+        self.assertIsNone(memoization.get('a', 0))
+
+    def test_max_bytes(self):
+        vector = np.zeros(100)
+        vector_bytes = deep_size_from_object(vector)
+        memoization = Memoization(max_size=None, max_bytes=2 * vector_bytes)
+        memoization.set('a', 0, vector)
+        memoization.set('b', 0, np.ones(100))
+        memoization.set('c', 0, np.ones(100))
+        self.assertEqual(len(memoization), 2)
+        self.assertEqual(memoization.bytes, 2 * vector_bytes)
+        self.assertEqual(memoization.evictions, 1)
+        self.assertIsNone(memoization.get('a', 0))
+        memoization.set('d', 0, np.zeros(300))
+        self.assertIsNone(memoization.get('d', 0))
+        memoization.set('e', 1, vector)
+        self.assertEqual(memoization.bytes, vector_bytes)
+
+    def test_get_statistics(self):
+        memoization = Memoization(max_size=1)
+        memoization.set('a', 0, 1.)
+        memoization.get('a', 0)
+        memoization.get('b', 0)
+        statistics = memoization.get_statistics()
+        self.assertEqual(statistics['size'], 1)
+        self.assertEqual(statistics['hits'], 1)
+        self.assertEqual(statistics['misses'], 1)
+        self.assertAlmostEqual(statistics['hit_rate'], 0.5)
+
+
+if __name__ == '__main__':
+    unittest.main()
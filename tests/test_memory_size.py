@@ -0,0 +1,42 @@
+# © 2020 Nokia
+# Licensed under the BSD 3-Clause License.
+# SPDX-License-Identifier: BSD-3-Clause
+# !/usr/bin/env python3
+# coding: utf-8
+# Author: Élie de Panafieu  <elie.de_panafieu@nokia-bell-labs.com>
+
+
+import sys
+import unittest
+from memory_size import *
+from vectorization_of_bag_collections.bag import Bag
+
+
+class TestMemorySize(unittest.TestCase):
+
+    def test_deep_size_from_object(self):
+        text = 'a' * 1000
+        self.assertEqual(deep_size_from_object(text), sys.getsizeof(text))
+        self.assertEqual(deep_size_from_object([text, text]), sys.getsizeof([text, text]) + sys.getsizeof(text))
+        vector = np.zeros(1000)
+        self.assertTrue(deep_size_from_object(vector) >= vector.nbytes)
+        self.assertTrue(deep_size_from_object(vector[:10]) >= vector.nbytes)
+        bag = Bag(np.arange(100), np.ones(100))
+        self.assertTrue(deep_size_from_object(bag) >= bag.item_indices.nbytes + bag.counts.nbytes)
+
+    def test_shared_objects_are_counted_once(self):
+        text = 'a' * 1000
+        seen = set()
+        self.assertTrue(deep_size_from_object({text: 0}, seen) > len(text))
+        self.assertTrue(deep_size_from_object([text], seen) < len(text))
+
+    def test_projected_memory_report(self):
+        report = projected_memory_report({'item_to_index': 100, 'bag_to_index': 40, 'memoization': 1000}, 4, 10, 2., 3)
+        self.assertEqual(report['total'], 1140)
+        self.assertEqual(report['bytes_per_document'], 10.)
+        self.assertEqual(report['bytes_per_item'], 10.)
+        self.assertEqual(report['projected_total'], 1140 + 3 * 10 + 6 * 10)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+# © 2020 Nokia
+# Licensed under the BSD 3-Clause License.
+# SPDX-License-Identifier: BSD-3-Clause
+# !/usr/bin/env python3
+# coding: utf-8
+# Author: Élie de Panafieu  <elie.de_panafieu@nokia-bell-labs.com>
+
+
+import unittest
+from vectorization_of_bag_collections.linear_vectorization import LinearVectorization
+from vectorization_of_bag_collections.random_projection_index import *
+
+
+bags = ['abc', 'abd', 'cde', 'xyz', 'xxy', 'aab', 'fgh', 'efg']
+
+
+class TestRandomProjectionIndex(unittest.TestCase):
+
+    def test_candidates_contain_identical_bag(self):
+        vectorize = LinearVectorization(bags)
+        index = RandomProjectionIndex(vectorize, number_of_bits=8, number_of_tables=2)
+        for bag in bags:
+            candidates = index.candidates_from_vectorization(vectorize({bag}))
+            self.assertIn(vectorize.bag_to_index[bag], candidates)
+
+    def test_cosine_similarities_to_bags(self):
+        vectorize = LinearVectorization(bags)
+        index = RandomProjectionIndex(vectorize, number_of_bits=1, number_of_tables=4)
+        vectorization = vectorize({'abc', 'xyz'})
+        expected_indices, expected_similarities = vectorize.cosine_similarities_to_bags(vectorization)
+        bag_indices, similarities = index.cosine_similarities_to_bags(vectorization)
+        expected = dict(zip(expected_indices, expected_similarities))
+        for bag_index, similarity in zip(bag_indices, similarities):
+            self.assertAlmostEqual(similarity, expected.get(bag_index, 0.))
+
+    def test_refresh(self):
+        vectorize = LinearVectorization(bags)
+        index = RandomProjectionIndex(vectorize, number_of_bits=8, number_of_tables=2)
+        sorted_codes = index.sorted_codes
+        index.refresh()
+        self.assertIs(index.sorted_codes, sorted_codes)
+        vectorize.set_item_weights(vectorize.item_weights_vector + 1.)
+        index.refresh()
+        self.assertIsNot(index.sorted_codes, sorted_codes)
+        self.assertEqual(index.weights_version, vectorize.weights_version)
+
+    def test_number_of_tables_from_recall(self):
+        self.assertEqual(number_of_tables_from_recall(0.9, 1, 0.), 4)
+        self.assertTrue(number_of_tables_from_recall(0.99, 12, 0.8) > number_of_tables_from_recall(0.9, 12, 0.8))
+        self.assertEqual(number_of_tables_from_recall(0.9, 12, 1.), 1)
+        self.assertRaises(ValueError, number_of_tables_from_recall, 1., 12, 0.8)
+
+    def test_random_signs(self):
+        signs = random_signs(np.arange(100), np.arange(8), 0)
+        self.assertEqual(signs.shape, (100, 8))
+        self.assertTrue(np.all(np.abs(signs) == 1.))
+        self.assertTrue(np.array_equal(signs[[3, 5]], random_signs([3, 5], np.arange(8), 0)))
+        self.assertFalse(np.array_equal(signs, random_signs(np.arange(100), np.arange(8), 1)))
+
+    def test_codes_from_projections(self):
+        codes = codes_from_projections(np.array([[1., -1., 2.], [-1., -1., -1.]]))
+        self.assertTrue(np.array_equal(codes, [5, 0]))
+
+
+if __name__ == '__main__':
+    unittest.main()
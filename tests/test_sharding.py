@@ -0,0 +1,41 @@
+# © 2020 Nokia
+# Licensed under the BSD 3-Clause License.
+# SPDX-License-Identifier: BSD-3-Clause
+# !/usr/bin/env python3
+# coding: utf-8
+# Author: Élie de Panafieu  <elie.de_panafieu@nokia-bell-labs.com>
+
+
+import os
+import unittest
+from sharding import *
+
+
+class TestSharding(unittest.TestCase):
+
+    def test_number_of_jobs_from_n_jobs(self):
+        self.assertEqual(number_of_jobs_from_n_jobs(None), 1)
+        self.assertEqual(number_of_jobs_from_n_jobs(3), 3)
+        self.assertEqual(number_of_jobs_from_n_jobs(-1), os.cpu_count())
+        with self.assertRaises(ValueError):
+            number_of_jobs_from_n_jobs(0)
+
+    def test_shards_from_iterable(self):
+        self.assertEqual(list(shards_from_iterable(iter(range(5)), 2)), [[0, 1], [2, 3], [4]])
+        self.assertEqual(list(shards_from_iterable([], 2)), [])
+
+    def test_map_shards(self):
+        shards = shards_from_iterable(range(10), 3)
+        self.assertEqual(list(map_shards(sum, shards)), [3, 12, 21, 9])
+        shards = shards_from_iterable(range(10), 3)
+        self.assertEqual(list(map_shards(max, shards, 2)), [2, 5, 8, 9])
+
+    def test_map_shards_of_iterable(self):
+        for n_jobs in [None, 2]:
+            self.assertEqual(list(map_shards_of_iterable(sum, list(range(10)), 3, n_jobs)), [3, 12, 21, 9])
+            self.assertEqual(list(map_shards_of_iterable(max, iter(range(10)), 3, n_jobs)), [2, 5, 8, 9])
+            self.assertEqual(INHERITED_SEQUENCES, dict())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,49 @@
+# © 2020 Nokia
+# Licensed under the BSD 3-Clause License.
+# SPDX-License-Identifier: BSD-3-Clause
+# !/usr/bin/env python3
+# coding: utf-8
+# Author: Élie de Panafieu  <elie.de_panafieu@nokia-bell-labs.com>
+
+
+import os
+import unittest
+import tempfile
+from shared_weights import *
+from matrix_operations import make_vector, save_vector, are_equal_vectors
+
+
+slot_files = (('vector0.npy',), ('vector1.npy',))
+header_file = 'header.npy'
+
+
+class TestSharedWeights(unittest.TestCase):
+
+    def test_publish(self):
+        with tempfile.TemporaryDirectory() as path:
+            save_vector(make_vector([1., 2.]), os.path.join(path, slot_files[0][0]))
+            owner = SharedWeights.create(path, slot_files, header_file)
+            reader = SharedWeights(path, slot_files, header_file)
+            version, (vector,) = reader.current()
+            self.assertEqual(version, 0)
+            self.assertTrue(are_equal_vectors(vector, make_vector([1., 2.])))
+            owner.publish([make_vector([3., 4.])])
+            self.assertEqual(reader.version(), 1)
+            self.assertTrue(are_equal_vectors(reader.current()[1][0], make_vector([3., 4.])))
+            # The vectors read before the publication are unchanged.
+            self.assertTrue(are_equal_vectors(vector, make_vector([1., 2.])))
+            owner.publish([make_vector([5., 6.])])
+            self.assertTrue(are_equal_vectors(reader.current()[1][0], make_vector([5., 6.])))
+            with self.assertRaises(ValueError):
+                reader.publish([make_vector([1., 2.])])
+            with self.assertRaises(ValueError):
+                owner.publish([make_vector([1., 2., 3.])])
+
+    def test_shared_directory(self):
+        path = shared_directory()
+        self.assertTrue(os.path.isdir(path))
+        os.rmdir(path)
+
+
+if __name__ == '__main__':
+    unittest.main()
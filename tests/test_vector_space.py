@@ -35,6 +35,61 @@ class TestVectorSpace(unittest.TestCase):
         self.assertEqual(vector_space.count_bags_containing_item('e'), 1)
         self.assertEqual(vector_space.count_bags_containing_item('f'), 0)
 
+    def test_add_and_remove_bags(self):
+        space = VectorSpace(['banana', 'ananas'])
+        self.assertEqual(space.add_bags(['base', 'banana', 'nab']).tolist(), [2, 3])
+        self.assertEqual(space.count_bags_containing_item('b'), 3)
+        self.assertEqual(space.item_bag_matrix.shape, (len(space.item_to_index), 4))
+        self.assertIsNone(space.remove_bags(['banana']))
+        self.assertEqual(space.count_bags_containing_item('b'), 2)
+        self.assertEqual(space.bags_from_indices(), [None, 'ananas', 'base', 'nab'])
+        self.assertEqual(space.compact().tolist(), [-1, 0, 1, 2])
+        expected = VectorSpace(['ananas', 'base', 'nab'], item_to_index=space.item_to_index)
+        self.assertEqual(space.bag_to_index, expected.bag_to_index)
+        self.assertEqual((space.item_bag_matrix != expected.item_bag_matrix).nnz, 0)
+        space.compaction_ratio = 0.5
+        self.assertIsNone(space.remove_bags(['ananas']))
+        self.assertEqual(space.remove_bags(['base']).tolist(), [-1, -1, 0])
+        self.assertEqual(space.bag_to_index, {'nab': 0})
+
+    def test_prune_items(self):
+        space = VectorSpace(['banana', 'ananas', 'base', 'nab'])
+        space.prune_items(min_df=2, max_df=0.9)
+        self.assertEqual(set(space.item_to_index), {'b', 'n', 's'})
+        self.assertEqual(space.item_bag_matrix.shape, (3, 4))
+        self.assertEqual(space.count_bags_containing_item('s'), 2)
+        space.add_bags(['bass', 'zebra'])
+        self.assertEqual(set(space.item_to_index), {'b', 'n', 's'})
+        self.assertEqual(space.item_bag_matrix.shape, (3, 6))
+        self.assertEqual(space.count_bags_containing_item('s'), 3)
+        self.assertEqual(space.count_bags_containing_item('b'), 5)
+        self.assertEqual(space.count_bags_containing_item('a'), 0)
+        space.prune_items(max_features=2)
+        self.assertEqual(set(space.item_to_index), {'b', 'n'})
+        self.assertEqual(sorted(space.item_to_index.values()), [0, 1])
+
+    def test_kept_item_indices_from_document_frequencies(self):
+        document_frequencies = np.array([1, 4, 2, 3, 2])
+        computed = kept_item_indices_from_document_frequencies(document_frequencies, 4, min_df=2, max_features=2)
+        self.assertEqual(computed.tolist(), [1, 3])
+        computed = kept_item_indices_from_document_frequencies(document_frequencies, 4, max_df=0.5)
+        self.assertEqual(computed.tolist(), [0, 2, 4])
+
+    def test_item_and_bag_indices_and_matrix_from_bags(self):
+        sharded_bags = ['banana', 'ananas', 'base', 'banana', 'bus', 'sea', 'nab']
+        item_to_index = map_to_index_from_iterable(union_from_iterables(sharded_bags))
+        bag_to_index = map_to_index_from_iterable(sharded_bags)
+        expected = matrix_from_bags_and_index_maps(sharded_bags, item_to_index, bag_to_index)
+        for n_jobs, shard_size in [(None, 2), (2, 2), (2, 4)]:
+            computed_item_to_index, computed_bag_to_index, computed = item_and_bag_indices_and_matrix_from_bags(
+                sharded_bags, n_jobs, shard_size)
+            self.assertEqual(list(computed_item_to_index.items()), list(item_to_index.items()))
+            self.assertEqual(computed_bag_to_index, bag_to_index)
+            self.assertEqual(computed.dtype, expected.dtype)
+            self.assertTrue(are_equal_vectors(computed.indptr, expected.indptr))
+            self.assertTrue(are_equal_vectors(computed.indices, expected.indices))
+            self.assertTrue(are_equal_vectors(computed.data, expected.data))
+
     def test_map_to_index_from_iterable(self):
         bag = 'abacbde'
         computed = map_to_index_from_iterable(bag)
@@ -0,0 +1,71 @@
+# © 2020 Nokia
+# Licensed under the BSD 3-Clause License.
+# SPDX-License-Identifier: BSD-3-Clause
+# !/usr/bin/env python3
+# coding: utf-8
+# Author: Élie de Panafieu  <elie.de_panafieu@nokia-bell-labs.com>
+
+
+import numpy as np
+
+
+ITEM_INDEX_TYPE = np.uint32
+COUNT_TYPE = np.uint32
+
+
+class Bag:
+    """ Bag of items stored as the sorted array of the indices of its distinct items and the array of their counts.
+    Its hash is computed once, so that it is a cheap dictionary key, unlike a long tuple of items. """
+
+    __slots__ = ('item_indices', 'counts', 'hash')
+
+    def __init__(self, item_indices, counts):
+        """ 'item_indices' must be sorted without repetition. """
+        self.item_indices = np.asarray(item_indices, dtype=ITEM_INDEX_TYPE)
+        self.counts = np.asarray(counts, dtype=COUNT_TYPE)
+        self.item_indices.flags.writeable = False
+        self.counts.flags.writeable = False
+        self.hash = hash((self.item_indices.tobytes(), self.counts.tobytes()))
+
+    @classmethod
+    def from_items(cls, items, item_to_index):
+        """ Return the bag of the items of the iterable 'items', that must all belong to 'item_to_index'. """
+        indices = np.fromiter(map(item_to_index.__getitem__, items), dtype=np.int64)
+        item_indices, counts = np.unique(indices, return_counts=True)
+        return cls(item_indices, counts)
+
+    def __hash__(self):
+        return self.hash
+
+    def __eq__(self, other):
+        if not isinstance(other, Bag):
+            return NotImplemented
+        return (self.hash == other.hash and np.array_equal(self.item_indices, other.item_indices)
+                and np.array_equal(self.counts, other.counts))
+
+    def __len__(self):
+        return int(self.counts.sum())
+
+    def __reduce__(self):
+        # The hash of bytes depends on the process, so it is computed again when unpickling.
+        return Bag, (self.item_indices, self.counts)
+
+    def __repr__(self):
+        return 'Bag(' + repr(self.item_indices.tolist()) + ', ' + repr(self.counts.tolist()) + ')'
+
+    def items(self, index_to_item):
+        """ Return the tuple of the items of the bag, each repeated according to its count,
+        where 'index_to_item' is the list of items sorted by index. """
+        return tuple(index_to_item[index] for index, count in zip(self.item_indices.tolist(), self.counts.tolist())
+                     for _ in range(count))
+
+
+def compact_bag_from_items(items, item_to_index):
+    """ Return 'items' itself if it is a 'Bag' or contains an item absent from 'item_to_index',
+    since such a bag does not belong to any collection indexed by 'item_to_index',
+    and 'Bag.from_items(items, item_to_index)' otherwise. """
+    if isinstance(items, Bag):
+        return items
+    if not all(item in item_to_index for item in items):
+        return items
+    return Bag.from_items(items, item_to_index)
@@ -7,52 +7,238 @@
 
 
 import random
+import time
 from matrix_operations import *
-from vectorization_of_bag_collections.linear_vectorization import LinearVectorization
+from vectorization_of_bag_collections.linear_vectorization import LinearVectorization, DEFAULT_CACHE_SIZE
 
 
 DEFAULT_SPEED = 0.3
 DEFAULT_NUMBER_OF_GRADIENT_STEPS = 6
+# Factors applied to the speed after an epoch that reduced, or increased, the total violation of its tuples.
+SPEED_INCREASE = 1.2
+SPEED_DECREASE = 0.5
+MAX_SPEED = 1.
 
 
 class FittingLinearVectorization(LinearVectorization):
 
-    def __init__(self, bags, item_to_weight=None):
-        super().__init__(bags, item_to_weight)
+    def __init__(self, bags, item_to_weight=None, cache_size=DEFAULT_CACHE_SIZE, bag_to_weight=None,
+                 item_to_index=None, item_bag_matrix=None, compact_bags=False,
+                 min_df=None, max_df=None, max_features=None, instrumentation=None, n_jobs=None):
+        super().__init__(bags, item_to_weight, cache_size=cache_size, bag_to_weight=bag_to_weight,
+                         item_to_index=item_to_index, item_bag_matrix=item_bag_matrix, compact_bags=compact_bags,
+                         min_df=min_df, max_df=max_df, max_features=max_features, instrumentation=instrumentation,
+                         n_jobs=n_jobs)
 
     def fit_from_tuples_of_forms_arguments_intervals(self, forms_arguments_intervals,
                                                      speed=DEFAULT_SPEED, ratio_item_bag_fitting=0.5,
-                                                     number_of_gradient_steps=DEFAULT_NUMBER_OF_GRADIENT_STEPS):
-        forms_arguments_intervals = forms_arguments_intervals.copy()
-        for _ in range(number_of_gradient_steps):
-            random.shuffle(forms_arguments_intervals)
-            for function, arguments, interval in forms_arguments_intervals:
-                self.linear_fit_from_form_arguments_interval(function, arguments, interval, speed=speed,
-                                                             ratio_item_bag_fitting=ratio_item_bag_fitting)
+                                                     number_of_gradient_steps=DEFAULT_NUMBER_OF_GRADIENT_STEPS,
+                                                     batch_size=None, tolerance=0., adaptive_speed=False):
+        """ Run at most 'number_of_gradient_steps' epochs. An epoch processes, in random order, the tuples
+        that were violated in the previous epoch, a tuple being satisfied when the value of its form
+        is within 'tolerance' of its interval. Once an epoch finds all its tuples satisfied, all the tuples
+        are checked again, and the fit stops if none is violated.
+        If 'adaptive_speed', the speed is multiplied by 'SPEED_INCREASE' after an epoch that reduced
+        the total violation of its tuples, up to the largest of 'MAX_SPEED' and 'speed', and by 'SPEED_DECREASE'
+        after an epoch that increased it. Otherwise, the speed stays 'speed'.
+        If 'batch_size' is None, the weights are updated after each tuple.
+        Otherwise, the tuples are processed by mini-batches of 'batch_size' tuples,
+        see 'linear_fit_from_batch_of_forms_arguments_intervals'.
+        Return a dictionary summarizing the fit: the number of epochs, the number and the largest violation
+        of the tuples still violated, the final speed and the elapsed time in seconds. """
+        start_time = time.perf_counter()
+        forms_arguments_intervals = list(forms_arguments_intervals)
+        # 'last_violations[k]' is the violation of the tuple 'k' when it was last processed or checked.
+        last_violations = np.full(len(forms_arguments_intervals), np.inf)
+        active_positions = list(range(len(forms_arguments_intervals)))
+        number_of_epochs = 0
+        are_all_tuples_checked = False
+        max_speed = max(speed, MAX_SPEED)
+        while number_of_epochs < number_of_gradient_steps and len(active_positions) > 0:
+            random.shuffle(active_positions)
+            active_tuples = [forms_arguments_intervals[position] for position in active_positions]
+            self.instrumentation.count_claims(len(active_tuples))
+            if batch_size is None:
+                violations = make_vector([self.linear_fit_from_form_arguments_interval(
+                    function, arguments, interval, speed=speed, ratio_item_bag_fitting=ratio_item_bag_fitting,
+                    tolerance=tolerance) for function, arguments, interval in active_tuples])
+            else:
+                violations = concatenate_vectors_from_list([self.linear_fit_from_batch_of_forms_arguments_intervals(
+                    batch, speed=speed, ratio_item_bag_fitting=ratio_item_bag_fitting, tolerance=tolerance)
+                    for batch in batches_from_list(active_tuples, batch_size)])
+            number_of_epochs += 1
+            previous_violations = last_violations[active_positions]
+            if adaptive_speed and np.isfinite(previous_violations).all():
+                # The progress is measured on the same tuples, whose violations were reduced or not.
+                if violations.sum() < previous_violations.sum():
+                    speed = min(max_speed, SPEED_INCREASE * speed)
+                elif violations.sum() > previous_violations.sum():
+                    speed *= SPEED_DECREASE
+            last_violations[active_positions] = violations
+            active_positions = [position for position, violation in zip(active_positions, violations)
+                                if violation > 0.]
+            are_all_tuples_checked = False
+            if len(active_positions) == 0:
+                # The tuples satisfied in former epochs may have been violated by the later updates.
+                last_violations = self.violations_from_forms_arguments_intervals(forms_arguments_intervals,
+                                                                                 tolerance)
+                are_all_tuples_checked = True
+                active_positions = support_from_vector(last_violations).tolist()
+        violations = last_violations
+        if not are_all_tuples_checked:
+            violations = self.violations_from_forms_arguments_intervals(forms_arguments_intervals, tolerance)
+        elapsed_time = time.perf_counter() - start_time
+        self.instrumentation.record('fit', elapsed_time)
+        return {'epochs': number_of_epochs,
+                'violated_claims': int(np.count_nonzero(violations)),
+                'max_violation': float(np.max(violations, initial=0.)),
+                'speed': speed,
+                'elapsed_time': elapsed_time}
+
+    def violations_from_forms_arguments_intervals(self, forms_arguments_intervals, tolerance=0.):
+        """ Return the vector of the violations of the tuples '(function, bag_arguments, interval)',
+        see 'violation_from_value_and_interval'. """
+        return make_vector([violation_from_value_and_interval(function(*(self(bags) for bags in bag_arguments)),
+                                                              interval, tolerance)
+                            for function, bag_arguments, interval in forms_arguments_intervals])
+
+    def linear_fit_from_batch_of_forms_arguments_intervals(self, forms_arguments_intervals, speed=1.,
+                                                           ratio_item_bag_fitting=0.5, tolerance=0.):
+        """ Compute, with matrix operations, the perturbations that 'linear_fit_from_form_arguments_interval'
+        would apply for each tuple of the batch from the current weights,
+        then apply their sum as a single multiplicative update.
+        Return the vector of the violations of the tuples before the update. """
+        item_perturbation = zero_vector_from_length(len(self.item_weights_vector))
+        bag_perturbation = zero_vector_from_length(len(self.bag_weights_vector))
+        violations = zero_vector_from_length(len(forms_arguments_intervals))
+        for function, positions in positions_by_form(forms_arguments_intervals):
+            arguments_intervals = [forms_arguments_intervals[position][1:] for position in positions]
+            with self.instrumentation.phase('gradient'):
+                item_batch_perturbation, bag_batch_perturbation, violations[positions] = \
+                    self.perturbations_from_form_and_batch(function, arguments_intervals, ratio_item_bag_fitting,
+                                                           tolerance)
+            item_perturbation += item_batch_perturbation
+            bag_perturbation += bag_batch_perturbation
+        self.update_item_weights_from_perturbation(item_perturbation, speed)
+        self.update_bag_weights_from_perturbation(bag_perturbation, speed)
+        return violations
+
+    def perturbations_from_form_and_batch(self, function, arguments_intervals, ratio_item_bag_fitting=0.5,
+                                          tolerance=0.):
+        """
+        :param function: form as in 'partial_gradients_from_form_on_vectorizations'.
+            If it has a method 'batch_values_and_partial_gradients', it is used to evaluate the form
+            and its partial gradients on the columns of the vectorization matrices at once.
+        :param arguments_intervals: list of pairs '(bag_arguments, target_interval)'
+        :return: triple of vectors '(item_perturbation, bag_perturbation, violations)': the sums over the batch
+            of the perturbations computed by 'vectors_to_reach_target_from_partial_gradients',
+            and the violations of the tuples, see 'violation_from_value_and_interval'.
+        """
+        arity = len(arguments_intervals[0][0])
+        bag_matrices = [self.bag_matrix_from_collections([arguments[position] for arguments, _ in arguments_intervals])
+                        for position in range(arity)]
+        vectorization_matrices = [self.vectorization_matrix_from_bag_matrix(bag_matrix) for bag_matrix in bag_matrices]
+        with self.instrumentation.phase('distance'):
+            if hasattr(function, 'batch_values_and_partial_gradients'):
+                values, function_partial_gradients = function.batch_values_and_partial_gradients(
+                    *vectorization_matrices)
+            else:
+                values, function_partial_gradients = batch_values_and_partial_gradients_from_form(
+                    function, vectorization_matrices, len(self.item_weights_vector))
+        targets = make_vector([closest_point_from_interval(value, interval)
+                               for value, (_, interval) in zip(values, arguments_intervals)])
+        item_gradients = sum(coefficient_wise_matrix_product(vectorization_matrix, function_partial_gradient)
+                             for vectorization_matrix, function_partial_gradient
+                             in zip(vectorization_matrices, function_partial_gradients))
+        bag_gradients = sum(self.bag_jacobian_dual_matrix(bag_matrix, function_partial_gradient)
+                            for bag_matrix, function_partial_gradient in zip(bag_matrices, function_partial_gradients))
+        item_coefficient, bag_coefficient = balance_coefficients_from_balances(
+            (ratio_item_bag_fitting, 1. - ratio_item_bag_fitting))
+        squared_norms = (item_coefficient * column_wise_scalar_products(item_gradients, item_gradients)
+                         + bag_coefficient * column_wise_scalar_products(bag_gradients, bag_gradients))
+        violations = violations_from_values_and_targets(values, targets, tolerance)
+        common_factors = coefficient_wise_vector_product(targets - values, inverse_zero_if_null(squared_norms))
+        common_factors[violations == 0.] = 0.
+        return (item_coefficient * matrix_vector_product(item_gradients, common_factors),
+                bag_coefficient * matrix_vector_product(bag_gradients, common_factors),
+                violations)
+
+    def bag_jacobian_dual_matrix(self, bag_matrix, projections):
+        """ Return the matrix whose column 'j' is the bag jacobian dual of 'partial_jacobian_duals_from_bags'
+        for the bag collection of indicator 'bag_matrix[:, j]', evaluated at 'projections[:, j]'. """
+        item_projections = rescale_matrix_rows(projections, self.item_weights_vector)
+        bag_projections = transpose_matrix_product_sparse(self.item_bag_matrix_by_columns, item_projections)
+        return rescale_matrix_rows(coefficient_wise_matrix_product(bag_matrix, bag_projections),
+                                   self.bag_weights_vector)
 
     def linear_fit_from_form_arguments_interval(self, function, bag_arguments, target_interval,
-                                                speed=1., ratio_item_bag_fitting=0.5):
-        current_value = function(*(self(bags) for bags in bag_arguments))
+                                                speed=1., ratio_item_bag_fitting=0.5, tolerance=0.):
+        """ The vectorizations of the arguments, the value of 'function' and its partial gradients
+        are computed once and shared with the computation of the gradients on the weights.
+        Return the violation of the tuple before the update, see 'violation_from_value_and_interval'. """
+        vectorizations = [self(bags) for bags in bag_arguments]
+        with self.instrumentation.phase('distance'):
+            current_value, function_partial_gradients = value_and_partial_gradients_from_form(function,
+                                                                                              vectorizations)
         target = closest_point_from_interval(current_value, target_interval)
-        if not np.isclose(current_value, target):
+        violation = violation_from_value_and_interval(current_value, target_interval, tolerance)
+        if violation > 0.:
             self.linear_fit_from_form_arguments_target(function, bag_arguments, target, speed=speed,
-                                                       ratio_item_bag_fitting=ratio_item_bag_fitting)
+                                                       ratio_item_bag_fitting=ratio_item_bag_fitting,
+                                                       vectorizations=vectorizations,
+                                                       current_function_value=current_value,
+                                                       function_partial_gradients=function_partial_gradients)
+        return violation
 
     def linear_fit_from_form_arguments_target(self, function, bag_arguments, target, speed=1.,
-                                              ratio_item_bag_fitting=0.5):
+                                              ratio_item_bag_fitting=0.5, vectorizations=None,
+                                              current_function_value=None, function_partial_gradients=None):
         """ 'speed' is the fraction of the straight-line distance to the target
-        traversed in one gradient descent step. """
-        item_and_bag_gradients = self.partial_gradients_from_form_on_vectorizations(function, bag_arguments)
-        current_function_value = function(*(self(bags) for bags in bag_arguments))
+        traversed in one gradient descent step.
+        'vectorizations', 'current_function_value' and 'function_partial_gradients'
+        are computed from 'bag_arguments' if not provided. """
+        if vectorizations is None:
+            vectorizations = [self(bags) for bags in bag_arguments]
+        if current_function_value is None or function_partial_gradients is None:
+            current_function_value, function_partial_gradients = value_and_partial_gradients_from_form(
+                function, vectorizations)
+        with self.instrumentation.phase('gradient'):
+            item_indices, item_gradient, bag_indices, bag_gradient = self.partial_gradients_on_supports(
+                bag_arguments, vectorizations, function_partial_gradients)
+        if is_zero_vector(item_gradient) and is_zero_vector(bag_gradient):
+            # No perturbation of the weights changes the value at first order, for example
+            # for the cosine distance between vectorizations of disjoint supports.
+            return
         item_bag_fitting_balance = (ratio_item_bag_fitting, 1. - ratio_item_bag_fitting)
         item_perturbation, bag_perturbation =\
-            vectors_to_reach_target_from_partial_gradients(item_and_bag_gradients,
+            vectors_to_reach_target_from_partial_gradients((item_gradient, bag_gradient),
                                                            item_bag_fitting_balance,
                                                            target - current_function_value)
-        self.update_item_weights_from_perturbation(item_perturbation, speed)
-        self.update_bag_weights_from_perturbation(bag_perturbation, speed)
+        self.rescale_item_weights(item_indices, rescale_vector_from_perturbation(item_perturbation, speed))
+        self.rescale_bag_weights(bag_indices, rescale_vector_from_perturbation(bag_perturbation, speed))
+
+    def partial_gradients_on_supports(self, bag_arguments, vectorizations, function_partial_gradients):
+        """ Return '(item_indices, item_gradient, bag_indices, bag_gradient)' where 'item_gradient' and 'bag_gradient'
+        are the restrictions of the partial gradients of 'self.partial_gradients_from_form_on_vectorizations'
+        to 'item_indices' and 'bag_indices', outside of which they vanish: the items of the vectorizations
+        and the bags of the collections. The cost depends on these supports, not on the numbers of items and bags. """
+        item_supports = [support_from_vector(vectorization) for vectorization in vectorizations]
+        item_indices = unique_from_index_array(concatenate_index_arrays(item_supports))
+        item_gradient = sum(coefficient_wise_vector_product(vectorization[item_indices], gradient[item_indices])
+                            for vectorization, gradient in zip(vectorizations, function_partial_gradients))
+        bag_supports = [self.bag_indices_from_collection(bags) for bags in bag_arguments]
+        bag_indices = unique_from_index_array(concatenate_index_arrays(bag_supports))
+        bag_gradient = zero_vector_from_length(len(bag_indices))
+        for bag_support, gradient in zip(bag_supports, function_partial_gradients):
+            item_projection = coefficient_wise_vector_product(self.item_weights_vector, gradient)
+            bag_projections = vector_matrix_product_on_columns(item_projection, self.item_bag_matrix_by_columns,
+                                                               bag_support)
+            bag_gradient[np.searchsorted(bag_indices, bag_support)] += coefficient_wise_vector_product(
+                self.bag_weights_vector[bag_support], bag_projections)
+        return item_indices, item_gradient, bag_indices, bag_gradient
 
-    def partial_gradients_from_form_on_vectorizations(self, function, bag_arguments):
+    def partial_gradients_from_form_on_vectorizations(self, function, bag_arguments, vectorizations=None,
+                                                      function_partial_gradients=None):
         """
         :param function: inputs several vectorizations and outputs a float.
             Has an attribute 'function.partial_gradients' that has the same input as 'function'
@@ -70,18 +256,25 @@ class FittingLinearVectorization(LinearVectorization):
             + scalar_product(item_partial_gradient, item_perturbation)
             + scalar_product(bag_partial_gradient, bag_perturbation)
             + O(norm(item_perturbation)**2) + norm(bag_perturbation)**2).
+        :param vectorizations: the vectorizations of 'bag_arguments', computed if not provided.
+        :param function_partial_gradients: the partial gradients of 'function' at 'vectorizations',
+            computed if not provided.
         """
-        bag_vectors = [self(bags) for bags in bag_arguments]
-        function_partial_gradients = [gradient(*bag_vectors) for gradient in function.partial_gradients]
-        matrix_of_partial_jacobian_duals = [self.partial_jacobian_duals_from_bags(bags) for bags in bag_arguments]
+        if vectorizations is None:
+            vectorizations = [self(bags) for bags in bag_arguments]
+        if function_partial_gradients is None:
+            _, function_partial_gradients = value_and_partial_gradients_from_form(function, vectorizations)
+        matrix_of_partial_jacobian_duals = [self.partial_jacobian_duals_from_bags(bags, vectorization=vectorization)
+                                            for bags, vectorization in zip(bag_arguments, vectorizations)]
         matrix_of_partial_jacobian_duals = transpose_from_list_matrix(matrix_of_partial_jacobian_duals)
         return [sum(partial_jacobian_duals[index](function_partial_gradients[index])
                     for index in range(len(function_partial_gradients)))
                 for partial_jacobian_duals in matrix_of_partial_jacobian_duals]
 
-    def partial_jacobian_duals_from_bags(self, bags):
+    def partial_jacobian_duals_from_bags(self, bags, vectorization=None):
         """
         :param bags: bag collection
+        :param vectorization: 'self(bags)', computed if not provided
         :return: pair of functions '(item_jacobian_dual, bag_jacobian_dual)'
 
         Consider the function 'f0' equal to 'self' (vectorization of a bag collection) for some values
@@ -96,34 +289,36 @@ class FittingLinearVectorization(LinearVectorization):
         'scalar_product(r, f1(bags)) = scalar_product(r, f0(bags)) + scalar_product(vi, item_perturbation)
                 + scalar_product(vb, bag_perturbation) + O(norm(item_perturbation)**2) + O(norm(bag_perturbation)**2)'.
         """
-        bag_vector = self.bag_vector_from_collection(bags)
-        vectorization = self(bags)
+        bag_indices = self.bag_indices_from_collection(bags)
+        if vectorization is None:
+            vectorization = self(bags)
 
         def item_jacobian_dual(projection):
             # return dot_matrix_dot_products(item_vector, self.item_bag_matrix, self.bag_weights_vector, vector)
             return coefficient_wise_vector_product(vectorization, projection)
 
         def bag_jacobian_dual(projection):
-            # return dot_matrix_dot_products(self.item_weights_vector,
-            #                                self.item_bag_matrix,
-            #                                bag_vector,
-            #                                vector)
-            return dot_dot_matrix_dot_products(bag_vector,
-                                               self.bag_weights_vector,
-                                               transpose_from_matrix(self.item_bag_matrix),
-                                               # TODO: optimize (avoid transpose)
-                                               self.item_weights_vector,
-                                               projection)
+            # Only the columns of the bags of 'bags' are read, from 'self.item_bag_matrix_by_columns'.
+            item_projection = coefficient_wise_vector_product(self.item_weights_vector, projection)
+            bag_projections = zero_vector_from_length(self.number_of_bag_indices())
+            bag_projections[bag_indices] = coefficient_wise_vector_product(
+                self.bag_weights_vector[bag_indices],
+                vector_matrix_product_on_columns(item_projection, self.item_bag_matrix_by_columns, bag_indices))
+            return bag_projections
 
         return item_jacobian_dual, bag_jacobian_dual
 
     def update_item_weights_from_perturbation(self, perturbation, speed=1.):
-        rescale_vector = rescale_vector_from_perturbation(perturbation, speed)
-        self.item_weights_vector = coefficient_wise_vector_product(rescale_vector, self.item_weights_vector)
+        """ Multiply the item weights by 'rescale_vector_from_perturbation(perturbation, speed)',
+        in place on the support of 'perturbation', where the factors differ from one. """
+        item_indices = support_from_vector(perturbation)
+        self.rescale_item_weights(item_indices, rescale_vector_from_perturbation_on_support(perturbation, item_indices,
+                                                                                           speed))
 
     def update_bag_weights_from_perturbation(self, perturbation, speed=1.):
-        rescale_vector = rescale_vector_from_perturbation(perturbation, speed)
-        self.bag_weights_vector = coefficient_wise_vector_product(rescale_vector, self.bag_weights_vector)
+        bag_indices = support_from_vector(perturbation)
+        self.rescale_bag_weights(bag_indices, rescale_vector_from_perturbation_on_support(perturbation, bag_indices,
+                                                                                         speed))
 
 
 def vectors_to_reach_target_from_partial_gradients(partial_gradients, balances, distance_to_target):
@@ -133,12 +328,76 @@ def vectors_to_reach_target_from_partial_gradients(partial_gradients, balances,
     :param distance_to_target: float 'd'
     :return: tuple of vectors '(v_0, ..., v_{n-1})' argmin of '{norm(sum_i b_i * v_i) | sum_i g_i^T * v_i = d}'
     """
-    coefficients = [prod(a for a in balances if a != b)**2 for b in balances]
+    coefficients = balance_coefficients_from_balances(balances)
     common_factor = distance_to_target / sum(coefficients[index] * norm_from_vector(partial_gradients[index])**2
                                              for index in range(len(partial_gradients)))
     return [common_factor * coefficients[index] * partial_gradients[index] for index in range(len(partial_gradients))]
 
 
+def balance_coefficients_from_balances(balances):
+    return [prod(a for a in balances if a != b)**2 for b in balances]
+
+
+def batch_values_and_partial_gradients_from_form(function, vectorization_matrices, length):
+    """ Evaluate 'function' and its partial gradients column by column,
+    for the forms that do not provide a method 'batch_values_and_partial_gradients'.
+    Only the support of each gradient is kept, so that the batch does not hold dense gradients. """
+    values = []
+    partial_gradient_supports = [[] for _ in vectorization_matrices]
+    partial_gradient_values = [[] for _ in vectorization_matrices]
+    for index in range(number_of_columns_from_matrix(vectorization_matrices[0])):
+        vectorizations = [column_from_matrix(matrix, index) for matrix in vectorization_matrices]
+        value, partial_gradients = value_and_partial_gradients_from_form(function, vectorizations)
+        values.append(value)
+        for supports, gradient_values, partial_gradient in zip(partial_gradient_supports, partial_gradient_values,
+                                                               partial_gradients):
+            support = support_from_vector(partial_gradient)
+            supports.append(support)
+            gradient_values.append(partial_gradient[support])
+    return make_vector(values), [matrix_from_column_entries(supports, gradient_values, length)
+                                 for supports, gradient_values in zip(partial_gradient_supports,
+                                                                      partial_gradient_values)]
+
+
+def value_and_partial_gradients_from_form(function, vectorizations):
+    """ Use the method 'value_and_gradients' of 'function' when available,
+    in order to share the computations common to the value and the partial gradients. """
+    if hasattr(function, 'value_and_gradients'):
+        return function.value_and_gradients(*vectorizations)
+    return function(*vectorizations), [gradient(*vectorizations) for gradient in function.partial_gradients]
+
+
+def positions_by_form(forms_arguments_intervals):
+    """ Return the list of pairs '(function, positions)' where 'positions' is the list of the positions
+    of the tuples '(function, arguments, interval)' of 'forms_arguments_intervals' with this function. """
+    form_to_positions = dict()
+    for position, (function, _, _) in enumerate(forms_arguments_intervals):
+        form_to_positions.setdefault(function, []).append(position)
+    return list(form_to_positions.items())
+
+
+def violation_from_value_and_interval(value, interval, tolerance=0.):
+    """ Return the distance from 'value' to 'interval', or zero if it is at most 'tolerance'
+    or if 'value' is close to the interval in the sense of 'np.isclose'. """
+    target = closest_point_from_interval(value, interval)
+    if np.isclose(value, target) or abs(target - value) <= tolerance:
+        return 0.
+    return abs(target - value)
+
+
+def violations_from_values_and_targets(values, targets, tolerance=0.) -> np.ndarray:
+    """ Vectorized 'violation_from_value_and_interval', where 'targets' are the closest points of the intervals. """
+    violations = np.abs(targets - values)
+    violations[np.isclose(values, targets) | (violations <= tolerance)] = 0.
+    return violations
+
+
+def batches_from_list(my_list, batch_size):
+    if batch_size < 1:
+        raise ValueError('Error in batches_from_list: batch_size must be positive.')
+    return [my_list[start:start + batch_size] for start in range(0, len(my_list), batch_size)]
+
+
 def rescale_vector_from_perturbation(perturbation, speed=1.):
     perturbation = rescale_vector_to_satisfy_lower_negative_bound(perturbation, -1.)
     perturbation = speed * perturbation
@@ -146,6 +405,12 @@ def rescale_vector_from_perturbation(perturbation, speed=1.):
     return one_vector + perturbation
 
 
+def rescale_vector_from_perturbation_on_support(perturbation, support, speed=1.):
+    """ Return the restriction of 'rescale_vector_from_perturbation(perturbation, speed)' to 'support',
+    which contains the negative coefficients of 'perturbation', hence the minimum when it is below -1. """
+    return rescale_vector_from_perturbation(perturbation[support], speed)
+
+
 def dot_dot_matrix_dot_products(v0, v1, m, v2, v3):
     v23 = coefficient_wise_vector_product(v2, v3)
     mv23 = matrix_vector_product(m, v23)
@@ -0,0 +1,70 @@
+# © 2020 Nokia
+# Licensed under the BSD 3-Clause License.
+# SPDX-License-Identifier: BSD-3-Clause
+# !/usr/bin/env python3
+# coding: utf-8
+# Author: Élie de Panafieu  <elie.de_panafieu@nokia-bell-labs.com>
+
+
+import zlib
+import numpy as np
+from matrix_operations import count_nonzero_entries_in_matrix_rows
+
+
+MAX_NUMBER_OF_BITS = 32
+
+
+class HashingIndexMap:
+    """ Replacement of the dictionary 'item_to_index' mapping each item to one of '2 ** number_of_bits' indices
+    by a hash of the item, so that no vocabulary is stored.
+    Every item has an index, and distinct items may share it: their weights are then shared too.
+    The hash is the CRC-32 of the encoded item, which does not depend on the Python process. """
+
+    def __init__(self, number_of_bits, seed=0):
+        if not 1 <= number_of_bits <= MAX_NUMBER_OF_BITS:
+            raise ValueError('Error in HashingIndexMap: number_of_bits must be between 1 and '
+                             + str(MAX_NUMBER_OF_BITS) + '.')
+        self.number_of_bits = number_of_bits
+        self.seed = seed
+        self.mask = (1 << number_of_bits) - 1
+
+    def __getitem__(self, item):
+        return zlib.crc32(bytes_from_item(item), self.seed) & self.mask
+
+    def get(self, item, default=None):
+        return self[item]
+
+    def __contains__(self, item):
+        return True
+
+    def __len__(self):
+        return 1 << self.number_of_bits
+
+    def items(self):
+        raise ValueError('Error in HashingIndexMap: the items are not stored.')
+
+    def collision_report(self, item_bag_matrix):
+        """ Return statistics on the collisions of the items of the rows of 'item_bag_matrix'.
+        The number of distinct items is estimated from the number of occupied indices by linear counting. """
+        number_of_indices = len(self)
+        occupied_indices = int(np.count_nonzero(count_nonzero_entries_in_matrix_rows(item_bag_matrix)))
+        estimated_items = float(estimated_number_of_items(occupied_indices, number_of_indices))
+        return {'number_of_indices': number_of_indices,
+                'occupied_indices': occupied_indices,
+                'load_factor': occupied_indices / number_of_indices,
+                'estimated_items': estimated_items,
+                'estimated_collision_rate': 1. - occupied_indices / estimated_items if estimated_items > 0 else 0.}
+
+
+def bytes_from_item(item) -> bytes:
+    if isinstance(item, str):
+        return item.encode('utf-8')
+    return repr(item).encode('utf-8')
+
+
+def estimated_number_of_items(occupied_indices, number_of_indices):
+    """ Return the expected number of items hashed uniformly into 'number_of_indices' indices
+    that occupy 'occupied_indices' of them. """
+    if occupied_indices >= number_of_indices:
+        return float('inf')
+    return -number_of_indices * np.log1p(-occupied_indices / number_of_indices)
@@ -6,37 +6,210 @@
 # Author: Élie de Panafieu  <elie.de_panafieu@nokia-bell-labs.com>
 
 
+from collections.abc import Collection
 from matrix_operations import *
+from memoization import Memoization
+from memory_size import deep_size_from_object
 from vectorization_of_bag_collections.vector_space import VectorSpace
 
 
+# Bytes of the memoized vectorizations, which are dense vectors as long as the vocabulary:
+# a vocabulary of a million items holds two of them.
+DEFAULT_CACHE_SIZE = 2**24
+# Marks the memoization keys of the collections given as arrays of bag indices,
+# which must not coincide with the keys of collections of bags.
+BAG_INDICES_KEY = object()
+
+
 class LinearVectorization(VectorSpace):
 
-    def __init__(self, bags, item_to_weight=None):
-        super().__init__(bags)
+    def __init__(self, bags, item_to_weight=None, cache_size=DEFAULT_CACHE_SIZE, bag_to_weight=None,
+                 item_to_index=None, item_bag_matrix=None, compact_bags=False,
+                 min_df=None, max_df=None, max_features=None, instrumentation=None, n_jobs=None):
+        """ The weights 'item_to_weight' and 'bag_to_weight' are either dictionaries or vectors
+        indexed like 'self.item_to_index' and 'self.bag_to_index'.
+        When 'bag_to_weight' is omitted, the weights are taken from 'bags' if it is a dictionary.
+        If any of 'min_df', 'max_df' and 'max_features' is provided, the items are first pruned
+        by 'VectorSpace.prune_items', and the pruned items have weight zero.
+        The vectorizations are memoized up to 'cache_size' bytes, see 'Memoization'.
+        See 'VectorSpace' for 'instrumentation' and 'n_jobs'. """
+        super().__init__(bags, item_to_index=item_to_index, item_bag_matrix=item_bag_matrix,
+                         compact_bags=compact_bags, instrumentation=instrumentation, n_jobs=n_jobs)
+        if min_df is not None or max_df is not None or max_features is not None:
+            self.prune_items(min_df, max_df, max_features)
+        # 'weights_version' is increased each time the weights change, which invalidates the memoized vectorizations.
+        self.weights_version = 0
+        self.memoization = Memoization(max_size=None, max_bytes=cache_size)
+        self.bag_norms_memoization = Memoization(1)
         #
         self.item_weights_vector = None
         if item_to_weight is None:
-            item_to_weight = self.tfidf_item_weights()
+            item_to_weight = self.tfidf_item_weights_vector()
         self.set_item_weights(item_to_weight)
         #
         self.bag_weights_vector = None
-        if isinstance(bags, dict):
-            bag_to_weight = bags
-        else:
-            bag_to_weight = {bag: 1 / len(bag) for bag in self.bag_to_index}
+        if bag_to_weight is None:
+            if isinstance(bags, dict):
+                bag_to_weight = bags
+            else:
+                bag_to_weight = {bag: 1 / len(bag) for bag in self.bag_to_index}
         self.set_bag_weights(bag_to_weight)
 
     def __call__(self, bags):
-        vector = self.bag_vector_from_collection(bags)
-        return dot_matrix_dot_products(self.item_weights_vector, self.item_bag_matrix,
-                                       self.bag_weights_vector, vector)
+        """ Return the vectorization of the collection 'bags', memoized until the next change of weights.
+        The returned vector is read-only, since it may be shared with subsequent calls.
+        'bags' may also be an array of bag indices, see 'VectorSpace.indices_from_bags'. """
+        if is_index_vector(bags):
+            key = (BAG_INDICES_KEY, frozenset(bags.tolist()))
+        else:
+            # 'bags' is read twice, for the key and for the vectorization, so an iterator is first listed.
+            if self.compact_bags:
+                bags = [self.bag_key(bag) for bag in bags]
+            elif not isinstance(bags, Collection):
+                bags = list(bags)
+            key = frozenset(bags)
+        vectorization = self.memoization.get(key, self.weights_version)
+        if vectorization is None:
+            vectorization = make_read_only(self.vectorization_from_collection(bags))
+            self.memoization.set(key, self.weights_version, vectorization)
+        return vectorization
+
+    def vectorization_from_collection(self, bags):
+        """ Only the columns of the bags of 'bags' are read, from 'self.item_bag_matrix_by_columns'. """
+        with self.instrumentation.phase('vectorize'):
+            bag_indices = self.bag_indices_from_collection(bags)
+            item_vector = matrix_vector_product_on_columns(self.item_bag_matrix_by_columns, bag_indices,
+                                                           self.bag_weights_vector[bag_indices])
+            return coefficient_wise_vector_product(self.item_weights_vector, item_vector)
+
+    def bag_norms_vector(self):
+        """ Return the vector of the norms of the vectorizations of the single bags,
+        memoized until the next change of weights. """
+        bag_norms = self.bag_norms_memoization.get(None, self.weights_version)
+        if bag_norms is None:
+            item_bag_matrix = rescale_matrix_rows(self.item_bag_matrix, self.item_weights_vector)
+            bag_norms = coefficient_wise_vector_product(column_norms_from_matrix(item_bag_matrix),
+                                                        self.bag_weights_vector)
+            self.bag_norms_memoization.set(None, self.weights_version, bag_norms)
+        return bag_norms
+
+    def cosine_similarities_to_bags(self, vectorization):
+        """ Return '(bag_indices, similarities)' where 'similarities[k]' is the cosine similarity
+        between 'vectorization' and the vectorization of the bag of index 'bag_indices[k]'.
+        The rows of 'self.item_bag_matrix' are used as an inverted index:
+        only the bags sharing an item of nonzero weight with 'vectorization' are scored,
+        the similarity with the other bags being zero. """
+        item_vector = coefficient_wise_vector_product(vectorization, self.item_weights_vector)
+        bag_indices, scalar_products = vector_matrix_product_on_rows(item_vector, self.item_bag_matrix,
+                                                                     support_from_vector(item_vector))
+        norms = norm_from_vector(vectorization) * self.bag_norms_vector()[bag_indices]
+        scalar_products = coefficient_wise_vector_product(scalar_products, self.bag_weights_vector[bag_indices])
+        return bag_indices, coefficient_wise_vector_product(scalar_products, inverse_zero_if_null(norms))
+
+    @property
+    def item_weights_vector(self):
+        return self._item_weights_vector
+
+    @item_weights_vector.setter
+    def item_weights_vector(self, vector):
+        self._item_weights_vector = vector
+        # The vector may be shared with the caller or memory-mapped, so that it is copied before the first
+        # modification in place by 'self.rescale_item_weights'.
+        self._item_weights_vector_is_private = False
+        self.weights_version += 1
+
+    @property
+    def bag_weights_vector(self):
+        return self._bag_weights_vector
+
+    @bag_weights_vector.setter
+    def bag_weights_vector(self, vector):
+        self._bag_weights_vector = vector
+        self._bag_weights_vector_is_private = False
+        self.weights_version += 1
+
+    def rescale_item_weights(self, item_indices, factors):
+        """ Multiply in place the weights of the items of indices 'item_indices' by 'factors'. """
+        with self.instrumentation.phase('weight_update'):
+            if not self._item_weights_vector_is_private:
+                self._item_weights_vector = copy_vector(self._item_weights_vector)
+                self._item_weights_vector_is_private = True
+            self._item_weights_vector[item_indices] *= factors
+        self.weights_version += 1
+
+    def rescale_bag_weights(self, bag_indices, factors):
+        """ Multiply in place the weights of the bags of indices 'bag_indices' by 'factors'. """
+        with self.instrumentation.phase('weight_update'):
+            if not self._bag_weights_vector_is_private:
+                self._bag_weights_vector = copy_vector(self._bag_weights_vector)
+                self._bag_weights_vector_is_private = True
+            self._bag_weights_vector[bag_indices] *= factors
+        self.weights_version += 1
+
+    def add_bags(self, bags, bag_to_weight=None, item_bag_matrix=None):
+        """ Add the new bags of 'bags', see 'VectorSpace.add_bags', keeping the weights of the former items and bags.
+        The new items, and the items contained in no former bag, such as the buckets of 'HashingIndexMap'
+        filled for the first time, get their tf-idf weights in the extended collection. The weights of the new bags
+        are given by 'bag_to_weight', either a dictionary or a vector indexed like the new bags,
+        and by default by 'bags' if it is a dictionary, or are the inverses of the lengths of the bags. """
+        is_new_item = self.count_bags_containing_items() == 0
+        bag_indices = super().add_bags(bags, item_bag_matrix=item_bag_matrix)
+        is_new_item = np.concatenate([is_new_item, np.ones(len(self.item_to_index) - len(is_new_item), dtype=bool)])
+        number_of_new_items = len(is_new_item) - len(self.item_weights_vector)
+        item_weights_vector = concatenate_vectors(self.item_weights_vector, zero_vector_from_length(number_of_new_items))
+        item_weights_vector[is_new_item] = self.tfidf_item_weights_vector()[is_new_item]
+        self.item_weights_vector = item_weights_vector
+        new_bags = [self.bag_from_index(bag_index) for bag_index in bag_indices]
+        if bag_to_weight is None:
+            bag_to_weight = bags if isinstance(bags, dict) else {bag: 1 / len(bag) for bag in new_bags}
+        if is_vector(bag_to_weight):
+            new_bag_weights = vector_of_length(bag_to_weight, len(new_bags))
+        else:
+            bag_to_weight = {self.bag_key(bag): weight for bag, weight in bag_to_weight.items()}
+            new_bag_weights = make_vector([bag_to_weight.get(bag, 0.) for bag in new_bags])
+        self.bag_weights_vector = concatenate_vectors(self.bag_weights_vector, new_bag_weights)
+        return bag_indices
+
+    def mark_bags_as_removed(self, bags):
+        bag_indices = super().mark_bags_as_removed(bags)
+        bag_weights_vector = self.bag_weights_vector.copy()
+        bag_weights_vector[bag_indices] = 0.
+        self.bag_weights_vector = bag_weights_vector
+        return bag_indices
+
+    def compact(self):
+        old_to_new_index = super().compact()
+        self.bag_weights_vector = self.bag_weights_vector[old_to_new_index >= 0]
+        return old_to_new_index
+
+    def memory_by_structure(self, seen):
+        structures = super().memory_by_structure(seen)
+        structures['item_weights_vector'] = deep_size_from_object(self.item_weights_vector, seen)
+        structures['bag_weights_vector'] = deep_size_from_object(self.bag_weights_vector, seen)
+        structures['memoization'] = deep_size_from_object(self.memoization, seen)
+        structures['bag_norms_memoization'] = deep_size_from_object(self.bag_norms_memoization, seen)
+        return structures
+
+    def vectorization_matrix_from_collections(self, bag_collections):
+        """ Return the sparse matrix whose column 'j' is 'self(bag_collections[j])'. """
+        return self.vectorization_matrix_from_bag_matrix(self.bag_matrix_from_collections(bag_collections))
+
+    def vectorization_matrix_from_bag_matrix(self, bag_matrix):
+        with self.instrumentation.phase('vectorize'):
+            bag_matrix = rescale_matrix_rows(bag_matrix, self.bag_weights_vector)
+            return rescale_matrix_rows(matrix_product(self.item_bag_matrix, bag_matrix), self.item_weights_vector)
 
     def set_item_weights(self, item_to_weight):
-        self.item_weights_vector = self.item_vector_from_dict(item_to_weight)
+        if is_vector(item_to_weight):
+            self.item_weights_vector = vector_of_length(item_to_weight, len(self.item_to_index))
+        else:
+            self.item_weights_vector = self.item_vector_from_dict(item_to_weight)
 
     def set_bag_weights(self, bag_to_weight):
-        self.bag_weights_vector = self.bag_vector_from_dict(bag_to_weight)
+        if is_vector(bag_to_weight):
+            self.bag_weights_vector = vector_of_length(bag_to_weight, self.number_of_bag_indices())
+        else:
+            self.bag_weights_vector = self.bag_vector_from_dict(bag_to_weight)
 
     def get_item_weights(self):
         return self.item_dict_from_vector(self.item_weights_vector)
@@ -45,11 +218,20 @@ class LinearVectorization(VectorSpace):
         return self.bag_dict_from_vector(self.bag_weights_vector)
 
     def tfidf_item_weights(self):
-        number_of_bags = len(self.bag_to_index)
-        # Use of log_of_ratio_zero_if_null_denominator to handle the case
-        # where the only bag containing an item has been removed (operation currently not supported).
-        return {item: log_of_ratio_zero_if_null_denominator(number_of_bags, self.count_bags_containing_item(item))
-                for item in self.item_to_index}
+        return self.item_dict_from_vector(self.tfidf_item_weights_vector())
+
+    def tfidf_item_weights_vector(self):
+        with self.instrumentation.phase('tfidf'):
+            number_of_bags = len(self.bag_to_index)
+            # Use of log_of_ratios_zero_if_null_denominators to handle the case
+            # where the only bag containing an item has been removed.
+            return log_of_ratios_zero_if_null_denominators(number_of_bags, self.count_bags_containing_items())
+
+
+def vector_of_length(vector, length):
+    if len(vector) != length:
+        raise ValueError('Error in vector_of_length: expected a vector of length ' + str(length) + '.')
+    return vector
 
 
 def log_of_ratio_zero_if_null_denominator(numerator, denominator):
@@ -0,0 +1,74 @@
+# © 2020 Nokia
+# Licensed under the BSD 3-Clause License.
+# SPDX-License-Identifier: BSD-3-Clause
+# !/usr/bin/env python3
+# coding: utf-8
+# Author: Élie de Panafieu  <elie.de_panafieu@nokia-bell-labs.com>
+
+
+from matrix_operations import *
+
+
+class MatrixStore:
+    """ Sparse matrix kept both in the compressed sparse row format 'self.rows', that reads rows quickly,
+    and in the compressed sparse column format 'self.columns', that reads columns quickly.
+    The column format is built on its first use, then updated along with the row format.
+    The appended columns are buffered in 'self.pending_matrices' and merged into both formats when one is read,
+    so that a merge copies the whole matrix once for any number of consecutive appends. """
+
+    def __init__(self, matrix, column_matrix=None):
+        """ 'column_matrix' is 'matrix' in the compressed sparse column format, computed on first use if omitted. """
+        self.merged_rows = csr_matrix(matrix)
+        self.column_format = column_matrix
+        self.pending_matrices = []
+        self.number_of_rows, self.number_of_columns = self.merged_rows.shape
+
+    @property
+    def rows(self) -> csr_matrix:
+        self.merge_pending_matrices()
+        return self.merged_rows
+
+    @property
+    def columns(self) -> csc_matrix:
+        self.merge_pending_matrices()
+        if self.column_format is None:
+            self.column_format = column_matrix_from_matrix(self.merged_rows)
+        return self.column_format
+
+    @property
+    def shape(self):
+        return self.number_of_rows, self.number_of_columns
+
+    def append_columns(self, matrix):
+        """ Append the columns of 'matrix', completing the store with zero rows if 'matrix' has more rows.
+        This costs the size of 'matrix' only: the copy of the whole store is deferred to the next read. """
+        self.pending_matrices.append(matrix)
+        self.number_of_rows = max(self.number_of_rows, matrix.shape[0])
+        self.number_of_columns += matrix.shape[1]
+
+    def merge_pending_matrices(self):
+        """ Concatenate the appended columns to both formats, in time proportional to the number of nonzero entries
+        of the whole matrix. """
+        if len(self.pending_matrices) == 0:
+            return
+        pending_matrices = [matrix_with_number_of_rows(matrix, self.number_of_rows) for matrix in self.pending_matrices]
+        self.merged_rows = concatenate_matrix_columns(
+            matrix_with_number_of_rows(self.merged_rows, self.number_of_rows), *pending_matrices)
+        if self.column_format is not None:
+            self.column_format = concatenate_matrix_columns(
+                matrix_with_number_of_rows(self.column_format, self.number_of_rows), *pending_matrices)
+        self.pending_matrices = []
+
+    def select_rows(self, row_indices):
+        self.merge_pending_matrices()
+        self.merged_rows = self.merged_rows[row_indices]
+        if self.column_format is not None:
+            self.column_format = self.column_format[row_indices]
+        self.number_of_rows, self.number_of_columns = self.merged_rows.shape
+
+    def select_columns(self, column_indices):
+        self.merge_pending_matrices()
+        self.merged_rows = self.merged_rows[:, column_indices]
+        if self.column_format is not None:
+            self.column_format = self.column_format[:, column_indices]
+        self.number_of_rows, self.number_of_columns = self.merged_rows.shape
@@ -0,0 +1,126 @@
+# © 2020 Nokia
+# Licensed under the BSD 3-Clause License.
+# SPDX-License-Identifier: BSD-3-Clause
+# !/usr/bin/env python3
+# coding: utf-8
+# Author: Élie de Panafieu  <elie.de_panafieu@nokia-bell-labs.com>
+
+
+import numpy as np
+from matrix_operations import *
+
+
+DEFAULT_RECALL = 0.9
+DEFAULT_NUMBER_OF_BITS = 12
+DEFAULT_SIMILARITY = 0.8
+MAX_NUMBER_OF_BITS = 32
+
+
+class RandomProjectionIndex:
+    """ Approximate index of the vectorizations of the single bags of a 'LinearVectorization'
+    for the cosine similarity, by signed random projections.
+    Each of the 'number_of_tables' hash tables maps a bag to the signs of 'number_of_bits' random projections
+    of its vectorization. A query scores exactly the bags sharing a bucket with it in at least one table.
+    The projections are pseudo-random signs derived from the seed, so that they are never stored. """
+
+    def __init__(self, vectorize, recall=DEFAULT_RECALL, number_of_bits=DEFAULT_NUMBER_OF_BITS,
+                 similarity=DEFAULT_SIMILARITY, number_of_tables=None, seed=0):
+        """ Unless 'number_of_tables' is given, it is the smallest one such that a bag whose cosine similarity
+        with the query is at least 'similarity' is a candidate with probability at least 'recall'. """
+        if not 1 <= number_of_bits <= MAX_NUMBER_OF_BITS:
+            raise ValueError('Error in RandomProjectionIndex: number_of_bits must be between 1 and '
+                             + str(MAX_NUMBER_OF_BITS) + '.')
+        if number_of_tables is None:
+            number_of_tables = number_of_tables_from_recall(recall, number_of_bits, similarity)
+        self.vectorize = vectorize
+        self.number_of_bits = number_of_bits
+        self.number_of_tables = number_of_tables
+        self.seed = seed
+        self.bag_item_matrix = None
+        self.weights_version = None
+        self.sorted_codes = None
+        self.sorted_bag_indices = None
+        self.rebuild()
+
+    def rebuild(self):
+        """ Hash the vectorizations of all the bags with the current weights. """
+        # The transpose of the column format is the row format of the bag-item matrix, without copy.
+        self.bag_item_matrix = transpose_from_matrix(self.vectorize.item_bag_matrix_by_columns)
+        number_of_bags = self.bag_item_matrix.shape[0]
+        self.sorted_codes = np.empty((self.number_of_tables, number_of_bags), dtype=np.uint32)
+        self.sorted_bag_indices = np.empty((self.number_of_tables, number_of_bags), dtype=INDEX_TYPE)
+        item_indices = np.arange(self.bag_item_matrix.shape[1])
+        item_weights = self.vectorize.item_weights_vector.astype(np.float32)
+        for table in range(self.number_of_tables):
+            projections = random_signs(item_indices, self.bit_indices_from_table(table), self.seed)
+            projections *= item_weights[:, np.newaxis]
+            codes = codes_from_projections(self.bag_item_matrix @ projections)
+            self.sorted_bag_indices[table] = np.argsort(codes, kind='stable')
+            self.sorted_codes[table] = codes[self.sorted_bag_indices[table]]
+        self.weights_version = self.vectorize.weights_version
+
+    def refresh(self):
+        """ Rebuild the index if the weights of 'self.vectorize' changed since the last build,
+        for example after a call to 'fit' or after adding or removing bags. """
+        if self.weights_version != self.vectorize.weights_version:
+            self.rebuild()
+
+    def candidates_from_vectorization(self, vectorization):
+        """ Return the sorted array of the indices of the bags sharing a bucket with 'vectorization'. """
+        support = support_from_vector(vectorization)
+        all_bit_indices = np.arange(self.number_of_tables * self.number_of_bits)
+        projections = vectorization[support].astype(np.float32) @ random_signs(support, all_bit_indices, self.seed)
+        codes = codes_from_projections(projections.reshape(self.number_of_tables, self.number_of_bits))
+        buckets = []
+        for table, code in enumerate(codes):
+            start = np.searchsorted(self.sorted_codes[table], code, side='left')
+            end = np.searchsorted(self.sorted_codes[table], code, side='right')
+            buckets.append(self.sorted_bag_indices[table, start:end])
+        return np.unique(concatenate_index_arrays(buckets))
+
+    def cosine_similarities_to_bags(self, vectorization):
+        """ Return '(bag_indices, similarities)' as 'LinearVectorization.cosine_similarities_to_bags',
+        restricted to the candidates of 'vectorization'. """
+        bag_indices = self.candidates_from_vectorization(vectorization)
+        item_vector = coefficient_wise_vector_product(vectorization, self.vectorize.item_weights_vector)
+        scalar_products = matrix_vector_product(self.bag_item_matrix[bag_indices], item_vector)
+        scalar_products = coefficient_wise_vector_product(scalar_products,
+                                                          self.vectorize.bag_weights_vector[bag_indices])
+        norms = norm_from_vector(vectorization) * self.vectorize.bag_norms_vector()[bag_indices]
+        return bag_indices, coefficient_wise_vector_product(scalar_products, inverse_zero_if_null(norms))
+
+    def bit_indices_from_table(self, table):
+        return np.arange(table * self.number_of_bits, (table + 1) * self.number_of_bits)
+
+
+def number_of_tables_from_recall(recall, number_of_bits, similarity):
+    """ Two vectors of cosine similarity 'similarity' have the same sign on a random projection
+    with probability '1 - arccos(similarity) / pi', hence share a bucket in one of 'number_of_tables' tables
+    with probability '1 - (1 - probability ** number_of_bits) ** number_of_tables'. """
+    if not 0. < recall < 1.:
+        raise ValueError('Error in number_of_tables_from_recall: recall must be in the open interval (0, 1).')
+    bucket_probability = (1. - np.arccos(np.clip(similarity, -1., 1.)) / np.pi) ** number_of_bits
+    if bucket_probability >= 1.:
+        return 1
+    return max(1, int(np.ceil(np.log(1. - recall) / np.log(1. - bucket_probability))))
+
+
+def random_signs(row_indices, column_indices, seed) -> np.ndarray:
+    """ Return the float32 matrix of pseudo-random signs of coefficients '(row_indices[i], column_indices[j])',
+    obtained by hashing the indices and the seed with the 'splitmix64' finalizer. """
+    with np.errstate(over='ignore'):
+        hashes = (np.asarray(row_indices, dtype=np.uint64)[:, np.newaxis] * np.uint64(0x9E3779B97F4A7C15)
+                  + np.asarray(column_indices, dtype=np.uint64)[np.newaxis, :] * np.uint64(0xD1B54A32D192ED03)
+                  + np.uint64(seed))
+        hashes ^= hashes >> np.uint64(30)
+        hashes *= np.uint64(0xBF58476D1CE4E5B9)
+        hashes ^= hashes >> np.uint64(27)
+        hashes *= np.uint64(0x94D049BB133111EB)
+        hashes ^= hashes >> np.uint64(31)
+    return 1. - 2. * (hashes >> np.uint64(63)).astype(np.float32)
+
+
+def codes_from_projections(projections) -> np.ndarray:
+    """ Return the integers whose bits are the signs of the rows of 'projections'. """
+    powers = np.left_shift(np.uint32(1), np.arange(projections.shape[-1], dtype=np.uint32))
+    return ((projections > 0) * powers).sum(axis=-1, dtype=np.uint32)
@@ -6,22 +6,217 @@
 # Author: Élie de Panafieu  <elie.de_panafieu@nokia-bell-labs.com>
 
 
+from collections.abc import Sequence
 from matrix_operations import *
+from instrumentation import Instrumentation
+from sharding import DEFAULT_SHARD_SIZE, map_shards_of_iterable
+from memory_size import deep_size_from_object, projected_memory_report
+from vectorization_of_bag_collections.bag import compact_bag_from_items
+from vectorization_of_bag_collections.matrix_store import MatrixStore
+
+
+# The bags are only compacted on demand by default, so that their indices stay valid, see 'VectorSpace.remove_bags'.
+DEFAULT_COMPACTION_RATIO = None
 
 
 class VectorSpace:
 
-    def __init__(self, bags):
-        self.item_to_index = map_to_index_from_iterable(union_from_iterables(bags))
-        self.bag_to_index = map_to_index_from_iterable(bags)
-        self.item_bag_matrix = matrix_from_bags_and_index_maps(
-            bags, self.item_to_index, self.bag_to_index)
+    def __init__(self, bags, item_to_index=None, item_bag_matrix=None, compact_bags=False, instrumentation=None,
+                 n_jobs=None):
+        """ 'item_to_index' and 'item_bag_matrix' are computed from 'bags' unless provided,
+        for example when restoring a saved model. If neither is provided and the bags are not compact,
+        they are computed in 'n_jobs' processes, see 'item_and_bag_indices_and_matrix_from_bags'.
+        If 'compact_bags' is True, the bags are stored as instances of 'Bag',
+        and the bags given to the methods are converted by 'self.bag_key'.
+        The phases are timed by 'instrumentation', by default a disabled 'Instrumentation'. """
+        self.instrumentation = Instrumentation() if instrumentation is None else instrumentation
+        with self.instrumentation.phase('matrix_build'):
+            self.bag_to_index = None
+            if item_to_index is None and item_bag_matrix is None and not compact_bags:
+                item_to_index, self.bag_to_index, item_bag_matrix = \
+                    item_and_bag_indices_and_matrix_from_bags(bags, n_jobs)
+            elif item_to_index is None:
+                item_to_index = map_to_index_from_iterable(union_from_iterables(bags))
+            self.item_to_index = item_to_index
+            self.compact_bags = compact_bags
+            if compact_bags:
+                bags = [self.bag_key(bag) for bag in bags]
+            if self.bag_to_index is None:
+                self.bag_to_index = map_to_index_from_iterable(bags)
+            if item_bag_matrix is None and compact_bags:
+                bags = list_from_index_map(self.bag_to_index)
+                item_bag_matrix = matrix_from_column_entries([bag.item_indices for bag in bags],
+                                                             [bag.counts for bag in bags], len(self.item_to_index))
+            elif item_bag_matrix is None:
+                item_bag_matrix = matrix_from_bags_and_index_maps(bags, self.item_to_index, self.bag_to_index)
+            elif item_bag_matrix.get_shape() != (len(self.item_to_index), len(self.bag_to_index)):
+                raise ValueError('Error in VectorSpace: the shape of item_bag_matrix does not match the index maps.')
+            self.item_bag_matrix = item_bag_matrix
+        self.index_to_bag = None
+        # The columns of the removed bags are kept until the next compaction.
+        self.bag_is_removed = np.zeros(len(self.bag_to_index), dtype=bool)
+        self.compaction_ratio = DEFAULT_COMPACTION_RATIO
+        # Once the items are pruned, the added bags only count the kept items, see 'self.prune_items'.
+        self.is_pruned = False
+
+    @property
+    def item_bag_matrix(self):
+        """ The item-bag matrix in the compressed sparse row format, that reads the bags containing an item. """
+        return self.item_bag_matrix_store.rows
+
+    @item_bag_matrix.setter
+    def item_bag_matrix(self, matrix):
+        self.item_bag_matrix_store = MatrixStore(matrix)
+
+    @property
+    def item_bag_matrix_by_columns(self):
+        """ The item-bag matrix in the compressed sparse column format, that reads the items of a bag. """
+        return self.item_bag_matrix_store.columns
+
+    def number_of_bag_indices(self):
+        """ Return the number of columns of 'self.item_bag_matrix', including the removed bags. """
+        return self.item_bag_matrix_store.shape[1]
+
+    def add_bags(self, bags, item_bag_matrix=None):
+        """ Add the bags of 'bags' that do not belong to 'self.bag_to_index' and return the array of their indices.
+        The new items get indices after the existing ones. If 'item_bag_matrix' is provided,
+        it is the matrix of the bags, which must then all be new, indexed like the extended 'self.item_to_index'.
+        If the items were pruned, the items absent from 'self.item_to_index' are ignored instead. """
+        bags = list(bags)
+        if item_bag_matrix is None:
+            if not self.is_pruned:
+                extend_map_to_index(self.item_to_index, union_from_iterables(bags))
+            bags = list(dict.fromkeys(bag for bag in map(self.bag_key, bags) if bag not in self.bag_to_index))
+            bag_to_new_index = map_to_index_from_iterable(bags)
+            if self.compact_bags:
+                item_bag_matrix = matrix_from_column_entries([bag.item_indices for bag in bags],
+                                                             [bag.counts for bag in bags], len(self.item_to_index))
+            elif self.is_pruned:
+                item_bag_matrix = matrix_from_bags_on_known_items(bags, self.item_to_index)
+            else:
+                item_bag_matrix = matrix_from_bags_and_index_maps(bags, self.item_to_index, bag_to_new_index)
+        else:
+            bags = [self.bag_key(bag) for bag in bags]
+        first_index = self.number_of_bag_indices()
+        extend_map_to_index(self.bag_to_index, bags)
+        self.item_bag_matrix_store.append_columns(matrix_with_number_of_rows(item_bag_matrix, len(self.item_to_index)))
+        self.bag_is_removed = np.concatenate([self.bag_is_removed, np.zeros(len(bags), dtype=bool)])
+        self.index_to_bag = None
+        return np.arange(first_index, self.number_of_bag_indices(), dtype=INDEX_TYPE)
+
+    def remove_bags(self, bags):
+        """ Remove the bags of 'bags'. If 'self.compaction_ratio' is not None and the removed bags are more than
+        this proportion of them, the columns are then compacted, which renumbers the bags, and the array
+        mapping the former indices to the new ones is returned, see 'self.compact'. Otherwise, return None. """
+        self.mark_bags_as_removed(bags)
+        if self.compaction_ratio is None or \
+                np.count_nonzero(self.bag_is_removed) <= self.compaction_ratio * self.number_of_bag_indices():
+            return None
+        return self.compact()
+
+    def alive_bag_indices(self):
+        """ Return the sorted array of the indices of the bags that are not removed. """
+        return np.flatnonzero(~self.bag_is_removed)
+
+    def mark_bags_as_removed(self, bags):
+        """ Remove 'bags' from 'self.bag_to_index' and return the array of their indices,
+        whose columns are kept in 'self.item_bag_matrix' until the next compaction. """
+        bag_indices = make_index_vector([self.bag_to_index.pop(bag) for bag in dict.fromkeys(map(self.bag_key, bags))])
+        self.bag_is_removed[bag_indices] = True
+        self.index_to_bag = None
+        return bag_indices
+
+    def compact(self):
+        """ Drop the columns of the removed bags and renumber the remaining ones, which invalidates the arrays
+        of bag indices obtained before. Return the array mapping each former index to the new one, or to -1. """
+        kept_indices = self.alive_bag_indices()
+        old_to_new_index = self.compaction_map()
+        self.item_bag_matrix_store.select_columns(kept_indices)
+        self.bag_to_index = {bag: int(old_to_new_index[index]) for bag, index in self.bag_to_index.items()}
+        self.bag_is_removed = np.zeros(len(kept_indices), dtype=bool)
+        self.index_to_bag = None
+        return old_to_new_index
+
+    def compaction_map(self):
+        """ Return the array mapping each bag index to its index after 'self.compact', or to -1 for the removed bags,
+        without compacting. """
+        kept_indices = self.alive_bag_indices()
+        old_to_new_index = np.full(self.number_of_bag_indices(), -1, dtype=INDEX_TYPE)
+        old_to_new_index[kept_indices] = np.arange(len(kept_indices))
+        return old_to_new_index
+
+    def prune_items(self, min_df=None, max_df=None, max_features=None):
+        """ Drop the items contained in fewer than 'min_df' bags or in more than 'max_df' bags,
+        then keep only the 'max_features' items contained in the most bags, and renumber the remaining items.
+        'min_df' and 'max_df' are numbers of bags if they are integers, and proportions of the bags if they are floats.
+        The dropped items are then absent from 'self.item_to_index', as items absent from all the bags,
+        and the bags added later only count the kept items, see 'self.add_bags'.
+        The matrix is built before being pruned, so that the pruning reduces the memory of the model,
+        but not its peak during the construction. """
+        if not isinstance(self.item_to_index, dict):
+            raise ValueError('Error in prune_items: the items must be indexed by a dictionary.')
+        if self.compact_bags:
+            raise ValueError('Error in prune_items: the compact bags are defined by the indices of their items.')
+        kept_indices = kept_item_indices_from_document_frequencies(self.count_bags_containing_items(),
+                                                                   len(self.bag_to_index), min_df, max_df, max_features)
+        old_to_new_index = np.full(len(self.item_to_index), -1, dtype=INDEX_TYPE)
+        old_to_new_index[kept_indices] = np.arange(len(kept_indices))
+        old_to_new_index = old_to_new_index.tolist()
+        self.item_to_index = {item: old_to_new_index[index] for item, index in self.item_to_index.items()
+                              if old_to_new_index[index] >= 0}
+        self.item_bag_matrix_store.select_rows(kept_indices)
+        self.is_pruned = True
+
+    def memory_report(self, number_of_new_bags=0):
+        """ Return the bytes held by each structure, and their total projected after adding 'number_of_new_bags'
+        bags, see 'projected_memory_report'. The new items per new bag are estimated by the proportion of items
+        contained in a single bag, following Good and Turing. """
+        return projected_memory_report(self.memory_by_structure(set()), len(self.bag_to_index), len(self.item_to_index),
+                                       self.new_items_per_bag(), number_of_new_bags)
+
+    def memory_by_structure(self, seen):
+        """ Return the dictionary mapping the name of each structure to its bytes, see 'deep_size_from_object'. """
+        return {'item_to_index': deep_size_from_object(self.item_to_index, seen),
+                'bag_to_index': deep_size_from_object(self.bag_to_index, seen),
+                'index_to_bag': deep_size_from_object(self.index_to_bag, seen),
+                'item_bag_matrix': deep_size_from_object(self.item_bag_matrix_store.rows, seen),
+                'item_bag_matrix_by_columns': deep_size_from_object(self.item_bag_matrix_store.column_format, seen),
+                'bag_is_removed': deep_size_from_object(self.bag_is_removed, seen)}
+
+    def new_items_per_bag(self):
+        """ Return the expected number of items of a new bag absent from the former bags, estimated by the number
+        of items contained in a single bag divided by the number of bags, or zero if the items are hashed. """
+        if not isinstance(self.item_to_index, dict) or len(self.bag_to_index) == 0:
+            return 0.
+        return np.count_nonzero(self.count_bags_containing_items() == 1) / len(self.bag_to_index)
+
+    def bag_key(self, bag):
+        """ Return the key of 'bag' in 'self.bag_to_index', that is 'bag' itself unless the bags are compact. """
+        if self.compact_bags:
+            return compact_bag_from_items(bag, self.item_to_index)
+        return bag
 
     def item_vector_from_dict(self, item_distribution):
         return vector_from_index_and_value_maps(self.item_to_index, item_distribution)
 
     def bag_vector_from_dict(self, distribution_on_bags):
-        return vector_from_index_and_value_maps(self.bag_to_index, distribution_on_bags)
+        if self.compact_bags:
+            distribution_on_bags = {self.bag_key(bag): value for bag, value in distribution_on_bags.items()}
+        return vector_from_index_and_value_maps(self.bag_to_index, distribution_on_bags, self.number_of_bag_indices())
+
+    def items_from_indices(self):
+        """ Return the list of items sorted by index. """
+        return list_from_index_map(self.item_to_index)
+
+    def bags_from_indices(self):
+        """ Return the list of bags sorted by index, with None at the indices of the removed bags. """
+        return list_from_index_map(self.bag_to_index, self.number_of_bag_indices())
+
+    def bag_from_index(self, bag_index):
+        """ Return the bag of index 'bag_index', from the list 'self.bags_from_indices()' computed once. """
+        if self.index_to_bag is None:
+            self.index_to_bag = self.bags_from_indices()
+        return self.index_to_bag[bag_index]
 
     def item_dict_from_vector(self, item_vector):
         return dict_from_index_map_and_vector(self.item_to_index, item_vector)
@@ -30,13 +225,113 @@ class VectorSpace:
         return dict_from_index_map_and_vector(self.bag_to_index, bag_vector)
 
     def bag_vector_from_collection(self, bags):
+        """ 'bags' is either a collection of bags or an array of bag indices, see 'self.indices_from_bags'. """
+        if is_index_vector(bags):
+            return indicator_vector_from_indices(bags, self.number_of_bag_indices())
         distribution_on_bags = weight_one_dict_from_collection(bags)
         return self.bag_vector_from_dict(distribution_on_bags)
 
+    def bag_indices_from_collection(self, bags):
+        """ Return the sorted array of the indices of the support of 'self.bag_vector_from_collection(bags)'. """
+        if is_index_vector(bags):
+            return unique_from_index_array(bags)
+        bag_indices = (self.bag_to_index.get(bag) for bag in map(self.bag_key, bags))
+        return unique_from_index_array(make_index_vector([bag_index for bag_index in bag_indices
+                                                          if bag_index is not None]))
+
+    def bag_matrix_from_collections(self, bag_collections):
+        """ Return the matrix whose column 'j' is 'self.bag_vector_from_collection(bag_collections[j])'.
+        The unknown bags are ignored, as by 'self.bag_indices_from_collection'. """
+        index_collections = [self.bag_indices_from_collection(bags) for bags in bag_collections]
+        return matrix_from_index_collections(index_collections, self.number_of_bag_indices())
+
+    def indices_from_bags(self, bags):
+        """ Return the array of the indices of 'bags'. The index of a bag is fixed at construction:
+        the methods accepting a collection of bags also accept such an array, which avoids hashing the bags. """
+        return make_index_vector([self.bag_to_index[self.bag_key(bag)] for bag in bags])
+
     def count_bags_containing_item(self, item):
         if item not in self.item_to_index:
             return 0
-        return count_nonzero_entries_in_matrix_row(self.item_bag_matrix, self.item_to_index[item])
+        if not self.bag_is_removed.any():
+            return count_nonzero_entries_in_matrix_row(self.item_bag_matrix, self.item_to_index[item])
+        return count_nonzero_entries_in_matrix_row_on_columns(self.item_bag_matrix, self.item_to_index[item],
+                                                              ~self.bag_is_removed)
+
+    def count_bags_containing_items(self):
+        """ Return the vector of document frequencies, indexed like 'self.item_to_index',
+        without the removed bags. """
+        if not self.bag_is_removed.any():
+            return count_nonzero_entries_in_matrix_rows(self.item_bag_matrix)
+        return count_nonzero_entries_in_matrix_rows_on_columns(self.item_bag_matrix, ~self.bag_is_removed)
+
+
+def item_and_bag_indices_and_matrix_from_bags(bags, n_jobs=None, shard_size=DEFAULT_SHARD_SIZE):
+    """ Return '(item_to_index, bag_to_index, item_bag_matrix)' for the collection 'bags', the items and the bags
+    being indexed by first occurrence, as 'VectorSpace' computes them. The bags are split into shards
+    of 'shard_size' bags, whose distinct bags and items are indexed and counted by 'local_bags_and_matrix_from_bags'
+    in a pool of 'n_jobs' processes, which inherit 'bags' when they are forked, see 'map_shards_of_iterable'.
+    This process only indexes the distinct bags and items of each shard, in the order of the shards,
+    so that the result does not depend on 'n_jobs', and stacks the columns of the bags absent from former shards. """
+    bags = bags if isinstance(bags, Sequence) else list(bags)
+    item_to_index = dict()
+    bag_to_index = dict()
+    row_index_arrays = []
+    count_arrays = []
+    column_length_arrays = []
+    former_bag_entries = []
+    for shard_start, (bag_positions, items, local_matrix) in zip(
+            range(0, len(bags), shard_size),
+            map_shards_of_iterable(local_bags_and_matrix_from_bags, bags, shard_size, n_jobs)):
+        number_of_former_bags = len(bag_to_index)
+        column_indices = np.fromiter((bag_to_index.setdefault(bags[shard_start + position], len(bag_to_index))
+                                      for position in bag_positions), dtype=INDEX_TYPE, count=len(bag_positions))
+        extend_map_to_index(item_to_index, items)
+        local_to_global = np.fromiter(map(item_to_index.__getitem__, items), dtype=INDEX_TYPE, count=len(items))
+        is_new_bag = column_indices >= number_of_former_bags
+        if not np.all(is_new_bag):
+            # The occurrences of the bags of former shards are added to their columns at the end.
+            former_bag_matrix = local_matrix[:, ~is_new_bag]
+            former_bag_entries.append((local_to_global[former_bag_matrix.indices],
+                                       np.repeat(column_indices[~is_new_bag], np.diff(former_bag_matrix.indptr)),
+                                       former_bag_matrix.data))
+            local_matrix = local_matrix[:, is_new_bag]
+        row_index_arrays.append(local_to_global[local_matrix.indices])
+        count_arrays.append(local_matrix.data)
+        column_length_arrays.append(np.diff(local_matrix.indptr))
+    item_bag_matrix = matrix_from_column_lengths(
+        concatenate_index_arrays(row_index_arrays), concatenate_index_arrays(count_arrays),
+        concatenate_index_arrays(column_length_arrays), len(item_to_index))
+    if len(former_bag_entries) > 0:
+        row_indices, column_indices, counts = (concatenate_index_arrays(arrays) for arrays in zip(*former_bag_entries))
+        item_bag_matrix = item_bag_matrix + csr_matrix((counts, (row_indices, column_indices)),
+                                                       shape=item_bag_matrix.shape)
+    return item_to_index, bag_to_index, item_bag_matrix
+
+
+def local_bags_and_matrix_from_bags(bags):
+    """ Return '(bag_positions, items, matrix)' where 'bag_positions' lists the positions in 'bags'
+    of the first occurrences of its distinct bags, 'items' is the list of their items by first occurrence,
+    and 'matrix' is the item-bag matrix of 'bags' in the compressed sparse column format, whose rows are indexed
+    by 'items' and whose columns follow 'bag_positions', the occurrences of repeated bags being summed. """
+    bag_to_position = dict()
+    for position, bag in enumerate(bags):
+        bag_to_position.setdefault(bag, position)
+    distinct_bags = list(bag_to_position)
+    item_to_index = map_to_index_from_iterable(union_from_iterables(distinct_bags))
+    matrix = matrix_from_bags_and_index_maps(bags, item_to_index, map_to_index_from_iterable(distinct_bags))
+    return list(bag_to_position.values()), list(item_to_index), column_matrix_from_matrix(matrix)
+
+
+def matrix_from_bags_on_known_items(bags, item_to_index):
+    """ Return the item-bag matrix of 'bags', whose columns follow 'bags', counting only the items
+    of 'item_to_index'. """
+    row_index_arrays = [np.fromiter((item_to_index[item] for item in bag if item in item_to_index), dtype=INDEX_TYPE)
+                        for bag in bags]
+    column_indices = np.repeat(np.arange(len(bags), dtype=INDEX_TYPE),
+                               [len(row_index_array) for row_index_array in row_index_arrays])
+    return matrix_from_row_and_column_indices(concatenate_index_arrays(row_index_arrays), column_indices,
+                                              (len(item_to_index), len(bags)))
 
 
 def map_to_index_from_iterable(iterable):
@@ -49,6 +344,49 @@ def map_to_index_from_iterable(iterable):
     return map_to_index
 
 
+def extend_map_to_index(map_to_index, iterable):
+    """ Give the next indices to the elements of 'iterable' absent from 'map_to_index',
+    unless it is not a dictionary, like 'HashingIndexMap'. """
+    if isinstance(map_to_index, dict):
+        for item in iterable:
+            if item not in map_to_index:
+                map_to_index[item] = len(map_to_index)
+
+
+def kept_item_indices_from_document_frequencies(document_frequencies, number_of_bags,
+                                                min_df=None, max_df=None, max_features=None):
+    """ Return the sorted array of the indices of the items kept by 'VectorSpace.prune_items'.
+    Among the items with the same document frequency, the items of lowest indices are kept first. """
+    is_kept = np.ones(len(document_frequencies), dtype=bool)
+    if min_df is not None:
+        is_kept &= document_frequencies >= number_of_bags_from_document_frequency(min_df, number_of_bags)
+    if max_df is not None:
+        is_kept &= document_frequencies <= number_of_bags_from_document_frequency(max_df, number_of_bags)
+    kept_indices = np.flatnonzero(is_kept)
+    if max_features is not None and len(kept_indices) > max_features:
+        order = np.argsort(-document_frequencies[kept_indices], kind='stable')
+        kept_indices = np.sort(kept_indices[order[:max_features]])
+    return kept_indices
+
+
+def number_of_bags_from_document_frequency(document_frequency, number_of_bags):
+    if isinstance(document_frequency, float):
+        if not 0. <= document_frequency <= 1.:
+            raise ValueError('Error in number_of_bags_from_document_frequency: '
+                             'a proportion of the bags must be between 0 and 1.')
+        return document_frequency * number_of_bags
+    return document_frequency
+
+
+def list_from_index_map(map_to_index, length=None):
+    if length is None:
+        length = len(map_to_index)
+    keys = [None] * length
+    for key, index in map_to_index.items():
+        keys[index] = key
+    return keys
+
+
 def union_from_iterables(iterables):
     for iterable in iterables:
         for item in iterable: